@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# SPDX-License-Identifier: Apache-2.0
+# Copyright Pionix GmbH and Contributors to EVerest
+#
+"""
+Benchmark ev-cli code generation on a synthetic, large everest tree.
+
+The tree consists of thousands of types with deep $ref chains (across type files and within them), interfaces
+with vars, commands and error references and modules providing and requiring these interfaces.  Every generation
+command is run cold (empty cache and output directory) and warm (again with the filled --cache-dir) and its wall
+time and peak memory (max. resident set size) are recorded.  The results are written as json, --history appends
+them as a single line to a file, so they can be tracked over time.
+
+usage: generation.py --schemas-dir ../everest-framework/schemas [--json results.json] [--history history.jsonl]
+"""
+
+from datetime import datetime, timezone
+from pathlib import Path
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import yaml
+
+LICENSE = 'https://opensource.org/licenses/Apache-2.0'
+PRIMITIVE_TYPES = ['string', 'integer', 'number', 'boolean']
+
+
+def primitive_property(rng, allow_enum=True):
+    json_type = rng.choice(PRIMITIVE_TYPES)
+    prop = {'description': f'a {json_type}', 'type': json_type}
+    if allow_enum and json_type == 'string' and rng.random() < 0.3:
+        prop['enum'] = [f'Value{index}' for index in range(rng.randint(2, 6))]
+
+    return prop
+
+
+def synthesize_types(rng, type_files, types_per_file):
+    """Create type files, types refer to earlier types of the same file and to types of earlier files.
+
+    Return the type files by name and the urls of all object types.
+    """
+    files = {}
+    # (url, json type) of the types of the previous files
+    previous_types = []
+    for file_index in range(type_files):
+        name = f'group{file_index % 10}/types{file_index}'
+        types = {}
+        local_types = []
+        for type_index in range(types_per_file):
+            type_name = f'Type{file_index}x{type_index}'
+            url = f'/{name}#/{type_name}'
+            if type_index % 5 == 4:
+                types[type_name] = {
+                    'description': 'enum type',
+                    'type': 'string',
+                    'enum': [f'State{index}' for index in range(rng.randint(3, 10))],
+                }
+                local_types.append((url, 'string'))
+                continue
+
+            # inline enums become types named after the property, so property names are unique within the file
+            properties = {f'prop{type_index}x{index}': primitive_property(rng) for index in range(rng.randint(2, 6))}
+            # refs to the types of the last files and earlier types of this file build deep reference chains
+            candidates = local_types + previous_types[-4 * types_per_file:]
+            for index, (ref, json_type) in enumerate(rng.sample(candidates, min(len(candidates), rng.randint(1, 3)))):
+                properties[f'ref{index}'] = {'description': 'reference', 'type': json_type, '$ref': ref}
+            object_candidates = [ref for ref, json_type in candidates if json_type == 'object']
+            if object_candidates and rng.random() < 0.5:
+                properties['list'] = {
+                    'description': 'list of references',
+                    'type': 'array',
+                    'items': {'type': 'object', '$ref': rng.choice(object_candidates)},
+                }
+            properties['nested'] = {
+                'description': 'inline object',
+                'type': 'object',
+                'properties': {'inner': {'type': 'object', 'properties': {'value': primitive_property(rng, False)}}},
+            }
+            types[type_name] = {
+                'description': f'type {type_name}',
+                'type': 'object',
+                'required': sorted(properties)[:2],
+                'properties': properties,
+                'additionalProperties': False,
+            }
+            local_types.append((url, 'object'))
+        previous_types.extend(local_types)
+        files[name] = {'description': f'types of file {file_index}', 'types': types}
+
+    return files, [url for url, json_type in previous_types if json_type == 'object']
+
+
+def type_ref_property(rng, object_types, description):
+    prop = {'description': description, 'type': 'object', '$ref': rng.choice(object_types)}
+    if rng.random() < 0.2:
+        return {'description': description, 'type': 'array', 'items': {'type': 'object', '$ref': prop['$ref']}}
+
+    return prop
+
+
+def synthesize_tree(tree_dir: Path, seed, type_files, types_per_file, interfaces, modules):
+    rng = random.Random(seed)
+
+    type_defs, object_types = synthesize_types(rng, type_files, types_per_file)
+    for name, type_def in type_defs.items():
+        path = tree_dir / 'types' / f'{name}.yaml'
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(yaml.safe_dump(type_def, sort_keys=False))
+
+    error_files = 10
+    (tree_dir / 'errors').mkdir(parents=True)
+    for index in range(error_files):
+        errors = [{'name': f'Error{index}x{error}', 'description': 'error'} for error in range(rng.randint(2, 8))]
+        (tree_dir / 'errors' / f'errors{index}.yaml').write_text(
+            yaml.safe_dump({'description': f'errors {index}', 'errors': errors}, sort_keys=False))
+
+    (tree_dir / 'interfaces').mkdir(parents=True)
+    interface_names = [f'interface_{index}' for index in range(interfaces)]
+    for name in interface_names:
+        if_def = {'description': f'interface {name}', 'cmds': {}, 'vars': {}}
+        for index in range(rng.randint(1, 5)):
+            cmd = {'description': 'command', 'arguments': {}}
+            for arg_index in range(rng.randint(0, 3)):
+                cmd['arguments'][f'arg{arg_index}'] = (type_ref_property(rng, object_types, 'argument')
+                                                       if rng.random() < 0.7 else primitive_property(rng))
+            if rng.random() < 0.7:
+                cmd['result'] = type_ref_property(rng, object_types, 'result')
+            if_def['cmds'][f'command{index}'] = cmd
+        for index in range(rng.randint(1, 6)):
+            if_def['vars'][f'var{index}'] = (type_ref_property(rng, object_types, 'variable')
+                                             if rng.random() < 0.7 else primitive_property(rng))
+        if rng.random() < 0.5:
+            if_def['errors'] = [{'reference': f'/errors/errors{rng.randrange(error_files)}'}]
+        (tree_dir / 'interfaces' / f'{name}.yaml').write_text(yaml.safe_dump(if_def, sort_keys=False))
+
+    module_names = [f'Module{index}' for index in range(modules)]
+    for name in module_names:
+        provides = {}
+        for index, interface in enumerate(rng.sample(interface_names, rng.randint(1, 3))):
+            provides[f'impl{index}'] = {
+                'interface': interface,
+                'description': f'implementation of {interface}',
+                'config': {'limit': {'description': 'limit', 'type': 'integer', 'default': 10}},
+            }
+        requires = {}
+        for index, interface in enumerate(rng.sample(interface_names, rng.randint(0, 3))):
+            requires[f'req{index}'] = {'interface': interface}
+            if rng.random() < 0.3:
+                requires[f'req{index}'].update({'min_connections': 0, 'max_connections': 4})
+        manifest = {
+            'description': f'module {name}',
+            'config': {
+                'name': {'description': 'name', 'type': 'string', 'default': name},
+                'timeout': {'description': 'timeout', 'type': 'number', 'default': 1.5},
+            },
+            'provides': provides,
+            'requires': requires,
+            'metadata': {'license': LICENSE, 'authors': ['ev-cli benchmark']},
+        }
+        if not requires:
+            del manifest['requires']
+        path = tree_dir / 'modules' / name / 'manifest.yaml'
+        path.parent.mkdir(parents=True)
+        path.write_text(yaml.safe_dump(manifest, sort_keys=False))
+
+    return {
+        'type_files': type_files,
+        'types': sum(len(type_def['types']) for type_def in type_defs.values()),
+        'interfaces': interfaces,
+        'modules': modules,
+        'seed': seed,
+    }
+
+
+def run_measured(command, cwd: Path):
+    """Run a command and return its wall time in ms and the peak resident set size in KiB."""
+    with tempfile.TemporaryFile() as output:
+        start = time.perf_counter()
+        process = subprocess.Popen(command, cwd=cwd, stdout=output, stderr=subprocess.STDOUT)
+        # wait4 provides the resource usage of exactly this child (and its worker processes)
+        _pid, status, usage = os.wait4(process.pid, 0)
+        wall_time = (time.perf_counter() - start) * 1000
+        # like subprocess, killed processes return the negative signal number (os.waitstatus_to_exitcode needs 3.9)
+        process.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+        if process.returncode != 0:
+            output.seek(0)
+            raise Exception(f'{" ".join(command)} failed:\n{output.read().decode("utf-8", errors="replace")}')
+
+    return wall_time, usage.ru_maxrss
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ev-cli code generation benchmark')
+    parser.add_argument('--schemas-dir', type=str, default=str(Path.cwd() / '../everest-framework/schemas'),
+                        help='everest framework schemas directory (default: ../everest-framework/schemas)')
+    parser.add_argument('--type-files', type=int, default=200, help='number of type files (default: 200)')
+    parser.add_argument('--types-per-file', type=int, default=10, help='types per type file (default: 10)')
+    parser.add_argument('--interfaces', type=int, default=300, help='number of interfaces (default: 300)')
+    parser.add_argument('--modules', type=int, default=100, help='number of modules (default: 100)')
+    parser.add_argument('--seed', type=int, default=1, help='seed of the synthesized tree (default: 1)')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='--jobs passed to the header generation commands (default: 1)')
+    parser.add_argument('--clang-format-file', type=str, default=None,
+                        help='directory containing a .clang-format file, formatting is disabled if not given')
+    parser.add_argument('--work-dir', type=str, default=None,
+                        help='directory for the synthesized tree and the outputs, kept after the run '
+                        '(default: a temporary directory)')
+    parser.add_argument('--json', type=str, default=None, help='write the results to this json file')
+    parser.add_argument('--history', type=str, default=None,
+                        help='append the results as a single json line to this file, for tracking them over time')
+    args = parser.parse_args()
+
+    schemas_dir = Path(args.schemas_dir).resolve()
+    if not schemas_dir.exists():
+        print(f'Schemas directory {schemas_dir} does not exist, use --schemas-dir')
+        sys.exit(1)
+
+    work_dir = Path(args.work_dir or tempfile.mkdtemp(prefix='ev-cli-benchmark-')).resolve()
+    tree_dir = work_dir / 'tree'
+    if tree_dir.exists():
+        shutil.rmtree(tree_dir)
+    tree_dir.mkdir(parents=True)
+
+    start = time.perf_counter()
+    tree = synthesize_tree(tree_dir, args.seed, args.type_files, args.types_per_file, args.interfaces, args.modules)
+    print(f'Synthesized {tree["types"]} types, {tree["interfaces"]} interfaces and {tree["modules"]} modules in '
+          f'{time.perf_counter() - start:.1f} s')
+
+    src_dir = str(Path(__file__).resolve().parent.parent / 'src')
+    ev_cli = [sys.executable, '-c', f'import sys; sys.path.insert(0, {src_dir!r}); from ev_cli.ev import main; main()']
+    cache_dir = work_dir / 'cache'
+    output_dir = work_dir / 'output'
+    common = ['--everest-dir', str(tree_dir), '--work-dir', str(tree_dir), '--schemas-dir', str(schemas_dir),
+              '--cache-dir', str(cache_dir)]
+    if args.clang_format_file:
+        common += ['--clang-format-file', str(Path(args.clang_format_file).resolve())]
+    else:
+        common += ['--disable-clang-format']
+
+    # module commands are run for all modules in a single batch, like a build system would with ev-cli batch
+    module_names = sorted(path.name for path in (tree_dir / 'modules').iterdir())
+    batch_files = {}
+    for action, extra_args in [('create', ['--force']), ('update', ['--force']),
+                               ('generate-loader', ['--force', '-o', str(output_dir / 'modules')])]:
+        batch_file = work_dir / f'module-{action}.txt'
+        batch_file.write_text(''.join(f'module {action} {name} {" ".join(common + extra_args)}\n'
+                                      for name in module_names))
+        batch_files[action] = batch_file
+
+    commands = {
+        'types generate-headers': ['types', 'generate-headers', *common, '--force', '-j', str(args.jobs),
+                                   '-o', str(output_dir / 'types')],
+        'interface generate-headers': ['interface', 'generate-headers', *common, '--force', '-j', str(args.jobs),
+                                       '-o', str(output_dir / 'interfaces')],
+        'module create': ['batch', str(batch_files['create'])],
+        'module update': ['batch', str(batch_files['update'])],
+        'module generate-loader': ['batch', str(batch_files['generate-loader'])],
+    }
+
+    results = {}
+    for name, command in commands.items():
+        results[name] = {}
+        for run in ['cold', 'warm']:
+            if run == 'cold':
+                shutil.rmtree(cache_dir, ignore_errors=True)
+                shutil.rmtree(output_dir, ignore_errors=True)
+            wall_time, peak_rss = run_measured([*ev_cli, *command], tree_dir)
+            results[name][run] = {'wall_time_ms': round(wall_time, 1), 'peak_rss_kib': peak_rss}
+            print(f'{name:<28} {run:<5} {wall_time:10.1f} ms {peak_rss / 1024:8.1f} MiB')
+
+    sys.path.insert(0, src_dir)
+    from ev_cli import __version__
+
+    report = {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'ev_cli_version': __version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'jobs': args.jobs,
+        'clang_format': bool(args.clang_format_file),
+        'tree': tree,
+        'results': results,
+    }
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2))
+    if args.history:
+        with open(args.history, 'a') as history:
+            history.write(json.dumps(report, sort_keys=True) + '\n')
+
+    if not args.work_dir:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    main()
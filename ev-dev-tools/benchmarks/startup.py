@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# SPDX-License-Identifier: Apache-2.0
+# Copyright Pionix GmbH and Contributors to EVerest
+#
+"""
+Measure the startup time of lightweight ev-cli commands and check, that they do not import heavy dependencies.
+
+Lightweight commands (e.g. the get-templates commands called by CMake at configure time) must neither load the
+schemas nor import jinja2, jsonschema or yaml.  The script exits with 1, if one of them gets imported or the import
+time of ev_cli.ev exceeds --max-import-ms, so it can be used as a regression check.
+"""
+
+from pathlib import Path
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+LIGHTWEIGHT_COMMANDS = [
+    ['module', 'get-templates'],
+    ['interface', 'get-templates'],
+    ['types', 'get-templates'],
+    ['helpers', 'generate-uuids', '1'],
+]
+
+HEAVY_MODULES = ['jinja2', 'jsonschema', 'yaml']
+
+
+def run_ev_cli(command, extra_python_args=()):
+    env = dict(os.environ)
+    src_dir = str(Path(__file__).resolve().parent.parent / 'src')
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [src_dir, env.get('PYTHONPATH')]))
+    # run like the ev-cli entry point does, so ev_cli.ev shows up in the import times
+    return subprocess.run([sys.executable, *extra_python_args, '-c', 'from ev_cli.ev import main; main()', *command],
+                          capture_output=True, encoding='utf-8', env=env, check=True)
+
+
+def measure_wall_time(command, repeat):
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run_ev_cli(command)
+        durations.append(time.perf_counter() - start)
+
+    return statistics.median(durations) * 1000
+
+
+def parse_import_times(command):
+    """Get the cumulative import time in ms of all top level packages imported while running command."""
+    import_times = {}
+    for line in run_ev_cli(command, ['-X', 'importtime']).stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        name = name.strip()
+        import_times[name] = int(cumulative_us) / 1000
+
+    return import_times
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ev-cli startup benchmark')
+    parser.add_argument('--repeat', type=int, default=10, help='number of runs per command (default: 10)')
+    parser.add_argument('--max-import-ms', type=float, default=None,
+                        help='fail, if importing ev_cli.ev takes longer than this')
+    parser.add_argument('--json', type=str, default=None, help='write the results to this json file')
+    args = parser.parse_args()
+
+    results = {'python_startup_ms': None, 'commands': {}}
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        subprocess.run([sys.executable, '-c', 'pass'], check=True)
+    results['python_startup_ms'] = (time.perf_counter() - start) / args.repeat * 1000
+    print(f'{"python startup":<32} {results["python_startup_ms"]:8.1f} ms')
+
+    failed = False
+    for command in LIGHTWEIGHT_COMMANDS:
+        name = ' '.join(command)
+        import_times = parse_import_times(command)
+        heavy_imports = [module for module in HEAVY_MODULES if module in import_times]
+        result = {
+            'wall_time_ms': measure_wall_time(command, args.repeat),
+            'import_time_ms': import_times.get('ev_cli.ev', 0.0),
+            'heavy_imports': heavy_imports,
+        }
+        results['commands'][name] = result
+        print(f'{name:<32} {result["wall_time_ms"]:8.1f} ms (import of ev_cli.ev: {result["import_time_ms"]:.1f} ms)')
+
+        if heavy_imports:
+            print(f'  error: imports {", ".join(heavy_imports)}')
+            failed = True
+        if args.max_import_ms is not None and result['import_time_ms'] > args.max_import_ms:
+            print(f'  error: import time exceeds {args.max_import_ms} ms')
+            failed = True
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
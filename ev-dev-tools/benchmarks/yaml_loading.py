@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# SPDX-License-Identifier: Apache-2.0
+# Copyright Pionix GmbH and Contributors to EVerest
+#
+"""
+Compare loading the type, interface, error and manifest definitions of everest dirs with the pure python
+yaml.SafeLoader and the libyaml based yaml.CSafeLoader, and check that both load identical documents.
+
+usage: yaml_loading.py [--repeat N] EVEREST_DIR [EVEREST_DIR ...]
+"""
+
+from pathlib import Path
+import argparse
+import sys
+import time
+
+import yaml
+
+
+def collect_corpus(everest_dirs):
+    files = []
+    for everest_dir in everest_dirs:
+        for pattern in ['types/**/*.yaml', 'interfaces/*.yaml', 'errors/*.yaml', 'modules/**/manifest.yaml']:
+            files.extend(sorted(Path(everest_dir).glob(pattern)))
+
+    return [(path, path.read_text()) for path in files]
+
+
+def load_all(corpus, loader, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        documents = [yaml.load(content, Loader=loader) for _path, content in corpus]
+
+    return documents, (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description='yaml loader benchmark')
+    parser.add_argument('everest_dirs', nargs='+', help='everest dirs to take the definition files from')
+    parser.add_argument('--repeat', type=int, default=5, help='number of loads of the whole corpus (default: 5)')
+    args = parser.parse_args()
+
+    if not yaml.__with_libyaml__:
+        print('PyYAML has been built without libyaml, CSafeLoader is not available')
+        sys.exit(1)
+
+    corpus = collect_corpus(args.everest_dirs)
+    if not corpus:
+        print('No definition files found')
+        sys.exit(1)
+    size = sum(len(content) for _path, content in corpus)
+    print(f'Corpus: {len(corpus)} files, {size / 1024:.0f} KiB')
+
+    python_documents, python_time = load_all(corpus, yaml.SafeLoader, args.repeat)
+    c_documents, c_time = load_all(corpus, yaml.CSafeLoader, args.repeat)
+    print(f'{"SafeLoader":<12} {python_time * 1000:8.1f} ms')
+    print(f'{"CSafeLoader":<12} {c_time * 1000:8.1f} ms ({python_time / c_time:.1f}x faster)')
+
+    mismatches = [path for (path, _content), python_document, c_document in zip(corpus, python_documents, c_documents)
+                  if python_document != c_document]
+    for path in mismatches:
+        print(f'error: documents loaded from {path} differ')
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == '__main__':
+    main()
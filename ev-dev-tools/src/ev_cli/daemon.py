@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+#
+# SPDX-License-Identifier: Apache-2.0
+# Copyright Pionix GmbH and Contributors to EVerest
+#
+"""
+Provide a long-running generator daemon, watching the definition files and serving requests on a unix socket.
+
+The daemon keeps schemas, templates and parsed definitions in memory.  Whenever a definition file changes, the
+affected in-memory definitions are dropped and the configured commands are run again.  Requests are single line
+json objects, answered by a single line json object:
+
+    {"request": "ping"}                 -> {"status": "ok"}
+    {"request": "ensure-up-to-date"}    -> {"status": "ok" | "failed", "failed_commands": [...], "runs": N}
+    {"request": "query", "query": "unused-types"}
+                                        -> {"status": "ok" | "error", "result": ...}
+    {"request": "shutdown"}             -> {"status": "ok"}
+"""
+
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, Tuple
+import ctypes
+import ctypes.util
+import json
+import os
+import selectors
+import socket
+import struct
+import time
+
+# only changes of these files trigger a regeneration, generated files are ignored
+WATCHED_SUFFIXES = ('.yaml', '.yml')
+# time to wait for further events after a change, editors often write files in several steps
+DEBOUNCE_SECONDS = 0.05
+# time a client may take to send its request or to receive the response, the daemon serves one client at a time
+CLIENT_TIMEOUT_SECONDS = 5.0
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0x00000800
+INOTIFY_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+INOTIFY_EVENT = struct.Struct('iIII')
+
+
+class InotifyWatcher:
+    """Watch directory trees recursively with inotify."""
+
+    def __init__(self, directories: List[Path]):
+        libc_name = ctypes.util.find_library('c')
+        self.libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.watches: Dict[int, Path] = {}
+        for directory in directories:
+            self.add_tree(directory)
+
+    def add_tree(self, directory: Path):
+        for root, _dirs, _files in os.walk(directory, followlinks=True):
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(root), INOTIFY_MASK)
+            if wd >= 0:
+                self.watches[wd] = Path(root)
+
+    def fileno(self) -> int:
+        return self.fd
+
+    def read_changes(self) -> Set[Path]:
+        """Read all pending events and return the changed files."""
+        changes = set()
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _cookie, length = INOTIFY_EVENT.unpack_from(data, offset)
+                offset += INOTIFY_EVENT.size
+                name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+                offset += length
+                if wd not in self.watches:
+                    continue
+                path = self.watches[wd] / name if name else self.watches[wd]
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        # new directories are watched as well, files created inside before are picked up by polling
+                        self.add_tree(path)
+                        changes.update(PollingWatcher.scan([path]).keys())
+                    continue
+                if mask & IN_DELETE_SELF:
+                    del self.watches[wd]
+                    continue
+                changes.add(path)
+
+        return changes
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """Watch directory trees by comparing modification times, if inotify is not available."""
+
+    def __init__(self, directories: List[Path]):
+        self.directories = directories
+        self.state = PollingWatcher.scan(directories)
+
+    @staticmethod
+    def scan(directories: List[Path]) -> Dict[Path, Tuple[int, int]]:
+        state = {}
+        for directory in directories:
+            for root, _dirs, files in os.walk(directory, followlinks=True):
+                for file_name in files:
+                    path = Path(root) / file_name
+                    try:
+                        stat = path.stat()
+                    except OSError:
+                        continue
+                    state[path] = (stat.st_mtime_ns, stat.st_size)
+
+        return state
+
+    def fileno(self) -> Optional[int]:
+        return None
+
+    def read_changes(self) -> Set[Path]:
+        state = PollingWatcher.scan(self.directories)
+        changes = set(path for path in state.keys() | self.state.keys() if state.get(path) != self.state.get(path))
+        self.state = state
+
+        return changes
+
+    def close(self):
+        pass
+
+
+def create_watcher(directories: List[Path], polling: bool = False):
+    """Create an inotify watcher, falls back to polling if inotify is not available."""
+    directories = [directory for directory in directories if directory.is_dir()]
+    if not polling:
+        try:
+            return InotifyWatcher(directories)
+        except (OSError, AttributeError, TypeError):
+            print('inotify is not available, falling back to polling for changes')
+
+    return PollingWatcher(directories)
+
+
+class Daemon:
+    """Run the generator commands on every change of the watched definition files and serve requests."""
+
+    def __init__(self, socket_path: Path, watch_dirs: List[Path], run_commands: Callable[[], List],
+                 invalidate: Callable[[Set[Path]], None], poll_interval: float, polling: bool = False,
+                 index=None, index_snapshot: Optional[Path] = None):
+        self.socket_path = socket_path
+        # definition index answering queries, saved to the snapshot file after every regeneration
+        self.index = index
+        self.index_snapshot = index_snapshot
+        self.run_commands = run_commands
+        self.invalidate = invalidate
+        self.poll_interval = poll_interval
+        self.watcher = create_watcher(watch_dirs, polling)
+        self.failed_commands: List = []
+        self.runs = 0
+        self.pending: Set[Path] = set()
+        self.running = True
+
+    def regenerate(self):
+        """Drop the changed definitions from memory and run all commands again."""
+        changed = self.pending
+        self.pending = set()
+        if changed:
+            print(f'Regenerating after changes of: {", ".join(sorted(str(path) for path in changed))}')
+        self.invalidate(changed)
+        start = time.perf_counter()
+        self.failed_commands = self.run_commands()
+        self.runs += 1
+        if self.index:
+            # only the changed definition files are parsed again
+            self.index.refresh()
+            if self.index_snapshot:
+                self.index.save(self.index_snapshot)
+        print(f'Regeneration took {(time.perf_counter() - start) * 1000:.1f} ms')
+
+    def collect_changes(self) -> Set[Path]:
+        changes = set(path for path in self.watcher.read_changes() if path.suffix in WATCHED_SUFFIXES)
+        self.pending.update(changes)
+
+        return changes
+
+    def handle_request(self, request: Dict) -> Dict:
+        command = request.get('request')
+        if command == 'ping':
+            return {'status': 'ok'}
+        if command == 'ensure-up-to-date':
+            # changes might not have been delivered yet, so check the watcher before answering
+            self.collect_changes()
+            if self.pending:
+                self.regenerate()
+            return {
+                'status': 'failed' if self.failed_commands else 'ok',
+                'failed_commands': self.failed_commands,
+                'runs': self.runs,
+            }
+        if command == 'query':
+            if not self.index:
+                return {'status': 'error', 'message': 'no definition index available'}
+            self.collect_changes()
+            if self.pending:
+                self.regenerate()
+            try:
+                return {'status': 'ok', 'result': self.index.query(request.get('query'), request.get('name'))}
+            except Exception as err:
+                return {'status': 'error', 'message': str(err)}
+        if command == 'shutdown':
+            self.running = False
+            return {'status': 'ok'}
+
+        return {'status': 'error', 'message': f'unknown request: {command}'}
+
+    def handle_client(self, connection: socket.socket):
+        with connection:
+            # a stalled client must not block the daemon, so it is dropped after the timeout
+            connection.settimeout(CLIENT_TIMEOUT_SECONDS)
+            data = b''
+            try:
+                while not data.endswith(b'\n'):
+                    chunk = connection.recv(4096)
+                    if not chunk:
+                        break
+                    data += chunk
+            except socket.timeout:
+                print(f'Dropping client, no complete request within {CLIENT_TIMEOUT_SECONDS} s')
+                return
+            try:
+                response = self.handle_request(json.loads(data))
+            except ValueError as err:
+                response = {'status': 'error', 'message': f'invalid request: {err}'}
+            try:
+                connection.sendall(json.dumps(response).encode('utf-8') + b'\n')
+            except OSError as err:
+                print(f'Dropping client, could not send the response: {err}')
+
+    def remove_stale_socket(self):
+        """Remove the socket of a daemon, which is not running anymore, refuses to replace a running daemon."""
+        if not self.socket_path.exists():
+            return
+
+        try:
+            send_request(self.socket_path, 'ping', timeout=CLIENT_TIMEOUT_SECONDS)
+        except ConnectionRefusedError:
+            # nobody is listening anymore
+            self.socket_path.unlink()
+            return
+        except (OSError, ValueError) as err:
+            raise Exception(f'Could not check, if a daemon is listening on {self.socket_path}: {err}') from err
+
+        raise Exception(f'Another daemon is already listening on {self.socket_path}')
+
+    def serve(self):
+        self.remove_stale_socket()
+        self.regenerate()
+
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(str(self.socket_path))
+        server.listen()
+        print(f'Listening on {self.socket_path}')
+
+        selector = selectors.DefaultSelector()
+        selector.register(server, selectors.EVENT_READ, 'server')
+        if self.watcher.fileno() is not None:
+            selector.register(self.watcher.fileno(), selectors.EVENT_READ, 'watcher')
+
+        try:
+            while self.running:
+                if self.pending:
+                    timeout = DEBOUNCE_SECONDS
+                elif self.watcher.fileno() is None:
+                    timeout = self.poll_interval
+                else:
+                    timeout = None
+                events = selector.select(timeout)
+                if not events:
+                    # regenerate, once no further changes came in during the debounce time
+                    had_pending = bool(self.pending)
+                    if not self.collect_changes() and had_pending:
+                        self.regenerate()
+                    continue
+                for key, _mask in events:
+                    if key.data == 'server':
+                        connection, _address = server.accept()
+                        self.handle_client(connection)
+                    else:
+                        self.collect_changes()
+        finally:
+            selector.close()
+            server.close()
+            try:
+                self.socket_path.unlink()
+            except FileNotFoundError:
+                pass
+            self.watcher.close()
+
+
+def send_request(socket_path: Path, request: str, timeout: Optional[float] = None, **params) -> Dict:
+    """Send a request with optional parameters to a running daemon and return its response."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(str(socket_path))
+        client.sendall(json.dumps({'request': request, **params}).encode('utf-8') + b'\n')
+        data = b''
+        while not data.endswith(b'\n'):
+            chunk = client.recv(4096)
+            if not chunk:
+                break
+            data += chunk
+
+    return json.loads(data)
@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+#
+# SPDX-License-Identifier: Apache-2.0
+# Copyright Pionix GmbH and Contributors to EVerest
+#
+"""
+Provide an index of all type, interface, error and module definitions of the everest dirs, answering questions
+like which interfaces use a type or which types are not used at all.
+
+Only the references between definitions are kept, so the index can be stored as a small json snapshot.  Loading
+a snapshot only needs to stat the definition files, files that changed since are parsed again.
+"""
+
+from .parse_cache import write_cache_file
+from . import yaml_utils
+
+from collections import deque
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import json
+import os
+
+DEFINITION_SUFFIXES = ('.yaml', '.yml')
+# queries, which need the name of a type or an interface
+NAMED_QUERIES = ('interfaces-using-type', 'modules-requiring', 'modules-providing')
+QUERIES = (*NAMED_QUERIES, 'unused-types', 'unresolved', 'summary')
+
+
+def collect_type_refs(node, refs: Set[str]):
+    """Collect all type references ($ref) in a (nested) definition."""
+    if isinstance(node, dict):
+        ref = node.get('$ref')
+        if isinstance(ref, str):
+            refs.add(ref)
+        for value in node.values():
+            collect_type_refs(value, refs)
+    elif isinstance(node, list):
+        for value in node:
+            collect_type_refs(value, refs)
+
+
+def parse_definition(kind: str, definition) -> Dict:
+    """Extract the references of a definition, which are kept in the index."""
+    if not isinstance(definition, dict):
+        raise Exception('definition is not a mapping')
+
+    record = {}
+    if kind == 'types':
+        record['types'] = {}
+        for type_name, type_def in definition.get('types', {}).items():
+            refs = set()
+            collect_type_refs(type_def, refs)
+            record['types'][type_name] = sorted(refs)
+    elif kind == 'interfaces':
+        refs = set()
+        collect_type_refs(definition.get('vars', {}), refs)
+        collect_type_refs(definition.get('cmds', {}), refs)
+        record['types'] = sorted(refs)
+        record['errors'] = sorted(set(entry['reference'] for entry in definition.get('errors', [])
+                                      if isinstance(entry, dict) and 'reference' in entry))
+    elif kind == 'errors':
+        record['errors'] = sorted(error['name'] for error in definition.get('errors', []) if 'name' in error)
+    elif kind == 'modules':
+        record['provides'] = {impl_id: impl['interface'] for impl_id, impl in definition.get('provides', {}).items()}
+        record['requires'] = {req_id: req['interface'] for req_id, req in definition.get('requires', {}).items()}
+        refs = set()
+        collect_type_refs(definition.get('config', {}), refs)
+        collect_type_refs(definition.get('provides', {}), refs)
+        record['types'] = sorted(refs)
+
+    return record
+
+
+class DefinitionIndex:
+    """Index the references between all definitions of the everest dirs, the first everest dir wins."""
+    version = 1
+    kinds = ('types', 'interfaces', 'errors', 'modules')
+
+    def __init__(self, everest_dirs: List[Path]):
+        self.everest_dirs = [Path(everest_dir) for everest_dir in everest_dirs]
+        # parsed records by file path, together with the (mtime, size) they have been parsed at
+        self.files: Dict[str, Dict] = {}
+        # parse errors by file path, broken files are left out of the index
+        self.broken: Dict[str, str] = {}
+        self.types: Dict[str, List[str]] = {}
+        self.type_files: Dict[str, str] = {}
+        self.interfaces: Dict[str, Dict] = {}
+        self.errors: Dict[str, List[str]] = {}
+        self.modules: Dict[str, Dict] = {}
+        self.type_users: Dict[str, Set[str]] = {}
+
+    def scan(self) -> List[Tuple[str, str, Path]]:
+        """List (kind, name, path) of all definition files, in the order of the everest dirs."""
+        definition_files = []
+        for everest_dir in self.everest_dirs:
+            for kind in DefinitionIndex.kinds:
+                kind_dir = everest_dir / kind
+                for root, _dirs, files in os.walk(kind_dir, followlinks=True):
+                    root = Path(root)
+                    for file_name in sorted(files):
+                        path = root / file_name
+                        if path.suffix not in DEFINITION_SUFFIXES:
+                            continue
+                        if kind == 'modules':
+                            if path.stem != 'manifest':
+                                continue
+                            name = path.parent.relative_to(kind_dir).as_posix()
+                        else:
+                            name = path.relative_to(kind_dir).with_suffix('').as_posix()
+                        definition_files.append((kind, name, path))
+
+        return definition_files
+
+    def refresh(self) -> int:
+        """Bring the index up to date with the definition files, returns the number of (re)parsed files."""
+        files = {}
+        broken = {}
+        parsed = 0
+        for kind, name, path in self.scan():
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            key = str(path)
+            file_stat = [stat.st_mtime_ns, stat.st_size]
+            entry = self.files.get(key)
+            if entry is None or entry['stat'] != file_stat or entry['kind'] != kind:
+                parsed += 1
+                try:
+                    record = parse_definition(kind, yaml_utils.safe_load(path.read_text()))
+                except Exception as err:
+                    broken[key] = str(err)
+                    continue
+                entry = {'kind': kind, 'name': name, 'stat': file_stat, 'record': record}
+            files[key] = entry
+
+        self.files = files
+        self.broken = broken
+        self.link()
+
+        return parsed
+
+    def link(self):
+        """Merge the records of all files, definitions in earlier everest dirs shadow later ones."""
+        self.types = {}
+        self.type_files = {}
+        self.interfaces = {}
+        self.errors = {}
+        self.modules = {}
+        seen = set()
+        for path, entry in self.files.items():
+            kind, name, record = entry['kind'], entry['name'], entry['record']
+            if (kind, name) in seen:
+                continue
+            seen.add((kind, name))
+            if kind == 'types':
+                self.type_files[name] = path
+                for type_name, refs in record['types'].items():
+                    self.types[f'/{name}#/{type_name}'] = refs
+            elif kind == 'interfaces':
+                self.interfaces[name] = dict(record, path=path)
+            elif kind == 'errors':
+                self.errors[name] = record['errors']
+            elif kind == 'modules':
+                self.modules[name] = dict(record, path=path)
+
+        self.type_users = {}
+        for type_url, refs in self.types.items():
+            for ref in refs:
+                self.type_users.setdefault(ref, set()).add(type_url)
+
+    def types_used_by(self, type_urls: Iterable[str]) -> Set[str]:
+        """Get the given types and all types they (indirectly) refer to."""
+        used = set()
+        pending = deque(type_urls)
+        while pending:
+            type_url = pending.popleft()
+            if type_url in used:
+                continue
+            used.add(type_url)
+            pending.extend(self.types.get(type_url, []))
+
+        return used
+
+    def interfaces_using_type(self, type_url: str) -> List[str]:
+        """Get the interfaces referring to a type, directly or through other types."""
+        users = set()
+        pending = deque([type_url])
+        while pending:
+            user = pending.popleft()
+            if user in users:
+                continue
+            users.add(user)
+            pending.extend(self.type_users.get(user, []))
+
+        return sorted(interface for interface, record in self.interfaces.items()
+                      if users.intersection(record['types']))
+
+    def modules_requiring_interface(self, interface: str) -> List[str]:
+        return sorted(module for module, record in self.modules.items() if interface in record['requires'].values())
+
+    def modules_providing_interface(self, interface: str) -> List[str]:
+        return sorted(module for module, record in self.modules.items() if interface in record['provides'].values())
+
+    def unused_types(self) -> List[str]:
+        """Get the types, which are neither used by any interface or module, nor by a used type."""
+        roots = set()
+        for record in [*self.interfaces.values(), *self.modules.values()]:
+            roots.update(record['types'])
+
+        return sorted(set(self.types) - self.types_used_by(roots))
+
+    def unresolved_references(self) -> Dict[str, List[str]]:
+        """Get the type and error references, which do not resolve to any definition, by referring definition."""
+        unresolved = {}
+        for type_url, refs in self.types.items():
+            missing = [ref for ref in refs if ref not in self.types]
+            if missing:
+                unresolved[type_url] = missing
+        for kind, definitions in (('interfaces', self.interfaces), ('modules', self.modules)):
+            for name, record in definitions.items():
+                missing = [ref for ref in record['types'] if ref not in self.types]
+                for error_ref in record.get('errors', []):
+                    namespace, _, error_name = error_ref[len('/errors/'):].partition('#/')
+                    if namespace not in self.errors or (error_name and error_name not in self.errors[namespace]):
+                        missing.append(error_ref)
+                if missing:
+                    unresolved[f'{kind}/{name}'] = missing
+
+        return unresolved
+
+    def query(self, query: str, name: Optional[str] = None):
+        """Answer one of the QUERIES, the result can be serialized to json."""
+        if query not in QUERIES:
+            raise Exception(f'Unknown query "{query}", available queries: {", ".join(QUERIES)}')
+        if query in NAMED_QUERIES and not name:
+            raise Exception(f'Query "{query}" needs the name of a type or an interface')
+
+        if query == 'interfaces-using-type':
+            return self.interfaces_using_type(name)
+        if query == 'modules-requiring':
+            return self.modules_requiring_interface(name)
+        if query == 'modules-providing':
+            return self.modules_providing_interface(name)
+        if query == 'unused-types':
+            return self.unused_types()
+        if query == 'unresolved':
+            return self.unresolved_references()
+
+        return {
+            'types': len(self.types),
+            'interfaces': len(self.interfaces),
+            'errors': sum(len(errors) for errors in self.errors.values()),
+            'modules': len(self.modules),
+            'broken': self.broken,
+        }
+
+    def save(self, snapshot_file: Path):
+        snapshot = {
+            'version': DefinitionIndex.version,
+            'everest_dirs': [str(everest_dir) for everest_dir in self.everest_dirs],
+            'files': self.files,
+        }
+        snapshot_file.parent.mkdir(parents=True, exist_ok=True)
+        write_cache_file(snapshot_file, json.dumps(snapshot, separators=(',', ':'), sort_keys=True).encode('utf-8'))
+
+    @classmethod
+    def load(cls, everest_dirs: List[Path], snapshot_file: Optional[Path] = None) -> 'DefinitionIndex':
+        """Load the index from a snapshot, if there is a matching one, and bring it up to date."""
+        index = cls(everest_dirs)
+        if snapshot_file:
+            try:
+                snapshot = json.loads(snapshot_file.read_text())
+                if (snapshot.get('version') == cls.version
+                        and snapshot.get('everest_dirs') == [str(everest_dir) for everest_dir in index.everest_dirs]):
+                    index.files = snapshot['files']
+            except (OSError, ValueError):
+                pass
+        index.refresh()
+
+        return index
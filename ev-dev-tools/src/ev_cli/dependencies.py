@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+#
+# SPDX-License-Identifier: Apache-2.0
+# Copyright Pionix GmbH and Contributors to EVerest
+#
+"""
+Provide tracking of the files generated outputs depend on, for incremental regeneration and depfiles.
+"""
+
+from .parse_cache import write_cache_file
+
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+import hashlib
+import json
+import os
+
+
+class DependencyTracker:
+    """Record the files read while generating a target."""
+    recorded: Optional[Set[Path]] = None
+
+    @classmethod
+    @contextmanager
+    def record(cls):
+        """Record all files added while in this context, nested recordings are added to the outer one."""
+        previous = cls.recorded
+        cls.recorded = set()
+        try:
+            yield cls.recorded
+        finally:
+            recorded = cls.recorded
+            cls.recorded = previous
+            if previous is not None:
+                previous.update(recorded)
+
+    @classmethod
+    def add(cls, path):
+        """Add a file to the current recording, if there is one."""
+        if cls.recorded is not None:
+            cls.recorded.add(Path(path))
+
+
+def run_recorded(task, *args):
+    """Run task and return its result together with the files it depends on (also usable in worker processes)."""
+    with DependencyTracker.record() as inputs:
+        result = task(*args)
+
+    return (result, sorted(inputs))
+
+
+def file_digest(path: Path) -> Optional[str]:
+    """Get the sha256 digest of a file, None if it does not exist."""
+    try:
+        return hashlib.sha256(path.read_bytes()).hexdigest()
+    except OSError:
+        return None
+
+
+def escape_make_path(path) -> str:
+    """Escape a path for usage in a Make or Ninja depfile."""
+    return str(path).replace('\\', '\\\\').replace(' ', '\\ ').replace('#', '\\#').replace('$', '$$')
+
+
+def format_make_rule(outputs: Iterable, inputs: Iterable) -> str:
+    """Format a Make rule, as understood by Make and Ninja depfile parsers."""
+    rule = ' '.join(escape_make_path(output) for output in outputs) + ':'
+    for input_path in inputs:
+        rule += ' \\\n  ' + escape_make_path(input_path)
+
+    return rule + '\n'
+
+
+def newest_mtime(paths: Iterable) -> float:
+    """Get the newest modification time of the given files, files that do not exist are ignored."""
+    mtimes = [0.0]
+    for path in paths:
+        try:
+            mtimes.append(Path(path).stat().st_mtime)
+        except OSError:
+            pass
+
+    return max(mtimes)
+
+
+def touch_outdated_outputs(outputs: Iterable, inputs: Iterable):
+    """Touch outputs older than any of the inputs, which have been skipped because their content is up-to-date."""
+    inputs_mtime = newest_mtime(inputs)
+    for output in outputs:
+        try:
+            if Path(output).stat().st_mtime < inputs_mtime:
+                os.utime(output)
+        except OSError:
+            pass
+
+
+def write_depfile(depfile: Path, outputs: Iterable, inputs: Iterable):
+    """Write a depfile with a single rule, listing all outputs and all inputs they have been generated from."""
+    outputs = list(outputs)
+    inputs = sorted(set(str(input_path) for input_path in inputs))
+    # otherwise Make and Ninja would consider the outputs outdated forever
+    touch_outdated_outputs(outputs, inputs)
+    depfile.parent.mkdir(parents=True, exist_ok=True)
+    depfile.write_text(format_make_rule(outputs, inputs))
+
+
+class DependencyGraph:
+    """Persisted graph of generated targets, the files they were generated from and the files they produced."""
+    version = 1
+
+    def __init__(self, graph_file: Path):
+        self.graph_file = graph_file
+        self.targets: Dict[str, Dict] = {}
+        self.digests: Dict[Path, Optional[str]] = {}
+
+        try:
+            graph = json.loads(graph_file.read_text())
+            if graph.get('version') == DependencyGraph.version:
+                self.targets = graph['targets']
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def input_digest(self, path: Path) -> Optional[str]:
+        """Get the digest of an input file, input files are only hashed once per run."""
+        if path not in self.digests:
+            self.digests[path] = file_digest(path)
+
+        return self.digests[path]
+
+    def is_up_to_date(self, target: str, settings: str) -> bool:
+        """Check if none of the inputs and outputs of a target changed since it has been generated last."""
+        entry = self.targets.get(target)
+        if not entry or entry['settings'] != settings:
+            return False
+
+        for input_path, digest in entry['inputs'].items():
+            if self.input_digest(Path(input_path)) != digest:
+                return False
+
+        for output_path, digest in entry['outputs'].items():
+            if file_digest(Path(output_path)) != digest:
+                return False
+
+        return True
+
+    def update(self, target: str, settings: str, inputs: Iterable[Path], outputs: Iterable[Path]):
+        """Record the inputs and outputs of a freshly generated target."""
+        self.targets[target] = {
+            'settings': settings,
+            'inputs': {str(path): self.input_digest(Path(path)) for path in sorted(set(inputs))},
+            'outputs': {str(path): file_digest(Path(path)) for path in sorted(set(outputs))},
+        }
+
+    def discard(self, target: str):
+        """Forget a target, so it is generated again by the next run."""
+        self.targets.pop(target, None)
+
+    def inputs_of(self, target: str) -> List[str]:
+        entry = self.targets.get(target)
+        return list(entry['inputs']) if entry else []
+
+    def outputs_of(self, target: str) -> List[str]:
+        entry = self.targets.get(target)
+        return list(entry['outputs']) if entry else []
+
+    def save(self):
+        self.graph_file.parent.mkdir(parents=True, exist_ok=True)
+        graph = {'version': DependencyGraph.version, 'targets': self.targets}
+        write_cache_file(self.graph_file, json.dumps(graph, indent=1, sort_keys=True).encode('utf-8'))
+
+    def to_make_rules(self) -> str:
+        """Format the whole graph as Make rules, one rule per target."""
+        rules = ''
+        for target in sorted(self.targets):
+            entry = self.targets[target]
+            rules += format_make_rule(entry['outputs'], entry['inputs'])
+
+        return rules
@@ -11,7 +11,10 @@ author: andreas.heinrich@pionix.de
 from typing import List, NamedTuple
 from pathlib import Path
 from . import helpers
-import yaml, jsonschema
+from .parse_cache import ParseCache
+from .dependencies import DependencyTracker
+from . import yaml_utils
+from .profiling import Span
 
 class ErrorDefinition(NamedTuple):
     """Error definition class."""
@@ -23,12 +26,22 @@ class ErrorParser:
     """Error parser class."""
     validators = None
     error_definitions = {}
+    error_definition_files = {}
 
     @classmethod
     def load_error_definition_file(cls, path: Path):
+        import yaml, jsonschema
         try:
-            error_def = yaml.safe_load(path.read_text())
-            ErrorParser.validators['error_declaration_list'].validate(error_def)
+            content = path.read_text()
+            validator = ErrorParser.validators['error_declaration_list']
+            cache_key = ParseCache.key('error', content, validator)
+            error_def = ParseCache.load(cache_key)
+            if error_def is None:
+                with Span('yaml', path):
+                    error_def = yaml_utils.safe_load(content)
+                with Span('validation', path):
+                    validator.validate(error_def)
+                ParseCache.store(cache_key, error_def)
         except OSError as err:
             raise Exception(f'Could not open error definition file {err.filename}: {err.strerror}') from err
         except yaml.YAMLError as err:
@@ -41,6 +54,7 @@ class ErrorParser:
             raise Exception(f'Error definition namespace { namespace } already exists.')
         else:
             cls.error_definitions[namespace] = {}
+            cls.error_definition_files[namespace] = path
         for entry in error_def['errors']:
             error = ErrorDefinition(namespace, entry['name'], entry['description'])
             if error.name in cls.error_definitions[error.namespace]:
@@ -53,6 +67,7 @@ class ErrorParser:
         if namespace not in cls.error_definitions:
             path = helpers.resolve_everest_dir_path(f'errors/{ namespace }.yaml')
             cls.load_error_definition_file(path)
+        DependencyTracker.add(cls.error_definition_files[namespace])
         if name not in cls.error_definitions[namespace]:
             raise Exception(f'Error definition { namespace }/{ name } does not exist.')
         return cls.error_definitions[namespace][name]
@@ -63,6 +78,7 @@ class ErrorParser:
         if namespace not in cls.error_definitions:
             path = helpers.resolve_everest_dir_path(f'errors/{ namespace }.yaml')
             cls.load_error_definition_file(path)
+        DependencyTracker.add(cls.error_definition_files[namespace])
         result = []
         for error in cls.error_definitions[namespace].values():
             result.append(error)
@@ -13,12 +13,22 @@ from ev_cli import __version__
 from ev_cli import helpers
 from ev_cli.type_parsing import TypeParser
 from ev_cli.error_parsing import ErrorParser
+from ev_cli.parse_cache import ParseCache
+from ev_cli.dependencies import DependencyGraph, DependencyTracker, newest_mtime, run_recorded, write_depfile
+from ev_cli.everest_dir_index import EverestDirIndex
+from ev_cli.definition_index import QUERIES
+from ev_cli import schema_validation
+from ev_cli import file_diff
+from ev_cli.profiling import Profiler, Span, profile_target
 
 from datetime import datetime
 from pathlib import Path
-import jinja2 as j2
 import argparse
+import json
+import os
+import shlex
 import stringcase
+import sys
 from typing import List
 
 
@@ -26,44 +36,72 @@ from typing import List
 
 # global variables
 everest_dirs: List[Path] = []
+# everest dirs given to the last setup_generator call, without the everest projects detected by module commands
+configured_everest_dirs: List[Path] = []
 work_dir: Path = None
 
-# jinja template environment and global variable
-env = j2.Environment(loader=j2.FileSystemLoader(Path(__file__).parent / 'templates'),
-                     lstrip_blocks=True, trim_blocks=True, undefined=j2.StrictUndefined,
-                     keep_trailing_newline=True)
+# jinja template environment and global variable, the environment is created on first use, so commands not
+# rendering any templates do not need to import jinja2
+env = None
+
+templates_dir = Path(__file__).parent / 'templates'
+template_files = {
+    'interface_base': 'interface-Base.hpp.j2',
+    'interface_exports': 'interface-Exports.hpp.j2',
+    'interface_impl.hpp': 'interface-Impl.hpp.j2',
+    'interface_impl.cpp': 'interface-Impl.cpp.j2',
+    'types.hpp': 'types.hpp.j2',
+    'module.hpp': 'module.hpp.j2',
+    'module.cpp': 'module.cpp.j2',
+    'ld-ev.hpp': 'ld-ev.hpp.j2',
+    'ld-ev.cpp': 'ld-ev.cpp.j2',
+    'cmakelists': 'CMakeLists.txt.j2',
+    'index.rst': 'index.rst.j2',
+}
 
 templates = {}
 validators = {}
+# validators per schemas directory and validation backend, so batch runs load every schema only once
+loaded_validators = {}
+# schemas directory, cache directory and validation backend of the current setup, needed for initializing
+# worker processes
+generator_setup = ()
 
 # Function declarations
 
 
-def setup_jinja_env():
+def setup_jinja_env(bytecode_cache_dir: Path = None):
+    global env
+    import jinja2 as j2
+
+    # compiled templates are stored as bytecode, which is only reused while the template source is unchanged
+    bytecode_cache = j2.FileSystemBytecodeCache(str(bytecode_cache_dir)) if bytecode_cache_dir else None
+    env = j2.Environment(loader=j2.FileSystemLoader(templates_dir),
+                         lstrip_blocks=True, trim_blocks=True, undefined=j2.StrictUndefined,
+                         keep_trailing_newline=True, bytecode_cache=bytecode_cache)
+
+    class ProfiledTemplate(j2.Template):
+        def render(self, *args, **kwargs):
+            with Span('render', self.name):
+                return super().render(*args, **kwargs)
+
+    env.template_class = ProfiledTemplate
+
     env.globals['timestamp'] = datetime.utcnow()
     # FIXME (aw): which repo to use? everest or everest-framework?
     env.filters['snake_case'] = helpers.snake_case
     env.filters['create_dummy_result'] = helpers.create_dummy_result
 
-    templates.update({
-        'interface_base': env.get_template('interface-Base.hpp.j2'),
-        'interface_exports': env.get_template('interface-Exports.hpp.j2'),
-        'interface_impl.hpp': env.get_template('interface-Impl.hpp.j2'),
-        'interface_impl.cpp': env.get_template('interface-Impl.cpp.j2'),
-        'types.hpp': env.get_template('types.hpp.j2'),
-        'module.hpp': env.get_template('module.hpp.j2'),
-        'module.cpp': env.get_template('module.cpp.j2'),
-        'ld-ev.hpp': env.get_template('ld-ev.hpp.j2'),
-        'ld-ev.cpp': env.get_template('ld-ev.cpp.j2'),
-        'cmakelists': env.get_template('CMakeLists.txt.j2'),
-        'index.rst': env.get_template('index.rst.j2'),
-    })
+    templates.update({name: env.get_template(file_name) for name, file_name in template_files.items()})
+
+
+def get_template_path(name: str) -> str:
+    """Get the path of a template file, without loading the template."""
+    return str(templates_dir / template_files[name])
 
 
 def generate_tmpl_data_for_if(interface, if_def, type_file):
-    helpers.parsed_enums.clear()
-    helpers.parsed_types.clear()
-    helpers.type_headers.clear()
+    parse_state = helpers.new_parse_state()
     types = []
     enums = []
     vars = []
@@ -95,7 +133,7 @@ def generate_tmpl_data_for_if(interface, if_def, type_file):
         cmds.append({'name': cmd, 'args': args, 'result': result_type_info})
 
     if type_file:
-        for parsed_enum in helpers.parsed_enums:
+        for parsed_enum in parse_state.enums:
             enum_info = {
                 'name': parsed_enum['name'],
                 'description': parsed_enum['description'],
@@ -105,14 +143,14 @@ def generate_tmpl_data_for_if(interface, if_def, type_file):
             enums.append(enum_info)
 
     if type_file:
-        for parsed_type in helpers.parsed_types:
+        for parsed_type in parse_state.types:
             parsed_type['name'] = stringcase.capitalcase(parsed_type['name'])
             if 'properties' in parsed_type:
                 for prop in parsed_type['properties']:
                     if 'type_dict' in prop['info']:
                         path = Path('generated/types') / \
                             prop['info']['type_dict']['type_relative_path'].with_suffix('.hpp')
-                        helpers.type_headers.add(path.as_posix())
+                        parse_state.type_headers.add(path.as_posix())
 
             types.append(parsed_type)
 
@@ -137,7 +175,7 @@ def generate_tmpl_data_for_if(interface, if_def, type_file):
             'base_class_header': f'generated/interfaces/{interface}/Implementation.hpp',
             'interface': interface,
             'desc': if_def['description'],
-            'type_headers': sorted(helpers.type_headers)
+            'type_headers': sorted(parse_state.type_headers)
         },
         'enums': enums,
         'types': types,
@@ -477,7 +515,6 @@ def generate_interface_headers(interface, all_interfaces_flag, output_dir):
     tmpl_data = generate_tmpl_data_for_if(interface, if_def, False)
 
     output_path = output_dir / interface
-    output_path.mkdir(parents=True, exist_ok=True)
 
     tmpl_data['info']['interface_name'] = f'{interface}'
     tmpl_data['info']['namespace'] = [f'{interface}']
@@ -526,12 +563,19 @@ def generate_interface_headers(interface, all_interfaces_flag, output_dir):
     return if_parts
 
 
+def add_detected_everest_projects(args):
+    """Append the everest projects found in the CMake cache to the everest dirs of the current command.
+
+    The next command (in batch mode) starts with the configured everest dirs again, the parsed definitions are kept.
+    """
+    detected_projects = helpers.detect_everest_projects(args.everest_projects, args.build_dir)
+    everest_dirs.extend(project for project in detected_projects if project not in everest_dirs)
+
+
 def module_create(args):
     create_strategy = 'force-create' if args.force else 'create'
 
-    detected_projects = helpers.detect_everest_projects(args.everest_projects, args.build_dir)
-    if detected_projects:
-        helpers.everest_dirs.extend(detected_projects)
+    add_detected_everest_projects(args)
 
     mod_files = generate_module_files(args.module, False, args.licenses)
 
@@ -545,29 +589,38 @@ def module_create(args):
             print(err)
             return
 
-    for file_info in mod_files['core'] + mod_files['interfaces'] + mod_files['docs']:
-        if not args.disable_clang_format:
-            helpers.clang_format(args.clang_format_file, file_info)
+    if not args.disable_clang_format:
+        helpers.clang_format_files(args.clang_format_file, mod_files['core'] + mod_files['interfaces'])
 
+    for file_info in mod_files['core'] + mod_files['interfaces'] + mod_files['docs']:
         helpers.write_content_to_file(file_info, create_strategy, args.diff)
 
 
 def module_update(args):
-    detected_projects = helpers.detect_everest_projects(args.everest_projects, args.build_dir)
-    if detected_projects:
-        helpers.everest_dirs.extend(detected_projects)
+    add_detected_everest_projects(args)
+
+    # partial updates are not tracked in the dependency graph
+    graph = load_dependency_graph(args) if not args.only else None
+    target = f'module:{args.module}:{work_dir}'
+    settings = generation_settings(args, work_dir)
+    if graph and graph.is_up_to_date(target, settings):
+        print(f'Skipping module {args.module} (up-to-date)')
+        return
 
-    # Always generate type info before updating module
-    for type_with_namespace in list_types_with_namespace():
-        _tmpl_data, _last_mtime = TypeParser.generate_type_info(type_with_namespace, all_types=True)
+    if not graph:
+        # Always generate type info before updating module
+        for type_with_namespace in list_types_with_namespace():
+            _tmpl_data, _last_mtime = TypeParser.generate_type_info(type_with_namespace, all_types=True)
 
-    primary_update_strategy = 'force-update' if args.force else 'update'
+    # the dependency graph only lets outdated targets through, their outputs must not be skipped by modification time
+    primary_update_strategy = 'force-update' if args.force or graph else 'update'
     update_strategy = {'module.cpp': 'update-if-non-existent'}
     for file_name in ['cmakelists', 'module.hpp']:
         update_strategy[file_name] = primary_update_strategy
 
     # FIXME (aw): refactor out this only handling and rename it properly
-    mod_files = generate_module_files(args.module, True, args.licenses)
+    with DependencyTracker.record() as inputs:
+        mod_files = generate_module_files(args.module, True, args.licenses)
 
     if args.only == 'which':
         helpers.print_available_mod_files(mod_files)
@@ -580,50 +633,80 @@ def module_update(args):
             return
 
     if not args.disable_clang_format:
-        for file_info in mod_files['core'] + mod_files['interfaces']:
-            helpers.clang_format(args.clang_format_file, file_info)
+        helpers.clang_format_files(args.clang_format_file, mod_files['core'] + mod_files['interfaces'])
 
+    include_inputs_mtime(inputs, mod_files['core'] + mod_files['interfaces'], args)
+    written = []
     for file_info in mod_files['core']:
-        helpers.write_content_to_file(file_info, update_strategy[file_info['abbr']], args.diff, '', True)
+        written.append(helpers.write_content_to_file(file_info, update_strategy[file_info['abbr']], args.diff, '',
+                                                     True))
 
     for file_info in mod_files['interfaces']:
         if file_info['abbr'].endswith('.hpp'):
-            helpers.write_content_to_file(file_info, primary_update_strategy, args.diff, '', True)
+            written.append(helpers.write_content_to_file(file_info, primary_update_strategy, args.diff, '', True))
         else:
-            helpers.write_content_to_file(file_info, 'update-if-non-existent', args.diff, '', True)
+            written.append(helpers.write_content_to_file(file_info, 'update-if-non-existent', args.diff, '', True))
+
+    if graph:
+        update_dependency_graph(graph, target, settings, inputs, mod_files['core'] + mod_files['interfaces'], args,
+                                all(written))
+        graph.save()
 
 
 def module_genld(args):
     output_dir = Path(args.output_dir).resolve() if args.output_dir else work_dir / \
         'build/generated/generated/modules'
-    primary_update_strategy = 'force-update' if args.force else 'update'
 
-    loader_files = generate_module_loader_files(args.module, output_dir)
+    graph = load_dependency_graph(args)
+    # the dependency graph only lets outdated targets through, their outputs must not be skipped by modification time
+    primary_update_strategy = 'force-update' if args.force or graph else 'update'
+    target = f'module-loader:{args.module}:{output_dir}'
+    settings = generation_settings(args, output_dir)
+    if graph and graph.is_up_to_date(target, settings):
+        print(f'Skipping loader of module {args.module} (up-to-date)')
+        if args.depfile:
+            write_depfile(Path(args.depfile), graph.outputs_of(target), graph.inputs_of(target))
+        return
+
+    with DependencyTracker.record() as inputs:
+        loader_files = generate_module_loader_files(args.module, output_dir)
 
     if not args.disable_clang_format:
-        for file_info in loader_files:
-            helpers.clang_format(args.clang_format_file, file_info)
+        helpers.clang_format_files(args.clang_format_file, loader_files)
 
-    for file_info in loader_files:
-        helpers.write_content_to_file_and_check_template(file_info, primary_update_strategy)
+    include_inputs_mtime(inputs, loader_files, args)
+    written = [helpers.write_content_to_file_and_check_template(file_info, primary_update_strategy)
+               for file_info in loader_files]
+
+    if graph:
+        update_dependency_graph(graph, target, settings, inputs, loader_files, args, all(written))
+        graph.save()
+
+    if args.depfile:
+        write_depfile(Path(args.depfile), [file_info['path'] for file_info in loader_files],
+                      target_inputs(inputs, loader_files, args))
 
 
 def module_get_templates(args):
     interface_files = args.separator.join(
-        [templates['ld-ev.hpp'].filename,
-         templates['ld-ev.cpp'].filename])
+        [get_template_path('ld-ev.hpp'),
+         get_template_path('ld-ev.cpp')])
 
     print(f'{interface_files}')
 
 
 def interface_genhdr(args):
-    # Always generate type info before generating interfaces
-    for type_with_namespace in list_types_with_namespace():
-        _tmpl_data, _last_mtime = TypeParser.generate_type_info(type_with_namespace, all_types=True)
+    graph = load_dependency_graph(args)
+
+    if not graph:
+        # Always generate type info before generating interfaces
+        for type_with_namespace in list_types_with_namespace():
+            _tmpl_data, _last_mtime = TypeParser.generate_type_info(type_with_namespace, all_types=True)
 
     output_dir = Path(args.output_dir).resolve() if args.output_dir else work_dir / \
         'build/generated/include/generated/interfaces'
-    primary_update_strategy = 'force-update' if args.force else 'update'
+    # the dependency graph only lets outdated targets through, their outputs must not be skipped by modification time
+    primary_update_strategy = 'force-update' if args.force or graph else 'update'
 
     interfaces = args.interfaces
     all_interfaces = False
@@ -635,24 +718,56 @@ def interface_genhdr(args):
             interfaces += [if_path.stem for if_path in if_dir.iterdir() if (if_path.is_file()
                                                                             and if_path.suffix == '.yaml')]
 
-    for interface in interfaces:
-        if_parts = generate_interface_headers(interface, all_interfaces, output_dir)
+    settings = generation_settings(args, output_dir)
+    depfile_outputs = []
+    depfile_inputs = set()
+    if graph:
+        outdated_interfaces = []
+        for interface in interfaces:
+            target = f'interface:{interface}:{output_dir}'
+            if graph.is_up_to_date(target, settings):
+                print(f'Skipping interface {interface} (up-to-date)')
+                depfile_outputs.extend(graph.outputs_of(target))
+                depfile_inputs.update(graph.inputs_of(target))
+            else:
+                outdated_interfaces.append(interface)
+        interfaces = outdated_interfaces
+
+    results = run_generation_tasks(generate_interface_headers,
+                                   [(interface, all_interfaces, output_dir) for interface in interfaces],
+                                   args.jobs)
+    # interfaces, that have been ignored, don't have any parts
+    results = [(interface, if_parts, inputs)
+               for interface, (if_parts, inputs) in zip(interfaces, results) if if_parts]
+
+    if not args.disable_clang_format:
+        helpers.clang_format_files(args.clang_format_file,
+                                   [file_info for _, if_parts, _ in results for file_info in if_parts.values()],
+                                   args.jobs)
+
+    for interface, if_parts, inputs in results:
+        include_inputs_mtime(inputs, if_parts.values(), args)
+        written = [helpers.write_content_to_file_and_check_template(if_parts[part], primary_update_strategy, args.diff)
+                   for part in ['base', 'exports', 'types']]
+
+        if graph:
+            update_dependency_graph(graph, f'interface:{interface}:{output_dir}', settings, inputs,
+                                    list(if_parts.values()), args, all(written))
 
-        if not args.disable_clang_format:
-            # FIXME (aw): this broken, because in case all_interfaces is true, if_parts might be none for invalid interface files
-            helpers.clang_format(args.clang_format_file, if_parts['base'])
-            helpers.clang_format(args.clang_format_file, if_parts['exports'])
-            helpers.clang_format(args.clang_format_file, if_parts['types'])
+        depfile_outputs.extend(file_info['path'] for file_info in if_parts.values())
+        depfile_inputs.update(target_inputs(inputs, if_parts.values(), args))
 
-        helpers.write_content_to_file_and_check_template(if_parts['base'], primary_update_strategy, args.diff)
-        helpers.write_content_to_file_and_check_template(if_parts['exports'], primary_update_strategy, args.diff)
-        helpers.write_content_to_file_and_check_template(if_parts['types'], primary_update_strategy, args.diff)
+    if graph:
+        graph.save()
+
+    if args.depfile:
+        write_depfile(Path(args.depfile), depfile_outputs, depfile_inputs)
 
 
 def interface_get_templates(args):
     interface_files = args.separator.join(
-        [templates['interface_base'].filename,
-         templates['interface_exports'].filename])
+        [get_template_path('interface_base'),
+         get_template_path('interface_exports')])
 
     print(f'{interface_files}')
 
@@ -671,6 +786,18 @@ def helpers_json2yaml(args):
     helpers.json2yaml(Path(args.input).resolve(), Path(args.output).resolve())
 
 
+def helpers_dependency_graph(args):
+    graph_file = Path(args.cache_dir).resolve() / 'dependency-graph.json'
+    if not graph_file.exists():
+        raise Exception(f'No dependency graph found in {graph_file}, run ev-cli with --incremental first')
+
+    rules = DependencyGraph(graph_file).to_make_rules()
+    if args.output:
+        Path(args.output).write_text(rules)
+    else:
+        print(rules, end='')
+
+
 def list_types_with_namespace(types=None) -> List:
     if not types:
         types = []
@@ -709,8 +836,6 @@ def types_genhdr(args):
     output_dir = Path(args.output_dir).resolve() if args.output_dir else work_dir / \
         'build/generated/generated/types'
 
-    primary_update_strategy = 'force-update' if args.force else 'update'
-
     types = None
     all_types = False
     if 'types' not in args:
@@ -720,26 +845,397 @@ def types_genhdr(args):
 
     types_with_namespace = list_types_with_namespace(types=types)
 
-    for type_with_namespace in types_with_namespace:
-        type_parts = TypeParser.generate_type_headers(type_with_namespace, all_types, output_dir)
+    graph = load_dependency_graph(args)
+    # the dependency graph only lets outdated targets through, their outputs must not be skipped by modification time
+    primary_update_strategy = 'force-update' if args.force or graph else 'update'
+    settings = generation_settings(args, output_dir)
+    depfile_outputs = []
+    depfile_inputs = set()
+    if graph:
+        outdated_types = []
+        for type_with_namespace in types_with_namespace:
+            target = f'types:{type_with_namespace["namespace"]}:{output_dir}'
+            if graph.is_up_to_date(target, settings):
+                print(f'Skipping types {type_with_namespace["namespace"]} (up-to-date)')
+                depfile_outputs.extend(graph.outputs_of(target))
+                depfile_inputs.update(graph.inputs_of(target))
+            else:
+                outdated_types.append(type_with_namespace)
+        types_with_namespace = outdated_types
+
+    results = run_generation_tasks(TypeParser.generate_type_headers,
+                                   [(type_with_namespace, all_types, output_dir)
+                                    for type_with_namespace in types_with_namespace],
+                                   args.jobs)
+
+    if not args.disable_clang_format:
+        helpers.clang_format_files(args.clang_format_file,
+                                   [type_parts['types'] for type_parts, _ in results], args.jobs)
+
+    for type_with_namespace, (type_parts, inputs) in zip(types_with_namespace, results):
+        include_inputs_mtime(inputs, [type_parts['types']], args)
+        written = helpers.write_content_to_file_and_check_template(type_parts['types'], primary_update_strategy,
+                                                                   args.diff)
+
+        if graph:
+            update_dependency_graph(graph, f'types:{type_with_namespace["namespace"]}:{output_dir}', settings,
+                                    inputs, [type_parts['types']], args, written)
+
+        depfile_outputs.append(type_parts['types']['path'])
+        depfile_inputs.update(target_inputs(inputs, [type_parts['types']], args))
+
+    if graph:
+        graph.save()
+
+    if args.depfile:
+        write_depfile(Path(args.depfile), depfile_outputs, depfile_inputs)
+
+
+def run_generation_tasks(task, task_args, jobs):
+    """Run task for all provided task arguments and return the results in the same order.
+
+    Every result is returned together with the files the task depended on.  With more than one job, the tasks
+    are distributed to a process pool.  Errors of all tasks are collected and reported together, before the
+    generation is aborted.
+    """
+    if jobs == 1 or len(task_args) <= 1:
+        return [run_generation_task(task, *args) for args in task_args]
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    results = []
+    errors = []
+    with ProcessPoolExecutor(max_workers=jobs, initializer=setup_generator,
+                             initargs=(list(everest_dirs), *generator_setup)) as executor:
+        if Profiler.enabled:
+            # spans recorded by the workers are sent back together with the results
+            futures = [executor.submit(Profiler.run_collected, run_generation_task, task, *args) for args in task_args]
+        else:
+            futures = [executor.submit(run_generation_task, task, *args) for args in task_args]
+        for args, future in zip(task_args, futures):
+            try:
+                result = future.result()
+                if Profiler.enabled:
+                    result, events = result
+                    Profiler.events.extend(events)
+                results.append(result)
+            except BaseException as err:
+                errors.append(f'{generation_task_name(args)}: {err}')
+
+    if errors:
+        error_list = '\n  '.join(errors)
+        raise helpers.EVerestParsingException(f'Generation failed for {len(errors)} of {len(task_args)} '
+                                              f'definitions:\n  {error_list}')
 
-        if not args.disable_clang_format:
-            helpers.clang_format(args.clang_format_file, type_parts['types'])
+    return results
 
-        helpers.write_content_to_file_and_check_template(type_parts['types'], primary_update_strategy, args.diff)
+
+def generation_task_name(task_args) -> str:
+    # the first argument always identifies the module, interface or type
+    return task_args[0]['namespace'] if isinstance(task_args[0], dict) else str(task_args[0])
+
+
+def run_generation_task(task, *args):
+    with Span('generate', generation_task_name(args)):
+        return run_recorded(task, *args)
+
+
+def load_dependency_graph(args):
+    """Load the dependency graph of previous runs, if incremental generation has been requested."""
+    if not args.incremental or args.force or getattr(args, 'diff', False):
+        return None
+
+    if not ParseCache.cache_root:
+        raise Exception('Incremental generation (--incremental) needs a cache directory (--cache-dir)')
+
+    return DependencyGraph(ParseCache.cache_root / 'dependency-graph.json')
+
+
+def generation_settings(args, output_dir) -> str:
+    """Settings, that influence the generated output besides the tracked input files."""
+    return json.dumps({
+        'version': __version__,
+        'output_dir': str(output_dir),
+        'everest_dirs': [str(everest_dir) for everest_dir in everest_dirs],
+        'clang_format': None if args.disable_clang_format else str(Path(args.clang_format_file).resolve()),
+    }, sort_keys=True)
+
+
+def target_inputs(inputs, file_infos, args):
+    """Complete the recorded inputs of a target with the used templates and the .clang-format file."""
+    inputs = set(inputs)
+    inputs.update(Path(file_info['template_path']) for file_info in file_infos)
+    if not args.disable_clang_format:
+        inputs.add(Path(args.clang_format_file).resolve() / '.clang-format')
+
+    return inputs
+
+
+def include_inputs_mtime(inputs, file_infos, args):
+    """Consider outputs outdated, if any of their inputs is newer than them, not only their main definition file."""
+    inputs_mtime = newest_mtime(target_inputs(inputs, file_infos, args))
+    for file_info in file_infos:
+        file_info['last_mtime'] = max(file_info['last_mtime'], inputs_mtime)
+
+
+def update_dependency_graph(graph, target, settings, inputs, file_infos, args, written=True):
+    """Record a generated target, if all its outputs have been written or verified, otherwise forget it."""
+    if not written:
+        graph.discard(target)
+        return
+
+    graph.update(target, settings, target_inputs(inputs, file_infos, args),
+                 [file_info['path'] for file_info in file_infos])
+
+
+def jobs_count(value):
+    jobs = int(value)
+    if jobs < 0:
+        raise argparse.ArgumentTypeError(f'invalid number of jobs: {value}')
+
+    return jobs if jobs > 0 else (os.cpu_count() or 1)
 
 
 def types_get_templates(args):
-    interface_files = templates['types.hpp'].filename
+    interface_files = get_template_path('types.hpp')
 
     print(f'{interface_files}')
 
 
-def main():
-    global validators, everest_dirs, work_dir
+def list_modules() -> List[str]:
+    modules_dir = work_dir / 'modules'
+    if not modules_dir.is_dir():
+        return []
+
+    return sorted(mod_path.parent.relative_to(modules_dir).as_posix()
+                  for mod_path in modules_dir.glob('**/manifest.yaml'))
+
+
+def check(args):
+    """Render all outputs in memory and compare them with the existing files, without writing anything."""
+    add_detected_everest_projects(args)
+
+    modules = args.modules if args.modules else list_modules()
+
+    # type info is needed for rendering modules and interfaces
+    for type_with_namespace in list_types_with_namespace():
+        _tmpl_data, _last_mtime = TypeParser.generate_type_info(type_with_namespace, all_types=True)
+
+    # (file info, whether only the existence of the file is checked, whether the license header is kept)
+    checked_files = []
+    for mod_files, _inputs in run_generation_tasks(generate_module_files,
+                                                   [(module, True, args.licenses) for module in modules], args.jobs):
+        for file_info in mod_files['core'] + mod_files['interfaces']:
+            # source files are only created, but never updated
+            checked_files.append((file_info, file_info['path'].suffix == '.cpp', True))
+
+    if args.loader_dir:
+        loader_dir = Path(args.loader_dir).resolve()
+        for loader_files, _inputs in run_generation_tasks(generate_module_loader_files,
+                                                          [(module, loader_dir) for module in modules], args.jobs):
+            checked_files.extend((file_info, False, False) for file_info in loader_files)
+
+    if args.interfaces_dir:
+        interfaces_dir = Path(args.interfaces_dir).resolve()
+        interfaces = []
+        for everest_dir in everest_dirs:
+            if_dir = everest_dir / 'interfaces'
+            if if_dir.is_dir():
+                interfaces += [if_path.stem for if_path in if_dir.glob('*.yaml')]
+        for if_parts, _inputs in run_generation_tasks(generate_interface_headers,
+                                                      [(interface, True, interfaces_dir) for interface in interfaces],
+                                                      args.jobs):
+            # interfaces, that have been ignored, don't have any parts
+            if if_parts:
+                checked_files.extend((file_info, False, False) for file_info in if_parts.values())
+
+    if args.types_dir:
+        types_dir = Path(args.types_dir).resolve()
+        for type_parts, _inputs in run_generation_tasks(TypeParser.generate_type_headers,
+                                                        [(type_with_namespace, True, types_dir) for
+                                                         type_with_namespace in list_types_with_namespace()],
+                                                        args.jobs):
+            checked_files.append((type_parts['types'], False, False))
+
+    if not args.disable_clang_format:
+        helpers.clang_format_files(args.clang_format_file,
+                                   [file_info for file_info, existence_only, _ in checked_files if not existence_only],
+                                   args.jobs)
+
+    out_of_sync = 0
+    for file_info, existence_only, check_license_header in checked_files:
+        state = helpers.check_file(file_info, existence_only, check_license_header)
+        if not state:
+            continue
+        out_of_sync += 1
+        file_path = file_info['path']
+        try:
+            printable_name = file_path.relative_to(work_dir)
+        except ValueError:
+            printable_name = file_path
+        print(f'{state}: {printable_name}')
+        if args.diff and state == 'out of date':
+            diff = file_diff.unified_diff(file_path.read_text(), file_info['content'], str(printable_name),
+                                          str(printable_name), file_diff.diff_ignore_regex(file_path),
+                                          sys.stdout.isatty())
+            if diff:
+                print(diff)
+
+    if out_of_sync:
+        print(f'{out_of_sync} of {len(checked_files)} generated files are out of sync, '
+              'run the corresponding ev-cli commands to update them')
+        exit(1)
+
+    print(f'All {len(checked_files)} generated files are up to date')
+
+
+def read_batch_commands(manifest_list: str) -> List:
+    """Read the command lines of a batch manifest list, returns their line numbers and arguments."""
+    if manifest_list == '-':
+        lines = sys.stdin.read().splitlines()
+    else:
+        manifest_list_path = Path(manifest_list).resolve()
+        try:
+            lines = manifest_list_path.read_text().splitlines()
+        except OSError as err:
+            raise Exception(f'Could not open batch manifest list {err.filename}: {err.strerror}') from err
+
+    commands = []
+    for line_no, line in enumerate(lines, start=1):
+        cmd_args = shlex.split(line, comments=True)
+        if not cmd_args:
+            continue
+        if cmd_args[0] in ['batch', 'daemon']:
+            raise Exception(f'Line {line_no} of the batch manifest list: nested {cmd_args[0]} commands are not '
+                            'supported')
+        commands.append((line_no, cmd_args))
+
+    return commands
+
+
+def run_batch_commands(commands: List, keep_going: bool, prepare_args=None) -> List[int]:
+    """Run parsed batch commands, returns the line numbers of the failed commands."""
+    parser = create_parser()
+
+    failed_commands = []
+    for line_no, cmd_args in commands:
+        print(f'Running batch command: {" ".join(shlex.quote(arg) for arg in cmd_args)}')
+        try:
+            parsed_args = parser.parse_args(cmd_args)
+            if prepare_args:
+                prepare_args(parsed_args)
+            run_command(parsed_args)
+        except (Exception, SystemExit) as err:
+            if isinstance(err, SystemExit) and not err.code:
+                continue
+            if not keep_going:
+                raise
+            print(f'Batch command on line {line_no} failed: {err}')
+            failed_commands.append(line_no)
+
+    return failed_commands
+
+
+def batch(args):
+    failed_commands = run_batch_commands(read_batch_commands(args.manifest_list), args.keep_going)
+
+    if failed_commands:
+        print(f'{len(failed_commands)} batch command(s) failed (lines: {", ".join(map(str, failed_commands))})')
+        exit(1)
+
+
+def invalidate_definitions(changed_paths):
+    """Drop changed type and error definitions, which are kept in memory between commands."""
+    changed_paths = set(changed_paths) | set(path.resolve() for path in changed_paths)
+    for type_path in list(TypeParser.validated_type_defs):
+        if type_path in changed_paths:
+            del TypeParser.validated_type_defs[type_path]
+    for namespace, error_path in list(ErrorParser.error_definition_files.items()):
+        if error_path in changed_paths:
+            del ErrorParser.error_definitions[namespace]
+            del ErrorParser.error_definition_files[namespace]
+    # definition files might have been added or removed
+    EverestDirIndex.invalidate()
+
+
+def definition_index(args):
+    from ev_cli.definition_index import DefinitionIndex
+
+    everest_dir_paths = [Path(entry).resolve() for entry in args.everest_dir]
+    snapshot_file = Path(args.snapshot).resolve() if args.snapshot else None
+    index = DefinitionIndex.load(everest_dir_paths, snapshot_file)
+    if snapshot_file:
+        index.save(snapshot_file)
+
+    result = index.query(args.query, args.name)
+    if args.json or isinstance(result, dict):
+        print(json.dumps(result, indent=2))
+    else:
+        for entry in result:
+            print(entry)
+
+
+def daemon_run(args):
+    from ev_cli.daemon import Daemon
+    from ev_cli.definition_index import DefinitionIndex
+
+    commands = read_batch_commands(args.manifest_list)
+    parser = create_parser()
 
+    watch_dirs = set()
+    # everest dirs of all commands, in the order of their first appearance
+    index_dirs = {}
+    for _line_no, cmd_args in commands:
+        cmd = parser.parse_args(cmd_args)
+        if 'everest_dir' in cmd:
+            for everest_dir in cmd.everest_dir:
+                index_dirs.setdefault(Path(everest_dir).resolve(), None)
+                for subdir in ['types', 'interfaces', 'errors', 'modules']:
+                    watch_dirs.add(Path(everest_dir).resolve() / subdir)
+            watch_dirs.add(Path(cmd.work_dir).resolve() / 'modules')
+
+    def prepare_args(cmd):
+        # only regenerate what is affected by the changes
+        if 'everest_dir' in cmd:
+            cmd.incremental = True
+            if not cmd.cache_dir:
+                cmd.cache_dir = args.cache_dir
+
+    def run_commands():
+        return run_batch_commands(commands, keep_going=True, prepare_args=prepare_args)
+
+    # the definition index is answering queries, it is started from the snapshot of the previous run
+    index_snapshot = Path(args.cache_dir).resolve() / 'definition-index.json'
+    index = DefinitionIndex.load(list(index_dirs), index_snapshot)
+
+    daemon = Daemon(Path(args.socket).resolve(), sorted(watch_dirs), run_commands, invalidate_definitions,
+                    args.poll_interval, args.polling, index, index_snapshot)
+    daemon.serve()
+
+
+def daemon_request(args):
+    from ev_cli.daemon import send_request
+
+    try:
+        params = {'query': args.query, 'name': args.name} if args.request == 'query' else {}
+        response = send_request(Path(args.socket).resolve(), args.request, args.timeout, **params)
+    except OSError as err:
+        raise Exception(f'Could not reach the ev-cli daemon at {args.socket}: {err}') from err
+
+    print(json.dumps(response))
+    if response.get('status') != 'ok':
+        exit(1)
+
+
+def create_parser():
     parser = argparse.ArgumentParser(description='Everest command line tool')
     parser.add_argument('--version', action='version', version=f'%(prog)s {__version__}')
+    parser.add_argument('--profile', nargs='?', const='-', metavar='TRACE_FILE',
+                        help='record the time spent in parsing, validation, rendering, clang-format and writing '
+                        'files, print a summary to stderr and write a Chrome trace to TRACE_FILE, if given (can also '
+                        'be enabled with EV_CLI_TRACE=1 or EV_CLI_TRACE=TRACE_FILE)')
+    parser.add_argument('--cprofile', metavar='STATS_FILE',
+                        help='run the command with cProfile and write the statistics to STATS_FILE')
 
     common_parser = argparse.ArgumentParser(add_help=False)
 
@@ -764,6 +1260,22 @@ def main():
                                help='Path to the directory, containing the .clang-format file (default: .)')
     common_parser.add_argument('--disable-clang-format', action='store_true', default=False,
                                help='Set this flag to disable clang-format')
+    common_parser.add_argument('--incremental', action='store_true', default=False,
+                               help='Only regenerate outputs, whose input files changed since the last run with '
+                               '--incremental (needs --cache-dir)')
+    common_parser.add_argument('--keep-unchanged', action='store_true', default=False,
+                               help='Do not rewrite files, whose generated content equals the existing content, so '
+                               'their modification time is kept and no rebuilds get triggered')
+    common_parser.add_argument('--cache-dir', type=str, default=None,
+                               help='Directory for caching parsed and validated definition files between runs, '
+                               'e.g. build/.ev-cli-cache (default: no caching)')
+    common_parser.add_argument('--report-shadowing', action='store_true', default=False,
+                               help='Report type, interface and error definitions, which are provided by more than '
+                               'one everest dir and therefore shadow each other')
+    common_parser.add_argument('--schema-validator', choices=schema_validation.BACKENDS, default='auto',
+                               help='Backend for validating definition files: "fastjsonschema" uses compiled '
+                               'validators, "jsonschema" the generic ones, "auto" uses fastjsonschema if it is '
+                               'installed (default: auto)')
 
     subparsers = parser.add_subparsers(metavar='<command>', help='available commands', required=True)
     parser_mod = subparsers.add_parser('module', aliases=['mod'], help='module related actions')
@@ -778,6 +1290,9 @@ def main():
     mod_create_parser.add_argument('-f', '--force', action='store_true', help='force overwriting - use with care!')
     mod_create_parser.add_argument('-d', '--diff', '--dry-run', action='store_true',
                                    help='show resulting diff on create or overwrite')
+    mod_create_parser.add_argument('--diff-summary', action='store_true',
+                                   help='like --diff, but only list the files that would change and exit with 1, if '
+                                   'any would')
     mod_create_parser.add_argument('--only', type=str,
                                    help='Comma separated filter list of module files, that should be created.  '
                                    'For a list of available files use "--only which".')
@@ -788,6 +1303,9 @@ def main():
     mod_update_parser.add_argument('module', type=str, help='name of the module, that should be updated')
     mod_update_parser.add_argument('-f', '--force', action='store_true', help='force overwriting')
     mod_update_parser.add_argument('-d', '--diff', '--dry-run', action='store_true', help='show resulting diff')
+    mod_update_parser.add_argument('--diff-summary', action='store_true',
+                                   help='like --diff, but only list the files that would change and exit with 1, if '
+                                   'any would')
     mod_update_parser.add_argument('--only', type=str,
                                    help='Comma separated filter list of module files, that should be updated.  '
                                    'For a list of available files use "--only which".')
@@ -800,6 +1318,8 @@ def main():
     mod_genld_parser.add_argument('-f', '--force', action='store_true', help='force overwriting')
     mod_genld_parser.add_argument('-o', '--output-dir', type=str, help='Output directory for generated loader '
                                   'files (default: {everest-dir}/build/generated/generated/modules)')
+    mod_genld_parser.add_argument('--depfile', type=str,
+                                  help='write a Make/Ninja depfile listing all files the outputs were generated from')
     mod_genld_parser.set_defaults(action_handler=module_genld)
 
     if_actions = parser_if.add_subparsers(metavar='<action>', help='available actions', required=True)
@@ -809,9 +1329,16 @@ def main():
     if_genhdr_parser.add_argument('-o', '--output-dir', type=str, help='Output directory for generated interface '
                                   'headers (default: {everest-dir}/build/generated/generated/interfaces)')
     if_genhdr_parser.add_argument('-d', '--diff', '--dry-run', action='store_true', help='show resulting diff')
+    if_genhdr_parser.add_argument('--diff-summary', action='store_true',
+                                  help='like --diff, but only list the files that would change and exit with 1, if '
+                                  'any would')
+    if_genhdr_parser.add_argument('-j', '--jobs', type=jobs_count, default=1,
+                                  help='number of parallel generation processes, 0 for one per cpu (default: 1)')
     if_genhdr_parser.add_argument('interfaces', nargs='*', help='a list of interfaces, for which header files should '
                                   'be generated - if no interface is given, all will be processed and non-processable '
                                   'will be skipped')
+    if_genhdr_parser.add_argument('--depfile', type=str,
+                                  help='write a Make/Ninja depfile listing all files the outputs were generated from')
     if_genhdr_parser.set_defaults(action_handler=interface_genhdr)
 
     hlp_actions = parser_hlp.add_subparsers(metavar='<action>', help='available actions', required=True)
@@ -829,6 +1356,12 @@ def main():
     hlp_json2yaml_parser.add_argument('output', type=str, help='path to yaml output file')
     hlp_json2yaml_parser.set_defaults(action_handler=helpers_json2yaml)
 
+    hlp_depgraph_parser = hlp_actions.add_parser('dependency-graph',
+                                                 help='print the recorded dependency graph as Make/Ninja depfile rules')
+    hlp_depgraph_parser.add_argument('cache_dir', type=str, help='cache directory used with --incremental')
+    hlp_depgraph_parser.add_argument('-o', '--output', type=str, help='write the rules to this file instead of stdout')
+    hlp_depgraph_parser.set_defaults(action_handler=helpers_dependency_graph)
+
     types_actions = parser_types.add_subparsers(metavar='<action>', help='available actions', required=True)
     types_genhdr_parser = types_actions.add_parser(
         'generate-headers', aliases=['gh'], parents=[common_parser], help='generate type headers')
@@ -836,9 +1369,16 @@ def main():
     types_genhdr_parser.add_argument('-o', '--output-dir', type=str, help='Output directory for generated type '
                                      'headers (default: {everest-dir}/build/generated/generated/types)')
     types_genhdr_parser.add_argument('-d', '--diff', '--dry-run', action='store_true', help='show resulting diff')
+    types_genhdr_parser.add_argument('--diff-summary', action='store_true',
+                                     help='like --diff, but only list the files that would change and exit with 1, if '
+                                     'any would')
+    types_genhdr_parser.add_argument('-j', '--jobs', type=jobs_count, default=1,
+                                     help='number of parallel generation processes, 0 for one per cpu (default: 1)')
     types_genhdr_parser.add_argument('types', nargs='*', help='a list of types, for which header files should '
                                      'be generated - if no type is given, all will be processed and non-processable '
                                      'will be skipped')
+    types_genhdr_parser.add_argument('--depfile', type=str,
+                                     help='write a Make/Ninja depfile listing all files the outputs were generated from')
     types_genhdr_parser.set_defaults(action_handler=types_genhdr)
 
     for sub_parser, get_template_function in [
@@ -850,45 +1390,193 @@ def main():
             'get-templates', aliases=['gt'], parents=[common_parser], help='get paths to template files')
         get_templates_parser.add_argument(
             '-s', '--separator', type=str, default='\n', help='separator between template files')
-        get_templates_parser.set_defaults(action_handler=get_template_function)
+        # template paths are known without any setup, which keeps these calls (done at CMake configure time) fast
+        get_templates_parser.set_defaults(action_handler=get_template_function, skip_setup=True)
+
+    check_parser = subparsers.add_parser(
+        'check', parents=[common_parser],
+        help='check, that generated files are up to date, without modifying anything (e.g. in CI)')
+    check_parser.add_argument('modules', nargs='*', help='modules, whose files should be checked (default: all '
+                              'modules in {work-dir}/modules)')
+    check_parser.add_argument('--interfaces-dir', type=str,
+                              help='also check the interface headers in this directory')
+    check_parser.add_argument('--types-dir', type=str, help='also check the type headers in this directory')
+    check_parser.add_argument('--loader-dir', type=str, help='also check the loader files of the modules in this '
+                              'directory')
+    check_parser.add_argument('-d', '--diff', action='store_true', help='show a diff for every out of date file')
+    check_parser.add_argument('-j', '--jobs', type=jobs_count, default=1,
+                              help='number of parallel generation processes, 0 for one per cpu (default: 1)')
+    check_parser.set_defaults(action_handler=check)
+
+    index_parser = subparsers.add_parser(
+        'index', parents=[common_parser],
+        help='query the references between all type, interface, error and module definitions')
+    index_parser.add_argument('query', choices=QUERIES,
+                              help='"interfaces-using-type" (e.g. /units#/Power), "modules-requiring" and '
+                              '"modules-providing" (an interface) need a name')
+    index_parser.add_argument('name', nargs='?', help='type or interface name for the query')
+    index_parser.add_argument('--snapshot', type=str,
+                              help='snapshot file, the index is loaded from and saved to, so only definition files '
+                              'changed since the last call need to be parsed')
+    index_parser.add_argument('--json', action='store_true', help='print the result as json')
+    # the index is built from the plain definition files, neither schemas nor templates are needed
+    index_parser.set_defaults(action_handler=definition_index, skip_setup=True)
+
+    batch_parser = subparsers.add_parser(
+        'batch', help='run many commands in a single process, sharing the loaded schemas, templates and definitions')
+    batch_parser.add_argument('manifest_list', type=str,
+                              help='file with one ev-cli command line per line, e.g. "types generate-headers -o out" '
+                              '(use "-" to read from stdin, lines starting with # are ignored)')
+    batch_parser.add_argument('-k', '--keep-going', action='store_true',
+                              help='continue with the remaining commands if a command fails')
+    batch_parser.set_defaults(action_handler=batch)
+
+    parser_daemon = subparsers.add_parser(
+        'daemon', help='keep definitions in memory and regenerate on changes, controlled through a unix socket')
+    daemon_actions = parser_daemon.add_subparsers(metavar='<action>', help='available actions', required=True)
+    daemon_run_parser = daemon_actions.add_parser(
+        'run', help='run the commands of a batch manifest list and again, whenever a definition file changes')
+    daemon_run_parser.add_argument('manifest_list', type=str,
+                                   help='file with one ev-cli command line per line, like for the batch command')
+    daemon_run_parser.add_argument('--socket', type=str, default='.ev-cli-daemon.sock',
+                                   help='unix socket to listen on for requests (default: .ev-cli-daemon.sock)')
+    daemon_run_parser.add_argument('--cache-dir', type=str, required=True,
+                                   help='cache directory for commands not specifying their own, needed for '
+                                   'incremental regeneration')
+    daemon_run_parser.add_argument('--polling', action='store_true',
+                                   help='poll for changes instead of using inotify')
+    daemon_run_parser.add_argument('--poll-interval', type=float, default=0.5,
+                                   help='seconds between polls, if inotify is not used (default: 0.5)')
+    daemon_run_parser.set_defaults(action_handler=daemon_run)
+    daemon_request_parser = daemon_actions.add_parser('request', help='send a request to a running daemon')
+    daemon_request_parser.add_argument('request', choices=['ping', 'ensure-up-to-date', 'query', 'shutdown'],
+                                       help='request to send')
+    daemon_request_parser.add_argument('--query', choices=QUERIES, default='summary',
+                                       help='query of the definition index, for the query request (default: summary)')
+    daemon_request_parser.add_argument('--name', type=str, help='type or interface name for the query request')
+    daemon_request_parser.add_argument('--socket', type=str, default='.ev-cli-daemon.sock',
+                                       help='unix socket of the daemon (default: .ev-cli-daemon.sock)')
+    daemon_request_parser.add_argument('--timeout', type=float, default=None,
+                                       help='seconds to wait for the response (default: no timeout)')
+    daemon_request_parser.set_defaults(action_handler=daemon_request)
+
+    return parser
+
+
+def setup_common(args):
+    global work_dir
+
+    everest_dir_paths = [Path(entry).resolve() for entry in args.everest_dir]
+
+    work_dir = Path(args.work_dir).resolve()
+
+    schemas_dir = Path(args.schemas_dir).resolve()
+    if not schemas_dir.exists():
+        print('The default ("../everest-framework/schemas") xor supplied (via --schemas-dir) schemas directory'
+              ' doesn\'t exist.\n'
+              f'dir: {schemas_dir}')
+        cmake_cache_path = Path(args.build_dir) / 'CMakeCache.txt'
+        found_dir = helpers.get_path_from_cmake_cache('everest-framework', cmake_cache_path, '--schemas-dir')
+        if not found_dir:
+            exit(1)
+        schemas_dir = found_dir / 'schemas'
+        if not schemas_dir.exists():
+            exit(1)
 
-    args = parser.parse_args()
+    helpers.keep_unchanged_files = args.keep_unchanged
+    helpers.diff_summary = getattr(args, 'diff_summary', False)
+    if helpers.diff_summary:
+        args.diff = True
+    helpers.diff_changed_files.clear()
+    EverestDirIndex.report_shadowing = args.report_shadowing
+
+    setup_generator(everest_dir_paths, schemas_dir, args.cache_dir, args.schema_validator)
+
+
+def setup_generator(everest_dir_paths, schemas_dir, cache_dir, validation_backend='auto'):
+    """Set up everest dirs, templates, validators and caches, also used for initializing worker processes."""
+    global validators, generator_setup, configured_everest_dirs
 
-    if 'everest_dir' in args:
+    # reset, because in batch mode every command comes with its own everest dirs
+    previous_everest_dirs = configured_everest_dirs
+    configured_everest_dirs = list(everest_dir_paths)
+    everest_dirs.clear()
+    everest_dirs.extend(everest_dir_paths)
+
+    helpers.everest_dirs = everest_dirs
+
+    if configured_everest_dirs != previous_everest_dirs:
+        # definitions are looked up in the everest dirs, so previously loaded ones might not be valid anymore
+        TypeParser.all_types.clear()
+        TypeParser.validated_type_defs.clear()
+        ErrorParser.error_definitions.clear()
+        ErrorParser.error_definition_files.clear()
+
+    ParseCache.setup(cache_dir)
+
+    if not templates:
+        bytecode_cache_dir = None
+        if ParseCache.cache_root:
+            bytecode_cache_dir = ParseCache.cache_root / 'jinja'
+            bytecode_cache_dir.mkdir(parents=True, exist_ok=True)
+        with Span('templates'):
+            setup_jinja_env(bytecode_cache_dir)
+
+    schema_validation.backend = validation_backend
+    if (schemas_dir, validation_backend) not in loaded_validators:
+        with Span('schemas', schemas_dir):
+            loaded_validators[(schemas_dir, validation_backend)] = helpers.load_validators(schemas_dir)
+    validators = loaded_validators[(schemas_dir, validation_backend)]
+
+    TypeParser.validators = validators
+    TypeParser.templates = templates
+
+    ErrorParser.validators = validators
+
+    generator_setup = (schemas_dir, cache_dir, validation_backend)
+
+
+def run_command(args):
+    if 'everest_dir' in args and 'skip_setup' not in args:
         # FIXME (aw): the helper commands do not set everest_dir, work_dir and schema_dirs, but the following common
         #             code has to run for all other commands - we need some better check here than just checking for
         #             'everest_dir' in args!
-        for entry in args.everest_dir:
-            everest_dir = Path(entry).resolve()
-            everest_dirs.append(everest_dir)
-
-        helpers.everest_dirs = everest_dirs
+        with Span('setup'):
+            setup_common(args)
 
-        work_dir = Path(args.work_dir).resolve()
+    with Span('command', args.action_handler.__name__):
+        args.action_handler(args)
 
-        setup_jinja_env()
+    if getattr(args, 'diff_summary', False) and helpers.diff_changed_files:
+        print(f'{len(helpers.diff_changed_files)} file(s) would change')
+        exit(1)
 
-        schemas_dir = Path(args.schemas_dir).resolve()
-        if not schemas_dir.exists():
-            print('The default ("../everest-framework/schemas") xor supplied (via --schemas-dir) schemas directory'
-                  ' doesn\'t exist.\n'
-                  f'dir: {schemas_dir}')
-            cmake_cache_path = Path(args.build_dir) / 'CMakeCache.txt'
-            found_dir = helpers.get_path_from_cmake_cache('everest-framework', cmake_cache_path, '--schemas-dir')
-            if not found_dir:
-                exit(1)
-            schemas_dir = found_dir / 'schemas'
-            if not schemas_dir.exists():
-                exit(1)
 
-        validators = helpers.load_validators(schemas_dir)
+def main():
+    parser = create_parser()
+    args = parser.parse_args()
 
-        TypeParser.validators = validators
-        TypeParser.templates = templates
+    profile = profile_target(args.profile)
+    if profile:
+        Profiler.enable()
 
-        ErrorParser.validators = validators
+    profiler = None
+    if args.cprofile:
+        import cProfile
+        profiler = cProfile.Profile()
 
-    args.action_handler(args)
+    try:
+        if profiler:
+            profiler.runcall(run_command, args)
+        else:
+            run_command(args)
+    finally:
+        if profiler:
+            profiler.dump_stats(args.cprofile)
+            print(f'cProfile statistics written to {args.cprofile} (show with: python3 -m pstats {args.cprofile})',
+                  file=sys.stderr)
+        if profile:
+            Profiler.write(profile)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+#
+# SPDX-License-Identifier: Apache-2.0
+# Copyright Pionix GmbH and Contributors to EVerest
+#
+"""
+Provide an index of the definition files in all everest dirs.
+"""
+
+from pathlib import Path, PurePosixPath
+from typing import Dict, List, Optional, Tuple
+import os
+
+
+class EverestDirIndex:
+    """Map relative definition file paths to the everest dir providing them, the first everest dir wins."""
+    # only these subdirectories are indexed, everything else is resolved by probing the everest dirs
+    indexed_subdirs = ('types', 'interfaces', 'errors')
+    indexed_dirs: Optional[Tuple[Path, ...]] = None
+    entries: Dict[str, Path] = {}
+    shadowed: Dict[str, List[Path]] = {}
+    report_shadowing = False
+    reported: set = set()
+
+    @classmethod
+    def build(cls, everest_dirs: List[Path]):
+        """Index all definition files of the everest dirs, if they changed since the last call."""
+        if cls.indexed_dirs == tuple(everest_dirs):
+            return
+
+        entries = {}
+        shadowed = {}
+        for everest_dir in everest_dirs:
+            for subdir in cls.indexed_subdirs:
+                for root, _dirs, files in os.walk(everest_dir / subdir, followlinks=True):
+                    root = Path(root)
+                    for file_name in files:
+                        path = root / file_name
+                        key = path.relative_to(everest_dir).as_posix()
+                        if key in entries:
+                            shadowed.setdefault(key, [entries[key]]).append(path)
+                        else:
+                            entries[key] = path
+
+        cls.indexed_dirs = tuple(everest_dirs)
+        cls.entries = entries
+        cls.shadowed = shadowed
+        cls.reported = set()
+
+    @classmethod
+    def invalidate(cls):
+        """Drop the index, so it gets rebuilt on the next lookup (e.g. after definition files were added)."""
+        cls.indexed_dirs = None
+        cls.entries = {}
+        cls.shadowed = {}
+
+    @classmethod
+    def lookup(cls, everest_dirs: List[Path], postfix) -> Optional[Path]:
+        """Look up a path relative to the everest dirs, returns None if it is not (or cannot be) indexed."""
+        key = PurePosixPath(Path(postfix).as_posix())
+        if not key.parts or key.parts[0] not in cls.indexed_subdirs or '..' in key.parts:
+            return None
+
+        cls.build(everest_dirs)
+
+        key = str(key)
+        if cls.report_shadowing and key in cls.shadowed and key not in cls.reported:
+            cls.reported.add(key)
+            shadowed_paths = ', '.join(str(path) for path in cls.shadowed[key][1:])
+            print(f'Note: {cls.shadowed[key][0]} shadows {shadowed_paths}')
+
+        return cls.entries.get(key)
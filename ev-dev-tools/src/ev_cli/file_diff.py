@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+#
+# SPDX-License-Identifier: Apache-2.0
+# Copyright Pionix GmbH and Contributors to EVerest
+#
+"""
+Provide unified diffs of generated files, following the output and the -I (ignore matching lines) semantics of
+GNU diff, without spawning a diff process for every file.
+"""
+
+from typing import List, Optional, Pattern, Tuple
+import difflib
+import re
+
+DIFF_CONTEXT = 3
+
+# same colors as the default palette of GNU diff --color
+COLOR_HEADER = '\x1b[1m'
+COLOR_HUNK = '\x1b[36m'
+COLOR_DELETED = '\x1b[31m'
+COLOR_ADDED = '\x1b[32m'
+COLOR_RESET = '\x1b[0m'
+
+
+def split_lines(content: str) -> List[str]:
+    """Split content into lines, keeping the line endings, only newlines end a line (like in diff)."""
+    lines = content.split('\n')
+    last_line = lines.pop()
+    lines = [line + '\n' for line in lines]
+    if last_line:
+        lines.append(last_line)
+
+    return lines
+
+
+def format_range(start: int, stop: int) -> str:
+    beginning = start + 1
+    length = stop - start
+    if length == 1:
+        return f'{beginning}'
+    if not length:
+        beginning -= 1
+
+    return f'{beginning},{length}'
+
+
+def line_changes(old_lines: List[str], new_lines: List[str],
+                 ignore: Optional[Pattern] = None) -> List[Tuple[int, int, int, int, bool]]:
+    """Get the changed line ranges (old start, old stop, new start, new stop) and whether they are ignorable."""
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    changes = []
+    for tag, old_start, old_stop, new_start, new_stop in matcher.get_opcodes():
+        if tag == 'equal':
+            continue
+        ignorable = ignore is not None and all(
+            ignore.search(line.rstrip('\n')) for line in old_lines[old_start:old_stop] + new_lines[new_start:new_stop])
+        changes.append((old_start, old_stop, new_start, new_stop, ignorable))
+
+    return changes
+
+
+def differs(old_content: str, new_content: str, ignore: Optional[Pattern] = None) -> bool:
+    """Check if the contents differ in other than ignorable lines, exactly if unified_diff is not empty."""
+    if old_content == new_content:
+        return False
+
+    return not all(change[4] for change in line_changes(split_lines(old_content), split_lines(new_content), ignore))
+
+
+def unified_diff(old_content: str, new_content: str, old_label: str, new_label: str,
+                 ignore: Optional[Pattern] = None, color: bool = False) -> str:
+    """Create a unified diff, changes whose lines all match ignore are left out (like diff -I).
+
+    As in GNU diff, changes are grouped into hunks, if there are less than 2 * DIFF_CONTEXT + 1 unchanged lines
+    between them (DIFF_CONTEXT for ignorable changes).  Hunks consisting of ignorable changes only are left out,
+    other hunks are shown completely.
+    """
+    if old_content == new_content:
+        return ''
+
+    old_lines = split_lines(old_content)
+    new_lines = split_lines(new_content)
+    changes = line_changes(old_lines, new_lines, ignore)
+
+    hunks = []
+    index = 0
+    while index < len(changes):
+        hunk = [changes[index]]
+        index += 1
+        while index < len(changes):
+            threshold = DIFF_CONTEXT if changes[index][4] else 2 * DIFF_CONTEXT + 1
+            if changes[index][0] - hunk[-1][1] >= threshold:
+                break
+            hunk.append(changes[index])
+            index += 1
+        if not all(change[4] for change in hunk):
+            hunks.append(hunk)
+
+    if not hunks:
+        return ''
+
+    def colored(text: str, color_code: str) -> str:
+        return f'{color_code}{text}{COLOR_RESET}' if color else text
+
+    output = [colored(f'--- {old_label}', COLOR_HEADER) + '\n', colored(f'+++ {new_label}', COLOR_HEADER) + '\n']
+
+    def add_line(prefix: str, line: str, color_code: Optional[str] = None):
+        text = prefix + line.rstrip('\n')
+        output.append((colored(text, color_code) if color_code else text) + '\n')
+        if not line.endswith('\n'):
+            output.append('\\ No newline at end of file\n')
+
+    for hunk in hunks:
+        old_start = max(0, hunk[0][0] - DIFF_CONTEXT)
+        old_stop = min(len(old_lines), hunk[-1][1] + DIFF_CONTEXT)
+        new_start = max(0, hunk[0][2] - DIFF_CONTEXT)
+        new_stop = min(len(new_lines), hunk[-1][3] + DIFF_CONTEXT)
+        output.append(colored(f'@@ -{format_range(old_start, old_stop)} +{format_range(new_start, new_stop)} @@',
+                              COLOR_HUNK) + '\n')
+
+        old_pos = old_start
+        for change_old_start, change_old_stop, change_new_start, change_new_stop, _ignorable in hunk:
+            for line in old_lines[old_pos:change_old_start]:
+                add_line(' ', line)
+            for line in old_lines[change_old_start:change_old_stop]:
+                add_line('-', line, COLOR_DELETED)
+            for line in new_lines[change_new_start:change_new_stop]:
+                add_line('+', line, COLOR_ADDED)
+            old_pos = change_old_stop
+        for line in old_lines[old_pos:old_stop]:
+            add_line(' ', line)
+
+    return ''.join(output)
+
+
+def diff_ignore_regex(file_path) -> Optional[Pattern]:
+    """Get the regex of lines to ignore in diffs of generated files: comments in c++ and CMake files."""
+    if file_path.suffix in ('.hpp', '.cpp'):
+        return re.compile('^//.*')
+    elif file_path.name == 'CMakeLists.txt':
+        return re.compile('^#.*')
+
+    return None
@@ -9,18 +9,30 @@ FIXME (aw): Module documentation.
 """
 
 from .type_parsing import TypeParser
-
+from .parse_cache import ParseCache, write_cache_file
+from .dependencies import DependencyTracker
+from .everest_dir_index import EverestDirIndex
+from . import schema_validation
+from . import yaml_utils
+from . import file_diff
+from .profiling import Span
+
+from collections import Counter
 from pathlib import Path
+import functools
+import hashlib
 import shutil
 import subprocess
+import tempfile
 import re
-from typing import Dict, List, Tuple
+import sys
+from typing import Dict, List, Optional, Tuple
 import keyword
 
 import json
-import jsonschema
 
-import yaml
+# jsonschema and yaml are slow to import, they are imported in the functions using them, so that commands not
+# loading any definitions start fast
 
 from uuid import uuid4
 
@@ -28,6 +40,12 @@ import stringcase
 
 
 everest_dirs: List[Path] = []
+# if set, files whose generated content equals the content on disk are not rewritten, keeping their mtime
+keep_unchanged_files = False
+# if set, --diff only reports which files would change instead of showing their diffs
+diff_summary = False
+# files --diff found differences in
+diff_changed_files: List[Path] = []
 
 
 class EVerestParsingException(SystemExit):
@@ -97,11 +115,15 @@ cpp_type_map = {
     'object': 'Object',
 }
 
-def clang_format(config_file_path, file_info):
-    # check if we handle cpp and hpp files
-    if not file_info['path'].suffix in ('.hpp', '.cpp'):
-        return
+# formatted content by hash of the .clang-format file, the clang-format executable and the unformatted content
+clang_format_cache: Dict[str, str] = {}
+# maximum number of files passed to a single clang-format invocation
+CLANG_FORMAT_BATCH_SIZE = 64
+
 
+@functools.lru_cache(maxsize=None)
+def get_clang_format_setup(config_file_path) -> Tuple[str, Path, str]:
+    """Check the clang-format executable and config file once and return them with a digest of both."""
     clang_format_path = shutil.which('clang-format')
     if clang_format_path is None:
         raise RuntimeError('Could not find clang-format executable - needed when passing clang-format config file')
@@ -110,34 +132,116 @@ def clang_format(config_file_path, file_info):
     if not config_file_path.is_dir():
         raise RuntimeError(f'Supplied directory for the clang-format file ({config_file_path}) does not exist')
 
-    if not (config_file_path / '.clang-format').exists():
+    config_file = config_file_path / '.clang-format'
+    if not config_file.exists():
         raise RuntimeError(f'Supplied directory for the clang-format file '
                            f'({config_file_path}) does not contain a .clang-format file')
 
-    content = file_info['content']
+    executable_stat = Path(clang_format_path).resolve().stat()
+    setup_digest = hashlib.sha256(config_file.read_bytes())
+    setup_digest.update(f'{clang_format_path}\0{executable_stat.st_size}\0{executable_stat.st_mtime_ns}'.encode('utf-8'))
+
+    return (clang_format_path, config_file, setup_digest.hexdigest())
 
-    run_parms = {'capture_output': True, 'cwd': config_file_path, 'encoding': 'utf-8', 'input': content}
 
-    format_cmd = subprocess.run([clang_format_path, '--style=file'], **run_parms)
+def clang_format(config_file_path, file_info):
+    clang_format_files(config_file_path, [file_info])
+
+
+def clang_format_files(config_file_path, file_infos, jobs=1):
+    """Format the content of all c++ files with as few clang-format invocations as possible.
+
+    Formatted contents are cached in memory and, if enabled, in the ev-cli cache directory.
+    """
+    # check if we handle cpp and hpp files
+    file_infos = [file_info for file_info in file_infos if file_info['path'].suffix in ('.hpp', '.cpp')]
+    if not file_infos:
+        return
+
+    with Span('clang-format', f'{len(file_infos)} files'):
+        __clang_format_files(config_file_path, file_infos, jobs)
+
+
+def __clang_format_files(config_file_path, file_infos, jobs):
+    (clang_format_path, config_file, setup_digest) = get_clang_format_setup(config_file_path)
+
+    disk_cache_dir = None
+    if ParseCache.cache_root:
+        disk_cache_dir = ParseCache.cache_root / 'clang-format'
+        disk_cache_dir.mkdir(parents=True, exist_ok=True)
+
+    # unformatted file infos by cache key, so equal contents get formatted only once
+    pending: Dict[str, List] = {}
+    for file_info in file_infos:
+        digest = hashlib.sha256(setup_digest.encode('utf-8'))
+        digest.update(file_info['content'].encode('utf-8'))
+        key = digest.hexdigest()
+
+        if key not in clang_format_cache and disk_cache_dir:
+            try:
+                clang_format_cache[key] = (disk_cache_dir / f'{key}.txt').read_text()
+            except OSError:
+                pass
+
+        if key in clang_format_cache:
+            file_info['content'] = clang_format_cache[key]
+        else:
+            pending.setdefault(key, []).append(file_info)
+
+    if not pending:
+        return
 
-    if format_cmd.returncode != 0:
-        raise RuntimeError(f'clang-format failed with:\n{format_cmd.stderr}')
+    with tempfile.TemporaryDirectory(prefix='ev-cli-clang-format-') as tmp_dir:
+        tmp_dir = Path(tmp_dir)
+        # clang-format looks up the .clang-format file next to the formatted files
+        shutil.copyfile(config_file, tmp_dir / '.clang-format')
 
-    file_info['content'] = format_cmd.stdout
+        tmp_files = {}
+        for index, (key, pending_infos) in enumerate(pending.items()):
+            tmp_file = tmp_dir / f'{index}{pending_infos[0]["path"].suffix}'
+            tmp_file.write_text(pending_infos[0]['content'])
+            tmp_files[key] = tmp_file
+
+        paths = [str(tmp_file) for tmp_file in tmp_files.values()]
+        batch_size = max(1, min(CLANG_FORMAT_BATCH_SIZE, -(-len(paths) // max(1, jobs))))
+        batches = [paths[i:i + batch_size] for i in range(0, len(paths), batch_size)]
+
+        def format_batch(batch):
+            return subprocess.run([clang_format_path, '--style=file', '-i', *batch],
+                                  capture_output=True, cwd=tmp_dir, encoding='utf-8')
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+            for format_cmd in executor.map(format_batch, batches):
+                if format_cmd.returncode != 0:
+                    raise RuntimeError(f'clang-format failed with:\n{format_cmd.stderr}')
+
+        for key, tmp_file in tmp_files.items():
+            formatted_content = tmp_file.read_text()
+            clang_format_cache[key] = formatted_content
+            if disk_cache_dir:
+                write_cache_file(disk_cache_dir / f'{key}.txt', formatted_content.encode('utf-8'))
+            for file_info in pending[key]:
+                file_info['content'] = formatted_content
 
 
 def resolve_everest_dir_path(postfix):
-    resolved_path = None
-    for everest_dir in everest_dirs:
-        path = everest_dir / postfix
-        if path.exists():
-            resolved_path = path
-            break
+    resolved_path = EverestDirIndex.lookup(everest_dirs, postfix)
+    if not resolved_path:
+        # not indexed or not found, probe all everest dirs in case the file has been added after indexing
+        for everest_dir in everest_dirs:
+            path = everest_dir / postfix
+            if path.exists():
+                resolved_path = path
+                break
 
     if not resolved_path:
         raise EVerestParsingException(
             f'Could not resolve "{postfix}" in any of the provided everest-dir ({everest_dirs}).')
 
+    DependencyTracker.add(resolved_path)
+
     return resolved_path
 
 
@@ -163,30 +267,43 @@ def build_type_info(name, json_type):
     return ti
 
 
-type_headers = set()
-parsed_types: List = []
-parsed_enums: List = []
+class ParseState:
+    """Types, enums and type headers collected while generating the template data of a single definition."""
+
+    def __init__(self):
+        self.types: List = []
+        self.enums: List = []
+        self.type_headers = set()
+        # name indexes of the parsed types and enums, for constant time existence checks
+        self.type_names = Counter()
+        self.enum_names = set()
+
+
+parse_state = ParseState()
 current_defs: Dict = {}
 
+
+def new_parse_state() -> ParseState:
+    """Start a fresh parse state, so every generation task collects its own types, enums and headers."""
+    global parse_state
+    parse_state = ParseState()
+    return parse_state
+
 format_types = dict()
 # format_types['date-time'] = 'DateTime'
 
 
 def object_exists(name: str) -> bool:
     """Check if an object already exists."""
-    for el in parsed_types:
-        if el['name'] == name:
-            return True
-
-    return False
+    return parse_state.type_names[name] > 0
 
 
 def add_enum_type(name: str, enums: Tuple[str], description: str):
-    """Add enum type to parsed_types."""
-    for el in parsed_enums:
-        if el['name'] == name:
-            raise Exception('Warning: enum ' + name + ' already exists')
-    parsed_enums.append({
+    """Add enum type to the parsed enums."""
+    if name in parse_state.enum_names:
+        raise Exception('Warning: enum ' + name + ' already exists')
+    parse_state.enum_names.add(name)
+    parse_state.enums.append({
         'name': name,
         'enums': enums,
         'description': description
@@ -194,6 +311,11 @@ def add_enum_type(name: str, enums: Tuple[str], description: str):
 
 
 def parse_ref(ref: str, prop_type, prop_info: Dict) -> Tuple[str, dict]:
+    with Span('ref', ref):
+        return __parse_ref(ref, prop_type, prop_info)
+
+
+def __parse_ref(ref: str, prop_type, prop_info: Dict) -> Tuple[str, dict]:
     if ref not in TypeParser.all_types:
         TypeParser.all_types[ref] = TypeParser.parse_type_url(type_url=ref)
     type_dict = TypeParser.all_types[ref]
@@ -213,7 +335,7 @@ def parse_ref(ref: str, prop_type, prop_info: Dict) -> Tuple[str, dict]:
 
     path = Path('generated/types') / \
         type_dict['type_relative_path'].with_suffix('.hpp')
-    type_headers.add(path.as_posix())
+    parse_state.type_headers.add(path.as_posix())
 
     return (prop_type, prop_info)
 
@@ -280,11 +402,12 @@ def parse_property(prop_name: str, prop: Dict, depends_on: List[str], type_file:
 def parse_object(ob_name: str, json_schema: Dict, type_file: bool):
     """Parse a JSON object.
     Iterates over the properties of this object, parses their type
-    and puts these information into the global dict parsed_types.
+    and puts these information into the types of the current parse state.
     """
 
     ob_dict = {'name': ob_name, 'properties': [], 'depends_on': []}
-    parsed_types.insert(0, ob_dict)
+    parse_state.types.insert(0, ob_dict)
+    parse_state.type_names[ob_name] += 1
 
     if 'properties' not in json_schema:
         # object has no properties, probably not a complex object
@@ -300,10 +423,12 @@ def parse_object(ob_name: str, json_schema: Dict, type_file: bool):
             TypeParser.does_type_exist(type_url=json_schema['$ref'], json_type=json_schema['type'])
 
             prop_type = type_dict['namespaced_type']
+            parse_state.type_names[ob_dict['name']] -= 1
+            parse_state.type_names[prop_type] += 1
             ob_dict['name'] = prop_type
             path = Path('generated/types') / \
                 type_dict['type_relative_path'].with_suffix('.hpp')
-            type_headers.add(path.as_posix())
+            parse_state.type_headers.add(path.as_posix())
             return ob_dict
         return
 
@@ -370,7 +495,7 @@ def extended_build_type_info(name: str, info: dict, type_file=False) -> Tuple[di
 
                     type_info['enum_type'] = enum_info['enum_type']
             path = generate_header_for_type(type_dict['type_relative_path'])
-            type_headers.add(path.as_posix())
+            parse_state.type_headers.add(path.as_posix())
     elif type_info['json_type'] == 'object':
         try:
             ob = parse_object(name, info, type_file)
@@ -396,21 +521,24 @@ def extended_build_type_info(name: str, info: dict, type_file=False) -> Tuple[di
                     type_info['array_type_contains_enum'] = True
                 type_info['array_type'] = type_dict['namespaced_type']
             path = generate_header_for_type(type_dict['type_relative_path'])
-            type_headers.add(path.as_posix())
+            parse_state.type_headers.add(path.as_posix())
 
     return (type_info, enum_info)
 
 
 def load_validators(schema_path: Path):
     # FIXME (aw): we should also patch the schemas like in everest-framework
+    import jsonschema
+    import yaml
+
     validators = {}
     for validator, filename in zip(
         ['interface', 'module', 'config', 'type', 'error_declaration_list'],
             ['interface', 'manifest', 'config', 'type', 'error-declaration-list']):
         try:
-            schema = yaml.safe_load((schema_path / f'{filename}.yaml').read_text())
-            jsonschema.Draft7Validator.check_schema(schema)
-            validators[validator] = jsonschema.Draft7Validator(schema)
+            schema = yaml_utils.safe_load((schema_path / f'{filename}.yaml').read_text())
+            schema_validation.check_schema(schema)
+            validators[validator] = schema_validation.SchemaValidator(schema)
         except OSError as err:
             print(f'Could not open schema file {err.filename}: {err.strerror}')
             exit(1)
@@ -424,22 +552,35 @@ def load_validators(schema_path: Path):
 
 
 def load_validated_interface_def(if_def_path: Path, validator):
+    import jsonschema
+    import yaml
+
     if_def = {}
     try:
-        if_def = yaml.safe_load(if_def_path.read_text())
-        # validating interface
-        validator.validate(if_def)
-        # validate var/cmd subparts
-        if 'vars' in if_def:
-            for _var_name, var_def in if_def['vars'].items():
-                jsonschema.Draft7Validator.check_schema(var_def)
-        if 'cmds' in if_def:
-            for _cmd_name, cmd_def in if_def['cmds'].items():
-                if 'arguments' in cmd_def:
-                    for _arg_name, arg_def in cmd_def['arguments'].items():
-                        jsonschema.Draft7Validator.check_schema(arg_def)
-                if 'result' in cmd_def:
-                    jsonschema.Draft7Validator.check_schema(cmd_def['result'])
+        content = if_def_path.read_text()
+        cache_key = ParseCache.key('interface', content, validator)
+        if_def = ParseCache.load(cache_key)
+        if if_def is not None:
+            return if_def
+
+        with Span('yaml', if_def_path):
+            if_def = yaml_utils.safe_load(content)
+        with Span('validation', if_def_path):
+            # validating interface
+            validator.validate(if_def)
+            # validate var/cmd subparts
+            if 'vars' in if_def:
+                for _var_name, var_def in if_def['vars'].items():
+                    schema_validation.check_schema(var_def)
+            if 'cmds' in if_def:
+                for _cmd_name, cmd_def in if_def['cmds'].items():
+                    if 'arguments' in cmd_def:
+                        for _arg_name, arg_def in cmd_def['arguments'].items():
+                            schema_validation.check_schema(arg_def)
+                    if 'result' in cmd_def:
+                        schema_validation.check_schema(cmd_def['result'])
+
+        ParseCache.store(cache_key, if_def)
     except OSError as err:
         raise Exception(f'Could not open interface definition file {err.filename}: {err.strerror}') from err
     except jsonschema.ValidationError as err:
@@ -452,11 +593,22 @@ def load_validated_interface_def(if_def_path: Path, validator):
 
 def load_validated_type_def(type_def_path: Path, validator):
     """Load a type definition from the provided path and validate it with the provided validator."""
+    import jsonschema
+    import yaml
 
     try:
-        type_def = yaml.safe_load(type_def_path.read_text())
-        # validating type definition
-        validator.validate(type_def)
+        content = type_def_path.read_text()
+        cache_key = ParseCache.key('type', content, validator)
+        type_def = ParseCache.load(cache_key)
+        if type_def is not None:
+            return type_def
+
+        with Span('yaml', type_def_path):
+            type_def = yaml_utils.safe_load(content)
+        with Span('validation', type_def_path):
+            # validating type definition
+            validator.validate(type_def)
+        ParseCache.store(cache_key, type_def)
 
         return type_def
     except OSError as err:
@@ -470,9 +622,22 @@ def load_validated_type_def(type_def_path: Path, validator):
 
 
 def load_validated_module_def(module_path: Path, validator):
+    import jsonschema
+    import yaml
+
+    DependencyTracker.add(module_path)
     try:
-        module_def = yaml.safe_load(module_path.read_text())
-        validator.validate(module_def)
+        content = module_path.read_text()
+        cache_key = ParseCache.key('module', content, validator)
+        module_def = ParseCache.load(cache_key)
+        if module_def is not None:
+            return module_def
+
+        with Span('yaml', module_path):
+            module_def = yaml_utils.safe_load(content)
+        with Span('validation', module_path):
+            validator.validate(module_def)
+        ParseCache.store(cache_key, module_def)
     except OSError as err:
         raise Exception(f'Could not open type definition file {err.filename}: {err.strerror}') from err
     except jsonschema.ValidationError as err:
@@ -494,7 +659,7 @@ def yaml2json(yaml_file: Path, json_file: Path):
         exit(1)
 
     with open(yaml_file, 'r') as yaml_content:
-        content_as_dict = yaml.safe_load(yaml_content)
+        content_as_dict = yaml_utils.safe_load(yaml_content)
 
     with open(json_file, 'w') as json_content:
         json.dump(content_as_dict, json_content, indent=2)
@@ -509,11 +674,11 @@ def json2yaml(json_file: Path, yaml_file: Path):
         content_as_dict = json.load(json_content)
 
     with open(yaml_file, 'w') as yaml_content:
-        yaml.safe_dump(content_as_dict, yaml_content, indent=2, sort_keys=False, width=120)
+        yaml_utils.safe_dump(content_as_dict, yaml_content, indent=2, sort_keys=False, width=120)
 
 
-def __check_for_match(blocks_def, line, line_no, file_path):
-    match = re.search(blocks_def['regex_str'], line)
+def __check_for_match(blocks_def, regex, blocks_by_id, line, line_no, file_path):
+    match = regex.search(line)
     if not match:
         return None
 
@@ -535,12 +700,8 @@ def __check_for_match(blocks_def, line, line_no, file_path):
             f'  contains version "{mb["version"]}", which is different from the blocks definition version "{blocks_def["version"]}"'
         )
 
-    for block, block_info in blocks_def['definitions'].items():
-        if block_info['id'] != mb['id']:
-            continue
-
-        mb['name'] = block
-        mb['block'] = block_info
+    if mb['id'] in blocks_by_id:
+        mb['name'], mb['block'] = blocks_by_id[mb['id']]
 
     if not 'block' in mb:
         raise ValueError(
@@ -568,31 +729,40 @@ def generate_tmpl_blocks(blocks_def, file_path=None):
     if not file_path:
         return tmpl_block
 
+    regex = re.compile(blocks_def['regex_str'])
+    # if several blocks share an uuid, the last one wins
+    blocks_by_id = {block_def['id']: (block_name, block_def)
+                    for block_name, block_def in blocks_def['definitions'].items()}
+
     try:
-        file_data = file_path.read_text()
+        file_obj = open(file_path)
     except OSError as err:
         print(f'Could not open file {err.filename} for parsing blocks: {err.strerror}')
         exit(1)
 
     line_no = 0
     matched_block = None
-    content = None
-
-    for line in file_data.splitlines(True):
-        line_no += 1
-
-        if not matched_block:
-            matched_block = __check_for_match(blocks_def, line.rstrip(), line_no, file_path)
-            content = None
-            continue
-
-        if (line.strip() == matched_block['tag']):
-            if (content):
-                tmpl_block[matched_block['name']]['content'] = content.rstrip()
-                tmpl_block[matched_block['name']]['first_use'] = False
-            matched_block = None
-        else:
-            content = (content + line) if content else line
+    content = []
+
+    with file_obj:
+        for file_line in file_obj:
+            # split like str.splitlines, which also breaks lines at some other separators than newlines
+            for line in file_line.splitlines(True):
+                line_no += 1
+
+                if not matched_block:
+                    matched_block = __check_for_match(blocks_def, regex, blocks_by_id, line.rstrip(), line_no,
+                                                      file_path)
+                    content = []
+                    continue
+
+                if (line.strip() == matched_block['tag']):
+                    if (content):
+                        tmpl_block[matched_block['name']]['content'] = ''.join(content).rstrip()
+                        tmpl_block[matched_block['name']]['first_use'] = False
+                    matched_block = None
+                else:
+                    content.append(line)
 
     if matched_block:
         raise ValueError(
@@ -612,31 +782,23 @@ def load_tmpl_blocks(blocks_def, file_path, update):
 
 
 def __show_diff_for(file_info):
-    diff_path = shutil.which('diff')
-    if diff_path == None:
-        raise Exception('Can\'t generate diff, because "diff" executable not found')
-
     file_path = file_info['path']
+    printable_name = file_info['printable_name']
 
-    diff_ignore = ''
-    if file_path.suffix in ('.hpp', '.cpp'):
-        diff_ignore = '^//.*'
-    elif file_path.name == 'CMakeLists.txt':
-        diff_ignore = '^#.*'
-    diff_ignore_args = ['-I', diff_ignore] if diff_ignore else []
-
-    run_parms = {'input': file_info['content'], 'capture_output': True, 'encoding': 'utf-8'}
-
-    diff = subprocess.run([
-        diff_path,
-        '-ruN',
-        *diff_ignore_args,
-        '--label', file_info['printable_name'],
-        '--color=always',
-        file_path,
-        '-'
-    ], **run_parms).stdout
-    if diff:
+    try:
+        old_content = file_path.read_text() if file_path.exists() else ''
+    except OSError as err:
+        raise Exception(f'Can\'t generate diff, could not read {err.filename}: {err.strerror}') from err
+
+    diff = file_diff.unified_diff(old_content, file_info['content'], str(printable_name), str(printable_name),
+                                  file_diff.diff_ignore_regex(file_path), sys.stdout.isatty())
+    if not diff:
+        return
+
+    diff_changed_files.append(file_path)
+    if diff_summary:
+        print(f'{printable_name} would be {"changed" if file_path.exists() else "created"}')
+    else:
         print(diff)
 
 
@@ -688,7 +850,59 @@ def is_template_newer(file_info) -> Tuple[bool, str]:
     return (False, '')
 
 
-def write_content_to_file(file_info, strategy, only_diff=False, reason = '', check_license_header=False):
+def existing_license_header(file_info, original_content: str) -> Optional[str]:
+    """Get the license header of the existing file content, if it differs from the generated one."""
+    if original_content.startswith(file_info['license_header']):
+        return None
+
+    # determine likely end of license header
+    search_terms = ['#ifndef', '#pragma once', '#include']
+    original_license_header = ''
+    for search in search_terms:
+        index = original_content.find(search)
+        if index >= 0:
+            original_license_header = original_content[0:index]
+            break
+
+    return original_license_header
+
+
+def keep_license_header(file_info, original_license_header: str):
+    file_info['content'] = file_info['content'].replace(file_info['license_header'], original_license_header.strip())
+
+
+def check_file(file_info, existence_only=False, check_license_header=False) -> str:
+    """Compare generated content with the existing file, without touching it.
+
+    Returns an empty string, if the file is up to date, otherwise "missing" or "out of date".  Existing license
+    headers are kept, like when updating the file.  Lines ignored in diffs (comments) are ignored here as well, so a
+    file is out of date exactly if its diff is not empty.
+    """
+    file_path = file_info['path']
+    if not file_path.exists():
+        return 'missing'
+    if existence_only:
+        return ''
+
+    try:
+        original_content = file_path.read_text()
+    except OSError as err:
+        raise Exception(f'Can\'t check {file_path}: {err.strerror}') from err
+
+    if check_license_header and 'license_header' in file_info:
+        original_license_header = existing_license_header(file_info, original_content)
+        if original_license_header is not None:
+            keep_license_header(file_info, original_license_header)
+
+    if file_diff.differs(original_content, file_info['content'], file_diff.diff_ignore_regex(file_path)):
+        return 'out of date'
+
+    return ''
+
+
+def write_content_to_file(file_info, strategy, only_diff=False, reason = '', check_license_header=False) -> bool:
+    # returns False only, if the file has been skipped as up-to-date by its modification time, which does not
+    # prove, that its content is up-to-date
     # strategy:
     #   update: update only if dest older or not existent
     #   force-update: update, even if dest newer
@@ -706,12 +920,14 @@ def write_content_to_file(file_info, strategy, only_diff=False, reason = '', che
     method = ''
 
     if only_diff:
-        return __show_diff_for(file_info)
+        with Span('diff', printable_name):
+            __show_diff_for(file_info)
+        return True
 
     if strategy == 'update':
         if file_path.exists() and file_path.stat().st_mtime > file_info['last_mtime']:
             print(f'Skipping {printable_name} (up-to-date)')
-            return
+            return False
         method = 'Updating'
     elif strategy == 'force-update':
         method = 'Force-updating' if file_path.exists() else 'Creating'
@@ -720,43 +936,47 @@ def write_content_to_file(file_info, strategy, only_diff=False, reason = '', che
     elif strategy == 'update-if-non-existent' or strategy == 'create':
         if file_path.exists():
             print(f'Skipping {printable_name} (use create --force to recreate)')
-            return
+            return True
         method = 'Creating'
     else:
         raise Exception(f'Invalid strategy "{strategy}"\nSupported strategies: {strategies}')
 
-    print(f'{method} file {printable_name}{reason}')
-
-    if not file_dir.exists():
-        file_dir.mkdir(parents=True, exist_ok=True)
+    original_content = None
 
     # check if file header is different from license header
     if check_license_header:
         if 'license_header' in file_info and file_path.exists():
             original_content = file_path.read_text()
-            if not original_content.startswith(file_info['license_header']):
-                # determine likely end of license header
-                search_terms = ['#ifndef', '#pragma once', '#include']
-                original_license_header = ''
-                for search in search_terms:
-                    index = original_content.find(search)
-                    if index >= 0:
-                        original_license_header = original_content[0:index]
-                        break
+            original_license_header = existing_license_header(file_info, original_content)
+            if original_license_header is not None:
                 print(f'Keeping the existing licence header:\n{original_license_header}')
-                file_info['content'] = file_info['content'].replace(
-                    file_info['license_header'], original_license_header.strip())
+                keep_license_header(file_info, original_license_header)
+
+    if keep_unchanged_files and file_path.exists():
+        if original_content is None:
+            original_content = file_path.read_text()
+        if original_content == file_info['content']:
+            print(f'Skipping {printable_name} (content unchanged)')
+            return True
+
+    print(f'{method} file {printable_name}{reason}')
+
+    with Span('write', printable_name):
+        if not file_dir.exists():
+            file_dir.mkdir(parents=True, exist_ok=True)
+
+        file_path.write_text(file_info['content'])
 
-    file_path.write_text(file_info['content'])
+    return True
 
 
-def write_content_to_file_and_check_template(file_info, strategy, only_diff=False):
+def write_content_to_file_and_check_template(file_info, strategy, only_diff=False) -> bool:
     # check if template is newer and force-update file if it is
     update_strategy = strategy
     (newer, reason) = is_template_newer(file_info)
     if newer:
         update_strategy = 'force-update'
-    write_content_to_file(file_info, update_strategy, only_diff, reason)
+    return write_content_to_file(file_info, update_strategy, only_diff, reason)
 
 
 def get_license_header(license_dirs, license_url):
@@ -773,6 +993,7 @@ def get_license_header(license_dirs, license_url):
 
     if not license_path:
         return None
+    DependencyTracker.add(license_path)
     with open(license_path, 'r') as custom_license_file:
         return custom_license_file.read().strip()
 
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+#
+# SPDX-License-Identifier: Apache-2.0
+# Copyright Pionix GmbH and Contributors to EVerest
+#
+"""
+Provide a persistent cache for parsed and validated definition files.
+"""
+
+from pathlib import Path
+from typing import Any, Optional
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+
+
+def write_cache_file(path: Path, data: bytes):
+    """Atomically write a cache file, so concurrent ev-cli runs never see partially written entries."""
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as cache_file:
+            cache_file.write(data)
+        os.replace(tmp_path, path)
+    except OSError:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+
+
+class ParseCache:
+    """Store parsed and validated yaml documents on disk, keyed by the file content and the validating schema."""
+    # bump this, if the layout of the cached documents changes
+    version = 1
+    # root of all ev-cli caches, parsed documents are kept in its "parse" subdirectory
+    cache_root: Optional[Path] = None
+    cache_dir: Optional[Path] = None
+
+    @classmethod
+    def setup(cls, cache_dir):
+        """Enable the cache in the provided directory, or disable it if no directory is given."""
+        cls.cache_root = None
+        cls.cache_dir = None
+        if not cache_dir:
+            return
+
+        cls.cache_root = Path(cache_dir).resolve()
+        cls.cache_dir = cls.cache_root / 'parse'
+        cls.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    @classmethod
+    def schema_digest(cls, validator) -> str:
+        """Get the digest of the schema the provided validator checks against.
+
+        Validators computing the digest of their schema once provide it as schema_digest attribute.
+        """
+        digest = getattr(validator, 'schema_digest', None)
+        if digest is None:
+            schema = json.dumps(validator.schema, sort_keys=True, default=str)
+            digest = hashlib.sha256(schema.encode('utf-8')).hexdigest()
+
+        return digest
+
+    @classmethod
+    def key(cls, kind: str, content: str, validator) -> str:
+        """Build the cache key for a definition file of the provided kind and content."""
+        digest = hashlib.sha256(f'{cls.version}\0{kind}\0{cls.schema_digest(validator)}\0'.encode('utf-8'))
+        digest.update(content.encode('utf-8'))
+
+        return digest.hexdigest()
+
+    @classmethod
+    def load(cls, key: str) -> Optional[Any]:
+        """Load a cached document, returns None if the cache is disabled or has no entry for this key."""
+        if not cls.cache_dir:
+            return None
+
+        try:
+            with open(cls.cache_dir / f'{key}.pickle', 'rb') as cache_file:
+                return pickle.load(cache_file)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+    @classmethod
+    def store(cls, key: str, document: Any):
+        """Store a validated document in the cache."""
+        if not cls.cache_dir:
+            return
+
+        write_cache_file(cls.cache_dir / f'{key}.pickle', pickle.dumps(document, protocol=pickle.HIGHEST_PROTOCOL))
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+#
+# SPDX-License-Identifier: Apache-2.0
+# Copyright Pionix GmbH and Contributors to EVerest
+#
+"""
+Provide timing instrumentation of ev-cli runs.
+
+Phases like yaml parsing, schema validation, $ref resolution, rendering, clang-format and file writes are recorded
+as spans, if profiling has been enabled with --profile or the EV_CLI_TRACE environment variable.  The spans can be
+written as a Chrome trace (to be opened with chrome://tracing or https://ui.perfetto.dev) and are summarized in a
+table, listing the time spent in each phase and the slowest files.
+"""
+
+from pathlib import Path
+from typing import Dict, List, Optional
+import json
+import os
+import sys
+import time
+
+SUMMARY_SLOWEST_SPANS = 10
+
+
+class Span:
+    """Record the time spent in a with block as a span of a category (phase), e.g. with Span('yaml', path)."""
+    __slots__ = ('category', 'name', 'start', 'child_time')
+
+    def __init__(self, category: str, name=''):
+        self.category = category
+        self.name = name
+
+    def __enter__(self):
+        if Profiler.enabled:
+            Profiler.stack.append(self)
+            self.child_time = 0
+            self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        stack = Profiler.stack
+        if Profiler.enabled and stack and stack[-1] is self:
+            duration = time.perf_counter_ns() - self.start
+            stack.pop()
+            if stack:
+                stack[-1].child_time += duration
+            Profiler.events.append({
+                'cat': self.category,
+                'name': f'{self.category} {self.name}' if self.name else self.category,
+                'ph': 'X',
+                'ts': self.start / 1000,
+                'dur': duration / 1000,
+                'pid': os.getpid(),
+                'tid': os.getpid(),
+                'args': {'self': (duration - self.child_time) / 1000},
+            })
+        return False
+
+
+class Profiler:
+    """Collect the spans of this process and, when generating in worker processes, of the workers.
+
+    Spans are only recorded in the main thread of each process.
+    """
+    enabled = False
+    events: List[Dict] = []
+    # spans, which have been entered, but not exited yet
+    stack: List[Span] = []
+
+    @classmethod
+    def enable(cls):
+        cls.enabled = True
+        cls.events = []
+
+    @classmethod
+    def run_collected(cls, task, *args):
+        """Run task in a worker process and return its result together with the spans it recorded."""
+        cls.enable()
+        result = task(*args)
+
+        return (result, cls.events)
+
+    @classmethod
+    def summary(cls) -> str:
+        """Summarize the time spent per phase (without nested phases) and list the slowest spans."""
+        if not cls.events:
+            return 'No spans recorded'
+
+        phases: Dict[str, List[float]] = {}
+        for event in cls.events:
+            phase = phases.setdefault(event['cat'], [0, 0.0])
+            phase[0] += 1
+            phase[1] += event['args']['self']
+        total = sum(phase[1] for phase in phases.values())
+
+        lines = [f'{"phase":<16} {"count":>8} {"time [ms]":>12} {"share":>7}']
+        for category, (count, duration) in sorted(phases.items(), key=lambda item: -item[1][1]):
+            lines.append(f'{category:<16} {count:>8} {duration / 1000:>12.1f} {duration / total:>7.1%}')
+        if len(set(event['pid'] for event in cls.events)) > 1:
+            lines.append('(times of all processes, worker processes run in parallel)')
+
+        lines.append('')
+        lines.append('slowest spans (including nested phases):')
+        for event in sorted(cls.events, key=lambda event: -event['dur'])[:SUMMARY_SLOWEST_SPANS]:
+            lines.append(f'{event["dur"] / 1000:>10.1f} ms  {event["name"]}')
+
+        return '\n'.join(lines)
+
+    @classmethod
+    def write(cls, target: str):
+        """Print the summary to stderr and write the Chrome trace to target, unless target is "-"."""
+        if target != '-':
+            trace = {'traceEvents': cls.events, 'displayTimeUnit': 'ms'}
+            Path(target).write_text(json.dumps(trace))
+            print(f'Trace written to {target}', file=sys.stderr)
+        print(cls.summary(), file=sys.stderr)
+
+
+def profile_target(option: Optional[str]) -> Optional[str]:
+    """Get where profiling results go, from --profile or the EV_CLI_TRACE environment variable.
+
+    "-" only prints the summary, everything else is the path of the Chrome trace file.
+    """
+    if option:
+        return option
+
+    trace = os.environ.get('EV_CLI_TRACE', '')
+    if trace in ('', '0'):
+        return None
+    if trace == '1':
+        return '-'
+
+    return trace
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+#
+# SPDX-License-Identifier: Apache-2.0
+# Copyright Pionix GmbH and Contributors to EVerest
+#
+"""
+Provide schema validation with an optional compiled fast path.
+
+If fastjsonschema is installed, schemas are compiled to python code, once per schema and process, so batch runs and
+the daemon compile every schema only once.  The compiled code is kept in memory only and never read back from disk.
+The compiled validators only decide, that a document is valid.  Whenever they reject a document, it is validated
+again with jsonschema, so all raised errors and their messages are the ones of jsonschema.
+"""
+
+from typing import Callable, Dict, Optional, Set, Tuple, Union
+import hashlib
+import json
+import re
+
+# 'auto' uses fastjsonschema if it is installed, 'jsonschema' disables the compiled fast path
+BACKENDS = ['auto', 'fastjsonschema', 'jsonschema']
+backend = 'auto'
+
+# digests of the schemas, which already passed the meta-schema check
+checked_schemas: Set[str] = set()
+# compiled meta-schema by backend, False if it cannot be compiled
+compiled_meta_schemas: Dict[str, Union[Callable, bool]] = {}
+# compiled validators by schema digest and use of formats, None for schemas fastjsonschema cannot compile
+compiled_schemas: Dict[Tuple[str, bool], Optional[Callable]] = {}
+
+
+def schema_digest(schema) -> str:
+    return hashlib.sha256(json.dumps(schema, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def resolve_remote_schema(uri: str):
+    """Resolve remote references of schemas offline, only the Draft 7 meta-schema is known."""
+    import jsonschema
+
+    if uri.rstrip('#') == jsonschema.Draft7Validator.META_SCHEMA['$schema'].rstrip('#'):
+        return jsonschema.Draft7Validator.META_SCHEMA
+
+    raise Exception(f'Remote schema reference "{uri}" is not supported')
+
+
+# fastjsonschema would download remote references otherwise
+REMOTE_SCHEMA_HANDLERS = {'http': resolve_remote_schema, 'https': resolve_remote_schema}
+
+
+def compile_schema(schema, use_formats: bool) -> Optional[Callable]:
+    """Compile a schema with fastjsonschema, returns None if the compiled fast path is not available."""
+    if backend == 'jsonschema':
+        return None
+
+    try:
+        import fastjsonschema
+    except ImportError:
+        if backend == 'fastjsonschema':
+            raise Exception('The fastjsonschema validation backend has been requested, but it is not installed')
+        return None
+
+    key = (schema_digest(schema), use_formats)
+    if key not in compiled_schemas:
+        try:
+            code = fastjsonschema.compile_to_code(schema, handlers=REMOTE_SCHEMA_HANDLERS, use_default=False,
+                                                  use_formats=use_formats, detailed_exceptions=False)
+            namespace = {}
+            exec(code, namespace)
+            # the validation function of the root schema is generated first, it is named after the $id of the schema
+            compiled_schemas[key] = namespace[re.search(r'^def (validate\w*)\(', code, re.MULTILINE).group(1)]
+        except Exception:
+            # schemas fastjsonschema cannot compile are validated with jsonschema only
+            compiled_schemas[key] = None
+
+    return compiled_schemas[key]
+
+
+class SchemaValidator:
+    """Validate documents against a schema, preferably with a compiled validator."""
+
+    def __init__(self, schema):
+        import jsonschema
+
+        self.schema = schema
+        self.schema_digest = schema_digest(schema)
+        self.validator = jsonschema.Draft7Validator(schema)
+        # jsonschema does not check formats when validating documents, so the compiled validator must not either
+        self.compiled = compile_schema(schema, use_formats=False)
+
+    def validate(self, instance):
+        """Validate instance, raises the jsonschema.ValidationError jsonschema would raise."""
+        if self.compiled:
+            try:
+                self.compiled(instance)
+                return
+            except Exception:
+                # the compiled validator might be stricter, jsonschema has the final say and provides the error
+                pass
+
+        self.validator.validate(instance)
+
+
+def check_schema(schema):
+    """Check a schema against the Draft 7 meta-schema, schemas that passed the check are not checked again."""
+    import jsonschema
+
+    digest = schema_digest(schema)
+    if digest in checked_schemas:
+        return
+
+    if backend not in compiled_meta_schemas:
+        # the meta-schema check of jsonschema includes the format checks (e.g. for regex patterns)
+        compiled_meta_schemas[backend] = compile_schema(jsonschema.Draft7Validator.META_SCHEMA,
+                                                        use_formats=True) or False
+    compiled_meta_schema = compiled_meta_schemas[backend]
+
+    try:
+        if not compiled_meta_schema:
+            raise ValueError()
+        compiled_meta_schema(schema)
+    except Exception:
+        jsonschema.Draft7Validator.check_schema(schema)
+
+    checked_schemas.add(digest)
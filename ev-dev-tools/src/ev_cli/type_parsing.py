@@ -9,9 +9,11 @@ author: kai-uwe.hermann@pionix.de
 """
 
 from . import helpers
+from .dependencies import DependencyTracker
 
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, List, Set, Tuple
+import heapq
 
 
 import stringcase
@@ -77,9 +79,7 @@ class TypeParser:
     @classmethod
     def generate_tmpl_data_for_type(cls, type_with_namespace, type_def):
         """Generate template data based on the provided type and type definition."""
-        helpers.parsed_enums.clear()
-        helpers.parsed_types.clear()
-        helpers.type_headers.clear()
+        parse_state = helpers.new_parse_state()
         types = []
         enums = []
 
@@ -93,7 +93,7 @@ class TypeParser:
             except helpers.EVerestParsingException as e:
                 raise helpers.EVerestParsingException(f'Error parsing type {type_name}: {e}')
 
-        for parsed_enum in helpers.parsed_enums:
+        for parsed_enum in parse_state.enums:
             enum_info = {
                 'name': parsed_enum['name'],
                 'description': parsed_enum['description'],
@@ -102,29 +102,18 @@ class TypeParser:
             }
             enums.append(enum_info)
 
-        for parsed_type in helpers.parsed_types:
+        for parsed_type in parse_state.types:
             parsed_type['name'] = stringcase.capitalcase(parsed_type['name'])
             types.append(parsed_type)
 
-        type_headers = sorted(helpers.type_headers)
+        type_headers = sorted(parse_state.type_headers)
 
         # Remove the header itself from the includes.
         own_header = helpers.generate_header_for_type(type_with_namespace["relative_path"])
         type_headers = [header for header in type_headers if str(header) != str(own_header)]
 
         # sort types, so no forward declaration is necessary
-        sorted_types: List = []
-        for struct_type in types:
-            insert_at: int = 0
-            for dep_struct_type in struct_type['depends_on']:
-
-                for i, _entry in enumerate(sorted_types):
-                    # the new one depends on the current
-                    if sorted_types[i]['name'] == dep_struct_type:
-                        insert_at = max(insert_at, i + 1)
-                        break
-
-            sorted_types.insert(insert_at, struct_type)
+        sorted_types = TypeParser.sort_types_by_dependencies(types)
 
         tmpl_data = {
             'info': {
@@ -138,9 +127,74 @@ class TypeParser:
 
         return tmpl_data
 
+    @classmethod
+    def sort_types_by_dependencies(cls, types: List) -> List:
+        """Order types topologically, so every type comes after the types it depends on.
+
+        Types are parsed depth first and prepended, so the reversed list is in discovery order.  Among the types
+        whose dependencies are already placed, the one discovered first is placed next, which keeps the order of
+        the definition file wherever possible.  Types on a dependency cycle (e.g. referring to each other through
+        arrays) cannot be ordered, they are placed in discovery order and a warning is printed.
+        """
+        discovery_order = list(reversed(types))
+        indices_by_name: Dict[str, List[int]] = {}
+        for index, struct_type in enumerate(discovery_order):
+            indices_by_name.setdefault(struct_type['name'], []).append(index)
+
+        missing_dependencies = [0] * len(discovery_order)
+        dependents: List[List[int]] = [[] for _ in discovery_order]
+        for index, struct_type in enumerate(discovery_order):
+            # dependencies on types not defined here (e.g. referenced from other type files) and on the type
+            # itself (e.g. arrays of the type) are ignored
+            for dep_index in set(dep_index for dep_name in struct_type['depends_on']
+                                 for dep_index in indices_by_name.get(dep_name, []) if dep_index != index):
+                missing_dependencies[index] += 1
+                dependents[dep_index].append(index)
+
+        ready = [index for index, missing in enumerate(missing_dependencies) if missing == 0]
+        heapq.heapify(ready)
+        placed = [False] * len(discovery_order)
+        cyclic_types = set()
+        sorted_types: List = []
+        while len(sorted_types) < len(discovery_order):
+            if not ready:
+                # only types on a cycle or depending on one are left, place the cycle member discovered first
+                on_cycles = cls.types_on_cycles(missing_dependencies, dependents, placed)
+                cyclic_types.update(on_cycles)
+                index = min(on_cycles)
+                missing_dependencies[index] = 0
+                heapq.heappush(ready, index)
+            index = heapq.heappop(ready)
+            placed[index] = True
+            sorted_types.append(discovery_order[index])
+            for dependent in dependents[index]:
+                missing_dependencies[dependent] -= 1
+                if missing_dependencies[dependent] == 0:
+                    heapq.heappush(ready, dependent)
+
+        if cyclic_types:
+            names = sorted(set(discovery_order[index]['name'] for index in cyclic_types))
+            print(f'Warning: cyclic dependency between the types {", ".join(names)}, '
+                  'they are placed in definition order')
+
+        return sorted_types
+
+    @staticmethod
+    def types_on_cycles(missing_dependencies: List[int], dependents: List[List[int]], placed: List[bool]) -> Set[int]:
+        """Get the unplaced types on a dependency cycle, without the ones only depending on a cycle."""
+        unordered = set(index for index, missing in enumerate(missing_dependencies)
+                        if missing > 0 and not placed[index])
+        while True:
+            on_cycle = set(index for index in unordered
+                           if any(dependent in unordered for dependent in dependents[index]))
+            if on_cycle == unordered:
+                return on_cycle
+            unordered = on_cycle
+
     @classmethod
     def load_type_definition(cls, type_path: Path):
         """Load a type definition from the provided path and check its last modification time."""
+        DependencyTracker.add(type_path)
         if type_path not in TypeParser.validated_type_defs:
             TypeParser.validated_type_defs[type_path] = helpers.load_validated_type_def(
                 type_path, TypeParser.validators['type'])
@@ -175,7 +229,6 @@ class TypeParser:
         output_path = output_dir / type_with_namespace['relative_path']
         types_file = output_path.with_suffix('.hpp')
         output_path = output_path.parent
-        output_path.mkdir(parents=True, exist_ok=True)
 
         namespaces = ['types']
         namespaces.extend(type_with_namespace['relative_path'].parts)
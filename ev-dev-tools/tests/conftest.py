@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+#
+# SPDX-License-Identifier: Apache-2.0
+# Copyright Pionix GmbH and Contributors to EVerest
+#
+from pathlib import Path
+import os
+import subprocess
+import sys
+
+import pytest
+
+SRC_DIR = Path(__file__).resolve().parent.parent / 'src'
+
+# a small everest project: types referencing each other, an interface using them and a module using the interface
+PROJECT_FILES = {
+    'types/units.yaml': '''
+description: Units
+types:
+  Current:
+    description: Current
+    type: object
+    properties:
+      DC:
+        type: number
+  Phase:
+    description: phase
+    type: string
+    enum: [L1, L2, L3]
+  Power:
+    description: power
+    type: object
+    required: [total]
+    properties:
+      total:
+        type: number
+      phase:
+        $ref: /units#/Phase
+      list:
+        type: array
+        items:
+          $ref: /units#/Current
+''',
+    'types/nested/sub.yaml': '''
+description: Sub
+types:
+  Thing:
+    description: thing
+    type: object
+    properties:
+      power:
+        $ref: /units#/Power
+''',
+    'interfaces/power.yaml': '''
+description: power interface
+cmds:
+  set:
+    description: set
+    arguments:
+      value:
+        description: v
+        type: object
+        $ref: /units#/Power
+      phase:
+        description: p
+        type: string
+        $ref: /units#/Phase
+    result:
+      description: r
+      type: boolean
+vars:
+  phase:
+    description: p
+    type: string
+    $ref: /units#/Phase
+errors:
+  - reference: /errors/generic
+''',
+    'interfaces/empty.yaml': '''
+description: empty
+''',
+    'errors/generic.yaml': '''
+description: generic
+errors:
+  - name: Boom
+    description: boom
+''',
+    'modules/Example/manifest.yaml': '''
+description: Example
+metadata:
+  license: https://opensource.org/licenses/Apache-2.0
+  authors: [a]
+provides:
+  main:
+    description: main
+    interface: power
+requires:
+  other:
+    interface: empty
+    min_connections: 0
+    max_connections: 1
+''',
+}
+
+# the schemas of the everest framework are not part of ev-dev-tools, the tests only need them to accept everything
+SCHEMAS = ['config', 'error-declaration-list', 'interface', 'manifest', 'type']
+
+
+@pytest.fixture
+def everest_project(tmp_path) -> Path:
+    """Write the test project and permissive schemas, returns the project directory."""
+    project_dir = tmp_path / 'project'
+    for name, content in PROJECT_FILES.items():
+        path = project_dir / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content.lstrip())
+    schemas_dir = tmp_path / 'schemas'
+    schemas_dir.mkdir()
+    for schema in SCHEMAS:
+        (schemas_dir / f'{schema}.yaml').write_text('{"type": "object"}\n')
+
+    return project_dir
+
+
+@pytest.fixture
+def ev_cli(everest_project):
+    """Run ev-cli in the test project (in a separate process, like the build does), fails on errors."""
+    def run(*args) -> str:
+        env = dict(os.environ, PYTHONPATH=str(SRC_DIR))
+        result = subprocess.run([sys.executable, '-m', 'ev_cli.ev', *args, '--everest-dir', str(everest_project),
+                                 '--schemas-dir', str(everest_project.parent / 'schemas'),
+                                 '--disable-clang-format'],
+                                cwd=everest_project, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                universal_newlines=True)
+        assert result.returncode == 0, result.stdout
+        return result.stdout
+
+    return run
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+#
+# SPDX-License-Identifier: Apache-2.0
+# Copyright Pionix GmbH and Contributors to EVerest
+#
+import json
+import socket
+import threading
+
+import pytest
+
+from ev_cli.daemon import Daemon
+
+
+def create_daemon(socket_path):
+    return Daemon(socket_path, [], lambda: [], lambda changed: None, poll_interval=1.0, polling=True)
+
+
+def test_stale_socket_is_removed(tmp_path):
+    socket_path = tmp_path / 'ev-cli.sock'
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as stale:
+        stale.bind(str(socket_path))
+    assert socket_path.exists()
+
+    create_daemon(socket_path).remove_stale_socket()
+    assert not socket_path.exists()
+
+
+def test_running_daemon_is_not_replaced(tmp_path):
+    socket_path = tmp_path / 'ev-cli.sock'
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        server.bind(str(socket_path))
+        server.listen()
+
+        def answer_ping():
+            connection, _address = server.accept()
+            with connection:
+                connection.recv(4096)
+                connection.sendall(json.dumps({'status': 'ok'}).encode('utf-8') + b'\n')
+
+        thread = threading.Thread(target=answer_ping)
+        thread.start()
+        with pytest.raises(Exception, match='already listening'):
+            create_daemon(socket_path).remove_stale_socket()
+        thread.join()
+
+    assert socket_path.exists()
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+#
+# SPDX-License-Identifier: Apache-2.0
+# Copyright Pionix GmbH and Contributors to EVerest
+#
+from ev_cli.definition_index import DefinitionIndex
+
+
+def test_unused_types_and_unresolved_references(everest_project):
+    (everest_project / 'types/broken_refs.yaml').write_text('''
+description: refers to missing definitions
+types:
+  Dangling:
+    description: dangling
+    type: object
+    properties:
+      missing:
+        $ref: /units#/Missing
+'''.lstrip())
+    (everest_project / 'interfaces/errors_missing.yaml').write_text('''
+description: refers to missing errors
+errors:
+  - reference: /errors/unknown
+  - reference: /errors/generic#/Bang
+  - reference: /errors/generic#/Boom
+'''.lstrip())
+    index = DefinitionIndex.load([everest_project])
+
+    # Current and Phase are used through Power, which is used by the power interface
+    assert index.unused_types() == ['/broken_refs#/Dangling', '/nested/sub#/Thing']
+    assert index.unresolved_references() == {
+        '/broken_refs#/Dangling': ['/units#/Missing'],
+        'interfaces/errors_missing': ['/errors/generic#/Bang', '/errors/unknown'],
+    }
+    assert index.interfaces_using_type('/units#/Current') == ['power']
+    assert index.modules_providing_interface('power') == ['Example']
+
+
+def test_snapshot_only_parses_changed_files(everest_project, tmp_path):
+    snapshot = tmp_path / 'index.json'
+    DefinitionIndex.load([everest_project]).save(snapshot)
+
+    index = DefinitionIndex.load([everest_project], snapshot)
+    assert index.refresh() == 0
+
+    (everest_project / 'interfaces/empty.yaml').write_text('description: still empty\n')
+    assert index.refresh() == 1
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+#
+# SPDX-License-Identifier: Apache-2.0
+# Copyright Pionix GmbH and Contributors to EVerest
+#
+import os
+
+from ev_cli.dependencies import DependencyGraph, DependencyTracker, format_make_rule, write_depfile
+
+
+def test_graph_tracks_inputs_and_outputs(tmp_path):
+    source = tmp_path / 'source.yaml'
+    output = tmp_path / 'output.hpp'
+    source.write_text('a')
+    output.write_text('generated')
+    graph = DependencyGraph(tmp_path / 'graph.json')
+    assert not graph.is_up_to_date('target', 'settings')
+
+    graph.update('target', 'settings', [source], [output])
+    graph.save()
+    graph = DependencyGraph(tmp_path / 'graph.json')
+    assert graph.is_up_to_date('target', 'settings')
+    assert not graph.is_up_to_date('target', 'other settings')
+    assert graph.inputs_of('target') == [str(source)]
+    assert graph.outputs_of('target') == [str(output)]
+
+    # changed outputs are outdated
+    output.write_text('edited')
+    assert not DependencyGraph(tmp_path / 'graph.json').is_up_to_date('target', 'settings')
+    output.write_text('generated')
+
+    # changed inputs are outdated, touching them is not a change
+    os.utime(source, (0, 0))
+    assert DependencyGraph(tmp_path / 'graph.json').is_up_to_date('target', 'settings')
+    source.write_text('b')
+    assert not DependencyGraph(tmp_path / 'graph.json').is_up_to_date('target', 'settings')
+
+    graph.discard('target')
+    assert not graph.is_up_to_date('target', 'settings')
+
+
+def test_graph_ignores_broken_graph_files(tmp_path):
+    graph_file = tmp_path / 'graph.json'
+    graph_file.write_text('{broken')
+    assert DependencyGraph(graph_file).targets == {}
+
+
+def test_nested_recordings_are_added_to_the_outer_one():
+    with DependencyTracker.record() as outer:
+        DependencyTracker.add('a.yaml')
+        with DependencyTracker.record() as inner:
+            DependencyTracker.add('b.yaml')
+    assert {str(path) for path in inner} == {'b.yaml'}
+    assert {str(path) for path in outer} == {'a.yaml', 'b.yaml'}
+
+
+def test_depfile_escapes_paths_and_touches_outdated_outputs(tmp_path):
+    assert format_make_rule(['out file.hpp'], ['in$put#.yaml']) == 'out\\ file.hpp: \\\n  in$$put\\#.yaml\n'
+
+    source = tmp_path / 'source.yaml'
+    output = tmp_path / 'output.hpp'
+    source.write_text('a')
+    output.write_text('generated')
+    os.utime(output, (0, 0))
+    write_depfile(tmp_path / 'deps/output.d', [output], [source])
+    assert (tmp_path / 'deps/output.d').read_text() == f'{output}: \\\n  {source}\n'
+    assert output.stat().st_mtime >= source.stat().st_mtime
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+#
+# SPDX-License-Identifier: Apache-2.0
+# Copyright Pionix GmbH and Contributors to EVerest
+#
+from pathlib import Path
+import re
+
+from ev_cli.file_diff import diff_ignore_regex, differs, unified_diff
+
+COMMENT = re.compile('^//.*')
+
+
+def test_unified_diff_of_changed_line():
+    old = 'a\nb\nc\n'
+    new = 'a\nB\nc\n'
+    assert unified_diff(old, new, 'old', 'new') == '--- old\n+++ new\n@@ -1,3 +1,3 @@\n a\n-b\n+B\n c\n'
+    assert differs(old, new)
+
+
+def test_equal_contents_do_not_differ():
+    assert unified_diff('a\n', 'a\n', 'old', 'new') == ''
+    assert not differs('a\n', 'a\n')
+
+
+def test_missing_newline_at_end_of_file():
+    assert unified_diff('a\n', 'a', 'old', 'new') == ('--- old\n+++ new\n@@ -1 +1 @@\n-a\n+a\n'
+                                                      '\\ No newline at end of file\n')
+
+
+def test_ignorable_changes_are_left_out():
+    old = '// generated at 1\nint a;\n'
+    new = '// generated at 2\nint a;\n'
+    assert unified_diff(old, new, 'old', 'new', COMMENT) == ''
+    assert not differs(old, new, COMMENT)
+
+
+def test_ignorable_changes_in_a_hunk_with_other_changes_are_shown():
+    old = '// 1\nint a;\n'
+    new = '// 2\nint b;\n'
+    assert unified_diff(old, new, 'old', 'new', COMMENT) == ('--- old\n+++ new\n@@ -1,2 +1,2 @@\n'
+                                                           '-// 1\n-int a;\n+// 2\n+int b;\n')
+    assert differs(old, new, COMMENT)
+
+
+def test_distant_changes_are_separate_hunks():
+    old = ''.join(f'{line}\n' for line in range(20))
+    new = old.replace('1\n', 'one\n', 1).replace('18\n', 'eighteen\n')
+    diff = unified_diff(old, new, 'old', 'new')
+    hunk_headers = [line for line in diff.splitlines() if line.startswith('@@')]
+    assert hunk_headers == ['@@ -1,5 +1,5 @@', '@@ -16,5 +16,5 @@']
+
+
+def test_ignore_regex_by_file_type():
+    assert diff_ignore_regex(Path('module.hpp')).pattern == '^//.*'
+    assert diff_ignore_regex(Path('CMakeLists.txt')).pattern == '^#.*'
+    assert diff_ignore_regex(Path('manifest.yaml')) is None
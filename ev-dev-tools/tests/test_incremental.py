@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+#
+# SPDX-License-Identifier: Apache-2.0
+# Copyright Pionix GmbH and Contributors to EVerest
+#
+from pathlib import Path
+import filecmp
+import os
+
+
+def assert_same_tree(left: Path, right: Path):
+    comparison = filecmp.dircmp(left, right)
+    assert not comparison.left_only and not comparison.right_only
+    for name in comparison.common_files:
+        assert (left / name).read_text() == (right / name).read_text(), name
+    for name in comparison.common_dirs:
+        assert_same_tree(left / name, right / name)
+
+
+def drop_phase_enum(everest_project: Path):
+    units = everest_project / 'types/units.yaml'
+    units.write_text(units.read_text().replace('    enum: [L1, L2, L3]\n', ''))
+
+
+def test_incremental_regenerates_outputs_of_changed_referenced_type(everest_project, ev_cli, tmp_path):
+    cache_dir = tmp_path / 'cache'
+    ev_cli('interface', 'generate-headers', '-o', str(tmp_path / 'incremental'), '--incremental',
+           '--cache-dir', str(cache_dir))
+    interface_header = tmp_path / 'incremental/power/Interface.hpp'
+    assert 'phase_to_string' in interface_header.read_text()
+
+    drop_phase_enum(everest_project)
+    # the referenced type is older than the outputs (e.g. after a checkout), only its content changed
+    old_mtime = interface_header.stat().st_mtime - 100
+    os.utime(everest_project / 'types/units.yaml', (old_mtime, old_mtime))
+    output = ev_cli('interface', 'generate-headers', '-o', str(tmp_path / 'incremental'), '--incremental',
+                    '--cache-dir', str(cache_dir))
+    assert 'Skipping power/Interface.hpp' not in output
+
+    ev_cli('interface', 'generate-headers', '-o', str(tmp_path / 'clean'))
+    assert_same_tree(tmp_path / 'incremental', tmp_path / 'clean')
+
+    # the target is recorded as up-to-date afterwards
+    output = ev_cli('interface', 'generate-headers', '-o', str(tmp_path / 'incremental'), '--incremental',
+                    '--cache-dir', str(cache_dir))
+    assert 'Skipping interface power (up-to-date)' in output
+
+
+def read_depfile(depfile: Path):
+    outputs, inputs = depfile.read_text().replace('\\\n', ' ').split(':', 1)
+    return outputs.split(), inputs.split()
+
+
+def assert_outputs_newer_than_inputs(depfile: Path):
+    outputs, inputs = read_depfile(depfile)
+    assert outputs and inputs
+    newest_input = max(os.stat(input_path).st_mtime for input_path in inputs)
+    for output in outputs:
+        assert os.stat(output).st_mtime >= newest_input, output
+
+
+def make_outputs_older(depfile: Path):
+    outputs, inputs = read_depfile(depfile)
+    old_mtime = min(os.stat(input_path).st_mtime for input_path in inputs) - 100
+    for output in outputs:
+        os.utime(output, (old_mtime, old_mtime))
+
+
+def test_depfile_outputs_are_newer_than_changed_referenced_type(everest_project, ev_cli, tmp_path):
+    depfile = tmp_path / 'interfaces.d'
+    ev_cli('interface', 'generate-headers', '-o', str(tmp_path / 'generated'), '--depfile', str(depfile))
+    _outputs, inputs = read_depfile(depfile)
+    assert str(everest_project / 'types/units.yaml') in inputs
+
+    # only the referenced type changes, the outputs are still newer than all other inputs (and the templates)
+    outputs, inputs = read_depfile(depfile)
+    units = str(everest_project / 'types/units.yaml')
+    newest_other_input = max(os.stat(input_path).st_mtime for input_path in inputs if input_path != units)
+    for output in outputs:
+        os.utime(output, (newest_other_input + 0.01, newest_other_input + 0.01))
+    drop_phase_enum(everest_project)
+    os.utime(units, (newest_other_input + 0.02, newest_other_input + 0.02))
+    ev_cli('interface', 'generate-headers', '-o', str(tmp_path / 'generated'), '--depfile', str(depfile))
+    assert 'phase_to_string' not in (tmp_path / 'generated/power/Interface.hpp').read_text()
+    assert_outputs_newer_than_inputs(depfile)
+
+    # outputs with unchanged content are kept, but must not look outdated to Make or Ninja
+    make_outputs_older(depfile)
+    os.utime(everest_project / 'types/units.yaml')
+    output = ev_cli('interface', 'generate-headers', '-o', str(tmp_path / 'generated'), '--depfile', str(depfile),
+                    '--keep-unchanged')
+    assert 'Skipping power/Interface.hpp (content unchanged)' in output
+    assert_outputs_newer_than_inputs(depfile)
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+#
+# SPDX-License-Identifier: Apache-2.0
+# Copyright Pionix GmbH and Contributors to EVerest
+#
+import urllib.request
+
+import jsonschema
+import pytest
+
+from ev_cli import schema_validation
+
+pytest.importorskip('fastjsonschema')
+
+
+@pytest.fixture(autouse=True)
+def offline(monkeypatch):
+    def urlopen(*args, **kwargs):
+        raise AssertionError('schemas must not be downloaded')
+
+    monkeypatch.setattr(urllib.request, 'urlopen', urlopen)
+    monkeypatch.setattr(schema_validation, 'compiled_schemas', {})
+    monkeypatch.setattr(schema_validation, 'compiled_meta_schemas', {})
+    monkeypatch.setattr(schema_validation, 'checked_schemas', set())
+
+
+def test_draft7_meta_schema_reference_is_resolved_offline():
+    validate = schema_validation.compile_schema({'$ref': 'http://json-schema.org/draft-07/schema#'}, use_formats=True)
+    assert validate
+    validate({'type': 'object'})
+    with pytest.raises(Exception):
+        validate({'type': 42})
+
+
+def test_other_remote_references_are_not_compiled():
+    assert schema_validation.compile_schema({'$ref': 'https://example.com/schema.json'}, use_formats=False) is None
+
+
+def test_compiled_meta_schema_follows_backend(monkeypatch):
+    monkeypatch.setattr(schema_validation, 'backend', 'auto')
+    schema_validation.check_schema({'type': 'object'})
+    assert schema_validation.compiled_meta_schemas['auto']
+
+    monkeypatch.setattr(schema_validation, 'backend', 'jsonschema')
+    with pytest.raises(jsonschema.SchemaError):
+        schema_validation.check_schema({'type': 42})
+    assert schema_validation.compiled_meta_schemas['jsonschema'] is False
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+#
+# SPDX-License-Identifier: Apache-2.0
+# Copyright Pionix GmbH and Contributors to EVerest
+#
+from ev_cli import helpers  # noqa: F401 (type_parsing can only be imported after helpers)
+from ev_cli.type_parsing import TypeParser
+
+
+def struct_types(*definitions):
+    """Create the parsed types in discovery order, the parser prepends them while parsing."""
+    return list(reversed([{'name': name, 'depends_on': depends_on} for name, depends_on in definitions]))
+
+
+def sorted_names(types):
+    return [struct_type['name'] for struct_type in TypeParser.sort_types_by_dependencies(types)]
+
+
+def test_dependencies_come_first():
+    types = struct_types(('Power', ['Current', 'Phase']), ('Current', []), ('Phase', []))
+    assert sorted_names(types) == ['Current', 'Phase', 'Power']
+
+
+def test_definition_order_is_kept_where_possible():
+    types = struct_types(('B', []), ('A', []), ('C', ['External', 'C']), ('D', ['B']))
+    assert sorted_names(types) == ['B', 'A', 'C', 'D']
+
+
+def test_cycle_is_placed_in_definition_order(capsys):
+    types = struct_types(('Independent', []), ('Node', ['Edge']), ('Edge', ['Node']), ('Graph', ['Node']))
+    assert sorted_names(types) == ['Independent', 'Node', 'Edge', 'Graph']
+    assert 'cyclic dependency between the types Edge, Node' in capsys.readouterr().out
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: Apache-2.0
+# Copyright Pionix GmbH and Contributors to EVerest
+"""
+Benchmark how a test suite using the everest-testing fixtures scales with the number of pytest-xdist workers.
+
+The suite is run once per worker count and the wall time, the speedup relative to the first run and the parallel
+efficiency (speedup / workers) are reported.  All arguments after "--" are passed to pytest.
+
+usage: xdist_scaling.py [--workers 1,2,4,8] [--json results.json] -- tests/ --everest-prefix ~/everest-core/build/dist
+"""
+
+from datetime import datetime, timezone
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+
+def default_worker_counts():
+    """1, 2, 4, ... up to the number of cores (including the number of cores)."""
+    cores = os.cpu_count() or 1
+    counts = []
+    count = 1
+    while count < cores:
+        counts.append(count)
+        count *= 2
+    counts.append(cores)
+    return counts
+
+
+def run_suite(workers, pytest_args):
+    cmd = [sys.executable, '-m', 'pytest', '-q', '-p', 'xdist', '-n', str(workers), *pytest_args]
+    start = time.perf_counter()
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    wall_time = time.perf_counter() - start
+    summary = result.stdout.strip().splitlines()[-1] if result.stdout.strip() else ''
+
+    return {'workers': workers, 'wall_time': wall_time, 'returncode': result.returncode, 'summary': summary}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='pytest-xdist scaling benchmark of an everest-testing suite')
+    parser.add_argument('--workers', type=str, default=None,
+                        help='comma separated worker counts (default: 1, 2, 4, ... up to the number of cores)')
+    parser.add_argument('--json', type=str, default=None, help='write the results to this json file')
+    parser.add_argument('pytest_args', nargs=argparse.REMAINDER, help='arguments passed to pytest (after "--")')
+    args = parser.parse_args()
+
+    pytest_args = args.pytest_args[1:] if args.pytest_args[:1] == ['--'] else args.pytest_args
+    worker_counts = [int(count) for count in args.workers.split(',')] if args.workers else default_worker_counts()
+
+    runs = []
+    print(f'{"workers":>8} {"wall [s]":>10} {"speedup":>8} {"efficiency":>11}  result')
+    for workers in worker_counts:
+        run = run_suite(workers, pytest_args)
+        baseline = runs[0] if runs else run
+        run['speedup'] = baseline['wall_time'] * baseline['workers'] / run['wall_time']
+        run['efficiency'] = run['speedup'] / workers
+        runs.append(run)
+        print(f'{workers:>8} {run["wall_time"]:>10.1f} {run["speedup"]:>8.2f} {run["efficiency"]:>11.0%}  '
+              f'{run["summary"]}', flush=True)
+
+    results = {
+        'date': datetime.now(timezone.utc).isoformat(),
+        'host': platform.node(),
+        'cores': os.cpu_count(),
+        'pytest_args': pytest_args,
+        'runs': runs,
+    }
+    if args.json:
+        with open(args.json, 'w') as json_file:
+            json.dump(results, json_file, indent=2)
+
+    return 1 if any(run['returncode'] != 0 for run in runs) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
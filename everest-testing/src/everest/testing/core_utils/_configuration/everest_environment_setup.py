@@ -3,17 +3,17 @@
 from __future__ import annotations
 
 import logging
-import shutil
+from copy import deepcopy
 from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Optional, Dict, List, Union
 
-import yaml
-
+from everest.testing.core_utils import yaml_utils
 from everest.testing.core_utils.common import OCPPVersion
 from everest.testing.core_utils.everest_core import EverestCore, Requirement
 from .everest_configuration_strategies.everest_configuration_strategy import \
     EverestConfigAdjustmentStrategy
+from .everest_environment_snapshot import EverestEnvironmentSnapshot, EverestEnvironmentSnapshotStore, clone_tree
 from .everest_configuration_strategies.evse_security_configuration_strategy import \
     EvseSecurityModuleConfigurationStrategy, EvseSecurityModuleConfiguration
 from .everest_configuration_strategies.ocpp_module_configuration_strategy import \
@@ -84,8 +84,18 @@ class EverestTestEnvironmentSetup:
         - sets up special modules (initiates the setup of OCPPlib such as parsing the device model database)
         - creates the EverestCore instance
 
+     The state of the environment (certificates, OCPP configuration and databases, persistent store) can be captured
+     as golden snapshot with capture_state and be reset to it with restore_state. Given a snapshot store, the state is
+     captured after the first start of EVerest; given the configuration key as well, the snapshot is shared by all
+     environments of the configuration: the following ones restore it instead of setting up their state again.
+
     """
 
+    # directories below the temporary path, which hold the state of the environment
+    STATE_DIRECTORIES = ("certs", "ocpp_config", "persistent_storage")
+    # paths within the state directories, which are not part of the state: the OCPP message logs of the test
+    EXCLUDED_STATE_PATHS = ("ocpp_config/logs",)
+
     @dataclass
     class _EverestEnvironmentTemporaryPaths:
         """ Paths of the temporary configuration files / data """
@@ -104,7 +114,9 @@ class EverestTestEnvironmentSetup:
                  evse_security_config: Optional[EverestEnvironmentEvseSecurityConfiguration] = None,
                  persistent_store_config: Optional[EverestEnvironmentPersistentStoreConfiguration] = None,
                  standalone_module: Optional[Union[str, List[str]]] = None,
-                 everest_config_strategies: Optional[List[EverestConfigAdjustmentStrategy]] = None
+                 everest_config_strategies: Optional[List[EverestConfigAdjustmentStrategy]] = None,
+                 state_snapshots: Optional[EverestEnvironmentSnapshotStore] = None,
+                 configuration_key: Optional[str] = None
                  ) -> None:
         self._core_config = core_config
         self._ocpp_config = ocpp_config
@@ -117,9 +129,18 @@ class EverestTestEnvironmentSetup:
         self._additional_everest_config_strategies = everest_config_strategies if everest_config_strategies else []
         self._everest_core = None
         self._ocpp_configuration = None
+        self._tmp_path = None
+        self._state_snapshot = None
+        # without configuration key, the snapshot captured after the start of EVerest is not shared
+        self._state_snapshots = state_snapshots
+        self._configuration_key = configuration_key
 
     def setup_environment(self, tmp_path: Path):
 
+        self._tmp_path = tmp_path
+        shared_snapshot = self._state_snapshots.get(self._configuration_key) \
+            if self._state_snapshots and self._configuration_key else None
+
         temporary_paths = self._create_temporary_directory_structure(tmp_path)
 
         configuration_strategies = self._create_everest_configuration_strategies(
@@ -132,6 +153,12 @@ class EverestTestEnvironmentSetup:
                                          standalone_module=self._standalone_module,
                                          tmp_path=tmp_path)
 
+        if shared_snapshot:
+            shared_snapshot.restore(tmp_path)
+            self._state_snapshot = shared_snapshot
+            self._ocpp_configuration = deepcopy(shared_snapshot.data)
+            return
+
         if self._ocpp_config:
             self._ocpp_configuration = self._setup_libocpp_configuration(
                 temporary_paths=temporary_paths
@@ -140,6 +167,9 @@ class EverestTestEnvironmentSetup:
         if self._evse_security_config:
             self._setup_evse_security_configuration(temporary_paths)
 
+        if self._state_snapshots:
+            self._everest_core.started_callbacks.append(self._capture_started_state)
+
     @property
     def everest_core(self) -> EverestCore:
         assert self._everest_core, "Everest Core not initialized; run 'setup_environment' first"
@@ -149,6 +179,32 @@ class EverestTestEnvironmentSetup:
     def ocpp_config(self):
         return self._ocpp_configuration
 
+    def capture_state(self) -> EverestEnvironmentSnapshot:
+        """ Captures the golden snapshot of the environment state; databases may be captured while EVerest is running. """
+        assert self._tmp_path, "Environment not set up; run 'setup_environment' first"
+        self._state_snapshot = EverestEnvironmentSnapshot.capture(self._tmp_path, self.STATE_DIRECTORIES,
+                                                                  self._tmp_path / "state_snapshot",
+                                                                  self.EXCLUDED_STATE_PATHS)
+        return self._state_snapshot
+
+    def restore_state(self):
+        """ Resets the environment state to the snapshot taken by capture_state (or to the shared snapshot of the
+        configuration); EVerest should be stopped meanwhile. """
+        assert self._state_snapshot, "No state captured; start EVerest or run 'capture_state' first"
+        self._state_snapshot.restore(self._tmp_path)
+
+    def _capture_started_state(self):
+        """ Captures the state after the first start of EVerest, as shared snapshot if there is a configuration key. """
+        if self._state_snapshot is not None:
+            return
+        if self._configuration_key:
+            self._state_snapshot = self._state_snapshots.capture(self._configuration_key, self._tmp_path,
+                                                                 self.STATE_DIRECTORIES,
+                                                                 deepcopy(self._ocpp_configuration),
+                                                                 self.EXCLUDED_STATE_PATHS)
+        else:
+            self.capture_state()
+
     def _create_temporary_directory_structure(self, tmp_path: Path) -> _EverestEnvironmentTemporaryPaths:
         ocpp_config_dir = tmp_path / "ocpp_config"
         ocpp_config_dir.mkdir(exist_ok=True)
@@ -260,7 +316,7 @@ class EverestTestEnvironmentSetup:
     def _determine_configured_charge_point_config_path_from_everest_config(self):
 
         if self._ocpp_config.ocpp_version == OCPPVersion.ocpp16:
-            everest_template_config = yaml.safe_load(
+            everest_template_config = yaml_utils.safe_load(
                 self._core_config.template_everest_config_path.read_text())
 
             charge_point_config_path = \
@@ -282,5 +338,4 @@ class EverestTestEnvironmentSetup:
             logging.warning(
                 "No 'source_certificate_directory' configured in EverestEnvironmentEvseSecurityConfiguration. "
                 f"Will use certificates from local installation {source_certs_directory}', which might lead to flaky tests.")
-        shutil.copytree(source_certs_directory,
-                        temporary_paths.certs_dir, dirs_exist_ok=True)
+        clone_tree(source_certs_directory, temporary_paths.certs_dir)
@@ -0,0 +1,217 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright Pionix GmbH and Contributors to EVerest
+from __future__ import annotations
+
+import logging
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+SQLITE_HEADER = b"SQLite format 3\x00"
+# files maintained by sqlite next to a database, their content is part of the database backup
+SQLITE_SIDE_FILE_SUFFIXES = ("-wal", "-shm", "-journal")
+
+# ioctl to clone a file on copy-on-write file systems (btrfs, xfs, ...)
+_FICLONE = 0x40049409
+
+
+def clone_file(source: Path, target: Path):
+    """ Copies a file as copy-on-write clone (reflink) if the file system supports it, as plain copy otherwise. """
+    if sys.platform.startswith("linux"):
+        import fcntl
+        try:
+            with source.open("rb") as source_file, target.open("wb") as target_file:
+                fcntl.ioctl(target_file.fileno(), getattr(fcntl, "FICLONE", _FICLONE), source_file.fileno())
+            shutil.copystat(source, target)
+            return
+        except OSError:
+            pass
+    shutil.copy2(source, target)
+
+
+def clone_tree(source: Path, target: Path):
+    """ Like shutil.copytree(source, target, dirs_exist_ok=True), but cloning the files where possible. """
+    shutil.copytree(source, target, copy_function=clone_file, dirs_exist_ok=True)
+
+
+def is_sqlite_database(path: Path) -> bool:
+    try:
+        with path.open("rb") as f:
+            return f.read(len(SQLITE_HEADER)) == SQLITE_HEADER
+    except OSError:
+        return False
+
+
+def _backup_sqlite_database(source: Path, target: Path):
+    """ Copies a database with the sqlite backup API; consistent even if the source is in use, and in place if the
+    target exists, so connections holding the target open see the copied content. """
+    source_connection = sqlite3.connect(f"file:{source}?mode=ro", uri=True)
+    target_connection = sqlite3.connect(target)
+    try:
+        source_connection.backup(target_connection)
+    finally:
+        target_connection.close()
+        source_connection.close()
+
+
+def _state(path: Path, database: bool = False) -> Tuple:
+    """ Modification time and size of a file, including the side files if it is a database (changes of databases in
+    WAL mode only touch the -wal file until the next checkpoint). """
+    side_files = [Path(f"{path}{suffix}") for suffix in SQLITE_SIDE_FILE_SUFFIXES] if database else []
+    state = []
+    for file in (path, *side_files):
+        try:
+            stat = file.stat()
+            state.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            state.append(None)
+    return tuple(state)
+
+
+def _walk(root: Path, directory: str, excluded: Set[Path]) -> Iterable[Path]:
+    """ All files below the directory of root, relative to root, without the side files of sqlite databases and
+    without the excluded paths (relative to root). """
+    for current, dirs, files in os.walk(root / directory):
+        relative_dir = Path(current).relative_to(root)
+        dirs[:] = [name for name in dirs if relative_dir / name not in excluded]
+        for file_name in files:
+            if not file_name.endswith(SQLITE_SIDE_FILE_SUFFIXES) and relative_dir / file_name not in excluded:
+                yield relative_dir / file_name
+
+
+class EverestEnvironmentSnapshot:
+    """ Golden snapshot of directories of a temporary EVerest environment (e.g. certificates, OCPP configuration and
+    databases, persistent store), which can be restored within milliseconds.
+
+    Capturing copies the files into the snapshot directory, sqlite databases through the sqlite backup API, so they
+    may be captured while EVerest is running. A snapshot can be restored into the environment it was captured from or
+    into another environment of the same configuration. Restoring only copies the files changed since the last
+    capture/restore of the environment (by modification time and size) and removes files added meanwhile: databases
+    are restored in place through the backup API, other files are cloned (reflink) where the file system supports it.
+    Excluded paths (e.g. logs) are neither captured nor touched by restoring.
+    Restore while EVerest is stopped, as EVerest modules might cache state.
+    """
+
+    def __init__(self, root: Path, directories: Iterable[str], snapshot_dir: Path, excluded: Iterable[str] = ()):
+        self._root = root
+        self._directories = list(directories)
+        self._excluded = set(Path(path) for path in excluded)
+        self._snapshot_dir = snapshot_dir
+        # paths of the captured files relative to root
+        self._files: Set[Path] = set()
+        self._databases: Set[Path] = set()
+        # state of the files of each environment after its last capture / restore, by path relative to its root
+        self._states: Dict[Path, Dict[Path, Tuple]] = {}
+        # data derived while setting up the captured files, e.g. the OCPP configuration written to them
+        self.data = None
+
+    @classmethod
+    def capture(cls, root: Path, directories: Iterable[str], snapshot_dir: Path,
+                excluded: Iterable[str] = ()) -> EverestEnvironmentSnapshot:
+        snapshot = cls(root, directories, snapshot_dir, excluded)
+        if snapshot_dir.exists():
+            shutil.rmtree(snapshot_dir)
+
+        states = snapshot._states.setdefault(root, {})
+        for directory in snapshot._directories:
+            snapshot_dir.joinpath(directory).mkdir(parents=True, exist_ok=True)
+            if not (root / directory).exists():
+                continue
+            for path in _walk(root, directory, snapshot._excluded):
+                (snapshot_dir / path).parent.mkdir(parents=True, exist_ok=True)
+                database = is_sqlite_database(root / path)
+                if database:
+                    _backup_sqlite_database(root / path, snapshot_dir / path)
+                    snapshot._databases.add(path)
+                else:
+                    clone_file(root / path, snapshot_dir / path)
+                snapshot._files.add(path)
+                states[path] = _state(root / path, database)
+
+        logging.info(f"Captured snapshot of {len(snapshot._files)} files of {root} in {snapshot_dir}")
+        return snapshot
+
+    def restore(self, root: Optional[Path] = None):
+        """ Restores the snapshot into root, by default into the environment it was captured from. """
+        root = root if root is not None else self._root
+        states = self._states.setdefault(root, {})
+        restored = 0
+        for directory in self._directories:
+            (root / directory).mkdir(parents=True, exist_ok=True)
+            for path in list(_walk(root, directory, self._excluded)):
+                if path not in self._files:
+                    (root / path).unlink()
+                    for suffix in SQLITE_SIDE_FILE_SUFFIXES:
+                        (root / f"{path}{suffix}").unlink(missing_ok=True)
+
+        for path in self._files:
+            target = root / path
+            database = path in self._databases
+            if _state(target, database) == states.get(path):
+                continue
+            target.parent.mkdir(parents=True, exist_ok=True)
+            if database:
+                _backup_sqlite_database(self._snapshot_dir / path, target)
+            else:
+                # clone next to the target and replace it atomically
+                temporary_target = target.with_name(f".{target.name}.restore")
+                clone_file(self._snapshot_dir / path, temporary_target)
+                os.replace(temporary_target, target)
+            states[path] = _state(target, database)
+            restored += 1
+
+        logging.debug(f"Restored {restored} of {len(self._files)} files of {root} from {self._snapshot_dir}")
+
+    def forget(self, root: Optional[Path] = None):
+        """ Drops the state kept for the environment in root (for all environments by default), e.g. once the
+        environment has been removed. """
+        if root is None:
+            self._states.clear()
+        else:
+            self._states.pop(root, None)
+
+
+class EverestEnvironmentSnapshotStore:
+    """ Golden snapshots shared by the environments of a test session, by configuration key.
+
+    The first environment of a configuration captures the snapshot (after EVerest started, so it includes the
+    databases EVerest creates at startup); the following environments of this configuration restore it instead of
+    setting up their state again.
+    """
+
+    def __init__(self, base_dir: Path):
+        self._base_dir = base_dir
+        self._snapshots: Dict[str, EverestEnvironmentSnapshot] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[EverestEnvironmentSnapshot]:
+        with self._lock:
+            return self._snapshots.get(key)
+
+    def capture(self, key: str, root: Path, directories: Iterable[str], data=None,
+                excluded: Iterable[str] = ()) -> EverestEnvironmentSnapshot:
+        """ Captures the snapshot of the configuration key from root, unless it has been captured already; returns
+        the snapshot of the configuration. """
+        with self._lock:
+            if key not in self._snapshots:
+                snapshot = EverestEnvironmentSnapshot.capture(root, directories, self._base_dir / key, excluded)
+                snapshot.data = data
+                self._snapshots[key] = snapshot
+            return self._snapshots[key]
+
+    def forget(self, root: Path):
+        """ Drops the state kept for the environment in root by all snapshots. """
+        with self._lock:
+            for snapshot in self._snapshots.values():
+                snapshot.forget(root)
+
+    def clear(self):
+        """ Drops all snapshots together with the state kept for the environments, e.g. at the end of the session. """
+        with self._lock:
+            for snapshot in self._snapshots.values():
+                snapshot.forget()
+            self._snapshots.clear()
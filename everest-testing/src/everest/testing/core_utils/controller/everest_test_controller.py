@@ -25,6 +25,11 @@ class EverestTestController(TestController):
         self._everest_core.start()
         self._initialize_nodered_sil()
 
+    async def start_async(self):
+        self._initialize_external_mqtt_client()
+        await self._everest_core.start_async()
+        self._initialize_nodered_sil()
+
     def stop(self, *exc_details):
         self._everest_core.stop()
         self._destroy_mqtt_client()
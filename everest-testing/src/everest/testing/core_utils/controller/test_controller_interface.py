@@ -16,6 +16,13 @@ class TestController():
         """
         raise NotImplementedError()
 
+    async def start_async(self):
+        """
+        Same as start, but without blocking the event loop while the chargepoint
+        starts. Defaults to calling start.
+        """
+        self.start()
+
     def stop(self):
         """
         This method stops the chargepoint (similiar to power off). This includes
@@ -1,23 +1,25 @@
 # SPDX-License-Identifier: Apache-2.0
 # Copyright Pionix GmbH and Contributors to EVerest
 
+import asyncio
 import logging
 import os
-import signal
 from threading import Thread
 import threading
 import time
 import subprocess
 from pathlib import Path
 import tempfile
-from typing import List, Optional, Union, Dict
+from typing import Callable, List, Optional, Tuple, Union, Dict
 import uuid
-import yaml
 import selectors
 from signal import SIGINT
 
 from everest.framework import RuntimeSession
 from everest.testing.core_utils.common import Requirement
+from everest.testing.core_utils import yaml_utils
+from everest.testing.core_utils.everest_log import EverestLogPump
+from everest.testing.core_utils.workers import worker_id
 from ._configuration.everest_configuration_strategies.everest_configuration_strategy import \
     EverestConfigAdjustmentStrategy
 from ._configuration.everest_configuration_strategies.mqtt_configuration_strategy import \
@@ -26,37 +28,73 @@ from ._configuration.everest_configuration_strategies.probe_module_configuration
     ProbeModuleConfigurationStrategy
 
 STARTUP_TIMEOUT = 30
+# number of output lines logged, if EVerest does not start in time
+STARTUP_FAILURE_LOG_LINES = 100
 
 Connections = dict[str, List[Requirement]]
 
 
 class StatusFifoListener:
+    """ Reads the status lines EVerest writes to the status fifo.
+
+    Status lines can arrive split across reads, so the data is buffered until a line is complete. All complete lines
+    are kept in `received`. Waiting is possible blocking (wait_for_status) or from an asyncio event loop (wait_until),
+    which watches the fifo with loop.add_reader instead of blocking the loop.
+    """
+
     def __init__(self, status_fifo_path: Path):
         if not status_fifo_path.exists():
             os.mkfifo(status_fifo_path)
 
         # note: open doesn't support non-blocking, so we use os.open to get the fd
-        fd = os.open(status_fifo_path, flags=(os.O_RDONLY | os.O_NONBLOCK))
-        self._file_obj = open(fd)
+        self._fd = os.open(status_fifo_path, flags=(os.O_RDONLY | os.O_NONBLOCK))
+        self._buffer = b""
+        self.received: List[str] = []
+        # true, once EVerest closed the fifo
+        self.closed = False
 
         selector = selectors.DefaultSelector()
-        selector.register(self._file_obj, selectors.EVENT_READ)
+        selector.register(self._fd, selectors.EVENT_READ)
         self._selector = selector
 
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._waiters: List[Tuple[List[str], asyncio.Future]] = []
+
+    def _read(self) -> List[str]:
+        """ Read the available data and return the status lines completed by it. """
+        try:
+            data = os.read(self._fd, 65536)
+        except BlockingIOError:
+            return []
+        except OSError:
+            data = b""
+
+        if len(data) == 0:
+            self.closed = True
+            data = b"\n"
+
+        self._buffer += data
+        *lines, self._buffer = self._buffer.split(b"\n")
+        status_lines = [line.decode(errors="ignore").strip() for line in lines]
+        status_lines = [status for status in status_lines if status]
+        self.received.extend(status_lines)
+
+        return status_lines
+
     def wait_for_status(self, timeout: float, match_status: list[str]) -> Optional[list[str]]:
         if match_status is None:
             match_status = []
 
-        end_time = time.time() + timeout
+        end_time = time.monotonic() + timeout
 
         while True:
             for _key, _mask in self._selector.select(timeout):
-                data = self._file_obj.read()
-                if len(data) == 0:
+                received_status = self._read()
+                if self.closed and len(received_status) == 0:
                     return None
 
-                # plural!
-                received_status = data.splitlines()
+                if len(received_status) == 0:
+                    continue
 
                 if len(match_status) == 0:
                     # we're not trying to match any messages
@@ -67,11 +105,72 @@ class StatusFifoListener:
                 if len(matched_status) > 0:
                     return matched_status
 
-            timeout = end_time - time.time()
+                if self.closed:
+                    return None
+
+            timeout = end_time - time.monotonic()
 
             if timeout < 0:
                 return []
 
+    async def wait_until(self, status: Union[str, List[str]], timeout: Optional[float] = None) -> str:
+        """ Wait until one of the given status lines has been received (possibly before calling) and return it.
+
+        Raises asyncio.TimeoutError if no status matched within timeout, RuntimeError if EVerest closed the fifo.
+        """
+        match_status = [status] if isinstance(status, str) else list(status)
+        self._watch(asyncio.get_running_loop())
+
+        matched = self._match(match_status)
+        if matched:
+            return matched
+        if self.closed:
+            raise RuntimeError(f"EVerest closed the status fifo without reporting {' or '.join(match_status)}")
+
+        waiter = (match_status, self._loop.create_future())
+        self._waiters.append(waiter)
+        try:
+            return await asyncio.wait_for(waiter[1], timeout)
+        finally:
+            self._waiters.remove(waiter)
+
+    def close(self):
+        self._unwatch()
+        self._selector.close()
+        os.close(self._fd)
+
+    def _match(self, match_status: List[str]) -> Optional[str]:
+        for status in self.received:
+            if status in match_status:
+                return status
+        return None
+
+    def _watch(self, loop: asyncio.AbstractEventLoop):
+        if self._loop is loop or self.closed:
+            return
+        self._unwatch()
+        loop.add_reader(self._fd, self._on_readable)
+        self._loop = loop
+
+    def _unwatch(self):
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.remove_reader(self._fd)
+        self._loop = None
+
+    def _on_readable(self):
+        self._read()
+        for match_status, future in self._waiters:
+            if future.done():
+                continue
+            matched = self._match(match_status)
+            if matched:
+                future.set_result(matched)
+            elif self.closed:
+                future.set_exception(RuntimeError(
+                    f"EVerest closed the status fifo without reporting {' or '.join(match_status)}"))
+        if self.closed:
+            self._unwatch()
+
 
 class EverestCore:
     """This class can be used to configure, start and stop a full build of everest-core
@@ -121,21 +220,25 @@ class EverestCore:
 
         self._write_temporary_config(config_path, everest_configuration_adjustment_strategies)
 
-        logging.info(f"everest uuid: {self.everest_uuid}")
+        logging.info(f"everest uuid: {self.everest_uuid} (worker {worker_id()})")
         logging.info(f"temp everest config: {self.everest_config_path} based on {config_path}")
 
         self.test_control_modules = None
 
         self.log_reader_thread: Thread = None
+        self.log_pump: Optional[EverestLogPump] = None
+        self.status_listener: Optional[StatusFifoListener] = None
         self.everest_running = False
         self.all_modules_started_event = threading.Event()
+        # called whenever EVerest completed its startup (e.g. to capture the state of its environment)
+        self.started_callbacks: List[Callable[[], None]] = []
 
         self._standalone_module = standalone_module
 
     @property
     def everest_config(self) -> Dict:
         with self.everest_config_path.open("r") as f:
-            return yaml.safe_load(f)
+            return yaml_utils.safe_load(f)
 
     def _write_temporary_config(self, template_config_path: Path, everest_configuration_adjustment_strategies: Optional[
         List[EverestConfigAdjustmentStrategy]]):
@@ -143,11 +246,11 @@ class EverestCore:
         everest_configuration_adjustment_strategies.append(
             EverestMqttConfigurationAdjustmentStrategy(everest_uuid=self.everest_uuid,
                                                        mqtt_external_prefix=self.mqtt_external_prefix))
-        everest_config = yaml.safe_load(template_config_path.read_text())
+        everest_config = yaml_utils.safe_load(template_config_path.read_text())
         for strategy in everest_configuration_adjustment_strategies:
             everest_config = strategy.adjust_everest_configuration(everest_config)
         with self.everest_config_path.open("w") as f:
-            yaml.dump(everest_config, f)
+            yaml_utils.dump(everest_config, f)
 
     def start(self, standalone_module: Optional[Union[str, List[str]]] = None, test_connections: Connections = None):
         """Starts everest-core in a subprocess
@@ -155,8 +258,61 @@ class EverestCore:
         Args:
             standalone_module (str, optional): If set, a submodule can be started separately. EVerest will then wait for the submodule to be started.
              Defaults to None.
+
+        If EVerest has already been started (e.g. by the EverestCorePool) and no other standalone modules or test
+        connections are given, the running instance is kept.
         """
 
+        expected_status = self._spawn(standalone_module, test_connections)
+        if expected_status is None:
+            return
+
+        status = self.status_listener.wait_for_status(STARTUP_TIMEOUT, [expected_status])
+        if status == None or len(status) == 0:
+            logging.error(f"EVerest did not start in time, its last output:\n{self.everest_log_text()}")
+            raise TimeoutError("Timeout while waiting for EVerest to start")
+
+        self._started(expected_status)
+
+    async def start_async(self, standalone_module: Optional[Union[str, List[str]]] = None,
+                          test_connections: Connections = None):
+        """Starts everest-core in a subprocess like start(), but waits for the startup without blocking the event loop,
+        so other async setup (e.g. of the central system) can run meanwhile.
+        """
+
+        expected_status = self._spawn(standalone_module, test_connections)
+        if expected_status is None:
+            return
+
+        try:
+            await self.wait_until(expected_status, STARTUP_TIMEOUT)
+        except (asyncio.TimeoutError, RuntimeError) as e:
+            logging.error(f"EVerest did not start in time, its last output:\n{self.everest_log_text()}")
+            raise TimeoutError("Timeout while waiting for EVerest to start") from e
+
+        self._started(expected_status)
+
+    async def wait_until(self, status: Union[str, List[str]], timeout: Optional[float] = None) -> str:
+        """Wait until EVerest reported the status (or one of the status) on its status fifo, returns the status.
+
+        A status reported before calling is matched as well. Raises asyncio.TimeoutError on timeout and RuntimeError,
+        if EVerest stopped without reporting the status.
+        """
+        assert self.status_listener, "EVerest not started; run 'start' or 'start_async' first"
+        return await self.status_listener.wait_until(status, timeout)
+
+    def _spawn(self, standalone_module: Optional[Union[str, List[str]]], test_connections: Connections) -> Optional[str]:
+        """Spawns the manager and returns the status indicating a completed startup, None if EVerest is running already
+        """
+
+        if self.process and self.process.poll() is None:
+            if standalone_module is None and test_connections is None:
+                logging.info("EVerest is running already")
+                return None
+            logging.info("EVerest is running already, restarting it with the given standalone modules/test connections")
+            self.stop()
+            self.all_modules_started_event.clear()
+
         standalone_module = standalone_module if standalone_module is not None else self._standalone_module
 
         manager_path = self.prefix_path / 'bin/manager'
@@ -188,34 +344,39 @@ class EverestCore:
         self.process = subprocess.Popen(
             args, cwd=self.prefix_path, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
 
-        self.log_reader_thread = Thread(target=self.read_everest_log)
-        self.log_reader_thread.start()
-
-        expected_status = 'ALL_MODULES_STARTED' if standalone_module == None else 'WAITING_FOR_STANDALONE_MODULES'
+        # if EVEREST_LOG_DIR is set, the complete output is written there as well
+        log_dir = os.environ.get("EVEREST_LOG_DIR")
+        spill_file = Path(log_dir) / f"everest_{self.everest_uuid}.log" if log_dir else None
+        if spill_file:
+            spill_file.parent.mkdir(parents=True, exist_ok=True)
+            logging.info(f"EVerest output: {spill_file}")
+        self.log_pump = EverestLogPump(self.process, spill_file=spill_file)
+        self.log_reader_thread = self.log_pump.thread
+        self.log_pump.start()
 
-        status = self.status_listener.wait_for_status(STARTUP_TIMEOUT, [expected_status])
-        if status == None or len(status) == 0:
-            self.read_everest_log()
-            raise TimeoutError("Timeout while waiting for EVerest to start")
+        return 'ALL_MODULES_STARTED' if standalone_module == None else 'WAITING_FOR_STANDALONE_MODULES'
 
+    def _started(self, expected_status: str):
         logging.info("EVerest has started")
         if expected_status == 'ALL_MODULES_STARTED':
             self.all_modules_started_event.set()
+        for callback in self.started_callbacks:
+            callback()
 
     def read_everest_log(self):
-        while self.process.poll() == None:
-            stderr_raw = self.process.stderr.readline()
-            stderr_formatted = stderr_raw.strip().decode(errors="ignore")
-            logging.debug(f'  {stderr_formatted}')
-
-        if self.process.returncode == 0:
-            logging.info("EVerest stopped with return code 0")
-        elif self.process.returncode < 0:
-            logging.info(f"EVerest stopped by signal {signal.Signals(-self.process.returncode).name}")
-        else:
-            logging.warning(f"EVerest stopped with return code: {self.process.returncode}")
+        """Waits until EVerest stopped and all its output has been read and logged, including its return code.
+
+        The output is read by the log pump started with EVerest, use everest_log_text() to get it.
+        """
+        if self.log_pump:
+            self.log_pump.join()
 
-        logging.debug("EVerest output stopped")
+    def everest_log_text(self, limit: Optional[int] = STARTUP_FAILURE_LOG_LINES) -> str:
+        """Returns the last lines of the captured output of EVerest"""
+        if not self.log_pump:
+            return ""
+
+        return self.log_pump.text(limit=limit)
 
     def stop(self):
         """Stops execution of EVerest by signaling SIGINT
@@ -229,6 +390,10 @@ class EverestCore:
         if self.log_reader_thread:
             self.log_reader_thread.join()
 
+        if self.status_listener:
+            self.status_listener.close()
+            self.status_listener = None
+
     def _create_testing_user_config(self):
         """Creates a user-config file to include the PyTestControlModule in the current SIL simulation.
         If a user-config already exists, it will be re-named
@@ -246,7 +411,7 @@ class EverestCore:
         user_config = {}
         user_config = ProbeModuleConfigurationStrategy(connections=self.test_connections).adjust_everest_configuration(user_config)
 
-        file.write_text(yaml.dump(user_config))
+        file.write_text(yaml_utils.dump(user_config))
 
     def get_runtime_session(self):
         return RuntimeSession(str(self.prefix_path), str(self.everest_config_path))
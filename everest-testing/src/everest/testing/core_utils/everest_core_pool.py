@@ -0,0 +1,172 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright Pionix GmbH and Contributors to EVerest
+
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Deque, List, Optional, Union
+
+from ._configuration.everest_configuration_strategies.everest_configuration_strategy import \
+    EverestConfigAdjustmentStrategy
+from ._configuration.everest_environment_setup import EverestEnvironmentCoreConfiguration, \
+    EverestEnvironmentEvseSecurityConfiguration, EverestEnvironmentOCPPConfiguration, \
+    EverestEnvironmentPersistentStoreConfiguration, EverestEnvironmentProbeModuleConfiguration
+
+
+# number of distinct configurations, for which started instances are kept; spare instances of the least recently
+# used configurations are torn down
+MAX_POOLED_CONFIGURATIONS = 2
+
+
+def _strategy_key(strategy) -> str:
+    """ Strategies are compared by their type and attributes; attributes without a meaningful repr (e.g. callables)
+    make the key unique, so such strategies are never shared. """
+    return f"{type(strategy).__module__}.{type(strategy).__qualname__}{sorted(vars(strategy).items())!r}"
+
+
+def configuration_key(core_config: EverestEnvironmentCoreConfiguration,
+                      ocpp_config: Optional[EverestEnvironmentOCPPConfiguration] = None,
+                      probe_config: Optional[EverestEnvironmentProbeModuleConfiguration] = None,
+                      evse_security_config: Optional[EverestEnvironmentEvseSecurityConfiguration] = None,
+                      persistent_store_config: Optional[EverestEnvironmentPersistentStoreConfiguration] = None,
+                      standalone_module: Optional[Union[str, List[str]]] = None,
+                      everest_config_strategies: Optional[List[EverestConfigAdjustmentStrategy]] = None) -> str:
+    """ Hash of the inputs an environment is set up from (cf. EverestTestEnvironmentSetup), without setting it up.
+
+    Environments set up from equal inputs run the same EVerest configuration, so they get the same key (used by the
+    EverestCorePool and to share state snapshots). Besides the configuration dataclasses, the content of the template
+    EVerest configuration is part of the key. The OCPP configuration includes the port of the central system, so OCPP
+    environments only share a key, if the central system uses a fixed port.
+    """
+    template_config_path = core_config.template_everest_config_path
+    template_config = template_config_path.read_text() if template_config_path else ""
+
+    key = hashlib.sha256()
+    for part in (repr(core_config), template_config, repr(ocpp_config), repr(probe_config), repr(evse_security_config),
+                 repr(persistent_store_config), repr(standalone_module),
+                 *(_strategy_key(strategy) for strategy in everest_config_strategies or [])):
+        key.update(part.encode("utf-8"))
+        key.update(b"\0")
+    return key.hexdigest()
+
+
+class _PooledConfiguration:
+    def __init__(self, setup: Callable[[Path], object]):
+        self.setup = setup
+        # instances (i.e. environments) being started or ready to be handed out, oldest first
+        self.instances: Deque[Future] = deque()
+
+
+class EverestCorePool:
+    """ Pool of EVerest instances, which are started in the background before the tests requiring them.
+
+    Instances are kept per configuration (cf. configuration_key). When a test acquires an instance, the pool hands
+    out the oldest instance of this configuration (waiting for it to finish its startup if necessary) and starts a
+    replacement, so that `size` instances are kept ready for the next tests. Instances handed out are torn down after
+    the test, as the test changed their state; spare instances are torn down when the pool is closed.
+
+    The pool operates on environments, i.e. objects with an `everest_core` property such as
+    EverestTestEnvironmentSetup; each instance lives in its own temporary directory below `base_dir`.
+    """
+
+    def __init__(self, size: int, base_dir: Optional[Path] = None,
+                 max_configurations: int = MAX_POOLED_CONFIGURATIONS):
+        assert size > 0, "Pool size must be positive"
+        self._size = size
+        self._base_dir = base_dir
+        self._max_configurations = max_configurations
+        self._configurations: "OrderedDict[str, _PooledConfiguration]" = OrderedDict()
+        self._lock = threading.Lock()
+        # teardowns wait for instances still starting, so they get their own threads
+        self._startup_executor = ThreadPoolExecutor(max_workers=(size + 1) * max_configurations,
+                                                    thread_name_prefix="everest-core-pool-startup")
+        self._teardown_executor = ThreadPoolExecutor(thread_name_prefix="everest-core-pool-teardown")
+        self._teardowns: List[Future] = []
+        self._closed = False
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def acquire(self, key: str, setup: Callable[[Path], object]):
+        """ Get a started instance of the configuration key.
+
+        Args:
+            key: The configuration key of the instance.
+            setup: Callable setting up a new environment in the given (empty) temporary directory; used to start the
+             instances of this configuration. The environment has to provide the EverestCore as `everest_core`.
+        """
+        with self._lock:
+            assert not self._closed, "EverestCorePool is closed"
+            configuration = self._configurations.get(key)
+            if configuration is None:
+                configuration = _PooledConfiguration(setup)
+                self._configurations[key] = configuration
+                self._evict_configurations()
+            self._configurations.move_to_end(key)
+
+            if not configuration.instances:
+                self._start_instance(configuration)
+            instance = configuration.instances.popleft()
+            while len(configuration.instances) < self._size:
+                self._start_instance(configuration)
+
+        return instance.result()
+
+    def release(self, environment):
+        """ Tear down an instance handed out by acquire. """
+        with self._lock:
+            self._teardowns = [teardown for teardown in self._teardowns if not teardown.done()]
+            self._teardowns.append(self._teardown_executor.submit(environment.everest_core.stop))
+
+    def close(self):
+        """ Tear down all spare instances and wait for all teardowns to complete. """
+        with self._lock:
+            self._closed = True
+            for configuration in self._configurations.values():
+                self._discard_instances(configuration)
+            self._configurations.clear()
+            teardowns = self._teardowns
+            self._teardowns = []
+
+        for teardown in teardowns:
+            teardown.result()
+        self._startup_executor.shutdown(wait=True)
+        self._teardown_executor.shutdown(wait=True)
+
+    def _start_instance(self, configuration: _PooledConfiguration):
+        configuration.instances.append(self._startup_executor.submit(self._run_instance, configuration.setup))
+
+    def _run_instance(self, setup: Callable[[Path], object]):
+        tmp_path = Path(tempfile.mkdtemp(prefix="everest_core_", dir=self._base_dir))
+        environment = setup(tmp_path)
+        try:
+            environment.everest_core.start()
+        except Exception:
+            environment.everest_core.stop()
+            raise
+        logging.info(f"Pooled EVerest instance {environment.everest_core.everest_uuid} started in {tmp_path}")
+        return environment
+
+    def _evict_configurations(self):
+        while len(self._configurations) > self._max_configurations:
+            _key, configuration = self._configurations.popitem(last=False)
+            self._discard_instances(configuration)
+
+    def _discard_instances(self, configuration: _PooledConfiguration):
+        while configuration.instances:
+            instance = configuration.instances.popleft()
+            self._teardowns.append(self._teardown_executor.submit(self._stop_instance, instance))
+
+    @staticmethod
+    def _stop_instance(instance: Future):
+        try:
+            environment = instance.result()
+        except Exception as e:
+            logging.warning(f"Pooled EVerest instance failed to start: {e}")
+            return
+        environment.everest_core.stop()
@@ -0,0 +1,188 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright Pionix GmbH and Contributors to EVerest
+
+import logging
+import os
+import re
+import selectors
+import signal
+import subprocess
+import threading
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Deque, List, Optional, Tuple
+
+# bytes of output kept in memory per EVerest instance
+DEFAULT_LOG_CAPACITY = 4 * 1024 * 1024
+
+_READ_SIZE = 65536
+
+_ANSI_ESCAPE = re.compile(r"\x1b\[[0-9;]*[A-Za-z]")
+# e.g. "2024-01-15 10:23:45.123456 [INFO] evse_manager   :: message"
+_LOG_LINE = re.compile(r"^(?P<timestamp>\d{4}-\d\d-\d\d[ T][\d:.]+)?\s*\[(?P<level>[A-Za-z]+)\]\s+"
+                       r"(?P<module>[^\s:]+)?[\s:]*(?P<message>.*)$")
+
+_LEVELS = {
+    "VERB": logging.DEBUG,
+    "DEBG": logging.DEBUG,
+    "DEBUG": logging.DEBUG,
+    "INFO": logging.INFO,
+    "WARN": logging.WARNING,
+    "WARNING": logging.WARNING,
+    "ERRO": logging.ERROR,
+    "ERROR": logging.ERROR,
+    "CRIT": logging.CRITICAL,
+    "CRITICAL": logging.CRITICAL,
+}
+
+
+@dataclass
+class EverestLogRecord:
+    """ A parsed line of the EVerest output; lines not following the EVerest log format only have a message. """
+    stream: str
+    message: str
+    timestamp: Optional[str] = None
+    level: Optional[int] = None
+    module: Optional[str] = None
+
+    @classmethod
+    def parse(cls, stream: str, line: str) -> "EverestLogRecord":
+        line = _ANSI_ESCAPE.sub("", line)
+        match = _LOG_LINE.match(line)
+        if not match:
+            return cls(stream=stream, message=line)
+        return cls(stream=stream,
+                   message=match.group("message"),
+                   timestamp=match.group("timestamp"),
+                   level=_LEVELS.get(match.group("level").upper()),
+                   module=match.group("module"))
+
+
+class EverestLogPump:
+    """ Drains stdout and stderr of the EVerest manager in a background thread, so the manager never stalls on a full
+    pipe.
+
+    The output is kept in a bounded ring buffer of line blocks and optionally appended to a spill file. It is neither
+    decoded nor split into lines while reading; only when debug logging is enabled, the lines are forwarded to
+    logging. Parsing into EverestLogRecord happens only when the output is requested.
+
+    Positions in the output are given by marks: lines(since=pump.mark()) returns the output produced after the mark.
+    """
+
+    def __init__(self, process: subprocess.Popen, capacity: int = DEFAULT_LOG_CAPACITY,
+                 spill_file: Optional[Path] = None):
+        self._process = process
+        self._capacity = capacity
+        self._spill_file = spill_file
+        # (sequence number, stream, block of complete lines)
+        self._blocks: Deque[Tuple[int, str, bytes]] = deque()
+        self._size = 0
+        self._sequence = 0
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="everest-log-pump", daemon=True)
+
+    @property
+    def thread(self) -> threading.Thread:
+        return self._thread
+
+    def start(self):
+        self._thread.start()
+
+    def join(self, timeout: Optional[float] = None):
+        self._thread.join(timeout)
+
+    def mark(self) -> int:
+        """ Current position in the output. """
+        with self._lock:
+            return self._sequence
+
+    def lines(self, since: int = 0, limit: Optional[int] = None) -> List[Tuple[str, str]]:
+        """ (stream, line) of the buffered output after the mark since, at most the last limit lines. """
+        with self._lock:
+            blocks = [(stream, block) for sequence, stream, block in self._blocks if sequence >= since]
+
+        lines = []
+        for stream, block in blocks:
+            lines.extend((stream, line) for line in block.decode(errors="ignore").splitlines())
+        if limit is not None:
+            lines = lines[-limit:]
+        return lines
+
+    def records(self, since: int = 0, limit: Optional[int] = None,
+                min_level: Optional[int] = None, module: Optional[str] = None) -> List[EverestLogRecord]:
+        """ Parsed output after the mark since, optionally filtered by (minimum) log level and module. """
+        records = [EverestLogRecord.parse(stream, line) for stream, line in self.lines(since)]
+        if min_level is not None:
+            records = [record for record in records if record.level is not None and record.level >= min_level]
+        if module is not None:
+            records = [record for record in records if record.module == module]
+        if limit is not None:
+            records = records[-limit:]
+        return records
+
+    def text(self, since: int = 0, limit: Optional[int] = None) -> str:
+        """ The buffered output after the mark since, without terminal color codes. """
+        return _ANSI_ESCAPE.sub("", "\n".join(line for _stream, line in self.lines(since, limit)))
+
+    def _append(self, stream: str, block: bytes):
+        with self._lock:
+            self._blocks.append((self._sequence, stream, block))
+            self._sequence += 1
+            self._size += len(block)
+            while self._size > self._capacity and len(self._blocks) > 1:
+                self._size -= len(self._blocks.popleft()[2])
+
+    def _run(self):
+        selector = selectors.DefaultSelector()
+        partial = {}
+        for stream, pipe in (("stdout", self._process.stdout), ("stderr", self._process.stderr)):
+            if pipe is not None:
+                os.set_blocking(pipe.fileno(), False)
+                selector.register(pipe.fileno(), selectors.EVENT_READ, stream)
+                partial[stream] = b""
+
+        spill: Optional[BinaryIO] = self._spill_file.open("ab") if self._spill_file else None
+        try:
+            while selector.get_map():
+                for key, _mask in selector.select():
+                    stream = key.data
+                    try:
+                        data = os.read(key.fd, _READ_SIZE)
+                    except BlockingIOError:
+                        continue
+
+                    if not data:
+                        selector.unregister(key.fd)
+                        block, partial[stream] = partial[stream], b""
+                    else:
+                        # keep the incomplete last line until the rest of it has been read
+                        data = partial[stream] + data
+                        end = data.rfind(b"\n") + 1
+                        block, partial[stream] = data[:end], data[end:]
+                    if not block:
+                        continue
+
+                    self._append(stream, block)
+                    if spill:
+                        spill.write(block if block.endswith(b"\n") else block + b"\n")
+                    if logging.getLogger().isEnabledFor(logging.DEBUG):
+                        for line in block.decode(errors="ignore").splitlines():
+                            logging.debug(f'  {line.strip()}')
+        finally:
+            selector.close()
+            if spill:
+                spill.close()
+
+        self._log_returncode()
+
+    def _log_returncode(self):
+        returncode = self._process.wait()
+        if returncode == 0:
+            logging.info("EVerest stopped with return code 0")
+        elif returncode < 0:
+            logging.info(f"EVerest stopped by signal {signal.Signals(-returncode).name}")
+        else:
+            logging.warning(f"EVerest stopped with return code: {returncode}")
+
+        logging.debug("EVerest output stopped")
@@ -14,8 +14,12 @@ from ._configuration.everest_environment_setup import \
     EverestEnvironmentProbeModuleConfiguration, \
     EverestTestEnvironmentSetup, EverestEnvironmentOCPPConfiguration, EverestEnvironmentCoreConfiguration, \
     EverestEnvironmentEvseSecurityConfiguration, EverestEnvironmentPersistentStoreConfiguration
+from ._configuration.everest_environment_snapshot import EverestEnvironmentSnapshotStore
 from everest.testing.core_utils.controller.everest_test_controller import EverestTestController
 from everest.testing.core_utils.everest_core import EverestCore
+from everest.testing.core_utils.everest_core_pool import EverestCorePool, configuration_key
+# not exported with the fixtures, the hook using it lives in the pytest plugin
+from everest.testing.core_utils.pytest_plugin import everest_log_window as _everest_log_window
 
 
 @pytest.fixture
@@ -76,9 +80,39 @@ def everest_config_strategies(request) -> list[EverestConfigAdjustmentStrategy]:
     return additional_configuration_strategies
 
 
+@pytest.fixture(scope="session")
+def everest_core_pool(request, tmp_path_factory) -> Optional[EverestCorePool]:
+    """Session wide pool of pre-started EVerest instances, enabled by the --everest-core-pool-size option of the
+    everest-testing pytest plugin (or the EVEREST_CORE_POOL_SIZE environment variable)."""
+    pool_size = request.config.getoption("--everest-core-pool-size", default=None)
+    if pool_size is None:
+        pool_size = os.environ.get("EVEREST_CORE_POOL_SIZE")
+    if not pool_size or int(pool_size) <= 0:
+        yield None
+        return
+
+    pool = EverestCorePool(size=int(pool_size), base_dir=tmp_path_factory.mktemp("everest_core_pool"))
+
+    yield pool
+
+    pool.close()
+
+
+@pytest.fixture(scope="session")
+def everest_state_snapshots(tmp_path_factory) -> EverestEnvironmentSnapshotStore:
+    """Session wide snapshots of the environment state after the first start of EVerest, by configuration"""
+    state_snapshots = EverestEnvironmentSnapshotStore(tmp_path_factory.mktemp("everest_state_snapshots"))
+
+    yield state_snapshots
+
+    state_snapshots.clear()
+
+
 @pytest.fixture
 def everest_environment(request,
                  tmp_path,
+                 everest_core_pool: Optional[EverestCorePool],
+                 everest_state_snapshots: EverestEnvironmentSnapshotStore,
                  core_config: EverestEnvironmentCoreConfiguration,
                  ocpp_config: Optional[EverestEnvironmentOCPPConfiguration],
                  probe_module_config: Optional[EverestEnvironmentProbeModuleConfiguration],
@@ -87,20 +121,37 @@ def everest_environment(request,
                  everest_config_strategies
                  ):
     standalone_module_marker = request.node.get_closest_marker('standalone_module')
+    standalone_module = list(standalone_module_marker.args) if standalone_module_marker else None
+    key = configuration_key(core_config, ocpp_config, probe_module_config, evse_security_config,
+                            persistent_store_config, standalone_module, everest_config_strategies)
+
+    def setup_environment(environment_tmp_path: Path) -> EverestTestEnvironmentSetup:
+        environment_setup = EverestTestEnvironmentSetup(
+            core_config=core_config,
+            ocpp_config=ocpp_config,
+            probe_config=probe_module_config,
+            evse_security_config=evse_security_config,
+            persistent_store_config=persistent_store_config,
+            standalone_module=standalone_module,
+            everest_config_strategies=everest_config_strategies,
+            state_snapshots=everest_state_snapshots,
+            configuration_key=None if request.node.get_closest_marker('no_everest_state_snapshot') else key
+        )
+        environment_setup.setup_environment(tmp_path=environment_tmp_path)
+        return environment_setup
 
-    environment_setup = EverestTestEnvironmentSetup(
-        core_config=core_config,
-        ocpp_config=ocpp_config,
-        probe_config=probe_module_config,
-        evse_security_config=evse_security_config,
-        persistent_store_config=persistent_store_config,
-        standalone_module=list(standalone_module_marker.args) if standalone_module_marker else None,
-        everest_config_strategies=everest_config_strategies
-    )
+    # OCPP instances connect to the central system of the running test as soon as they are started, so they are
+    # never pre-started
+    if everest_core_pool is None or ocpp_config is not None or request.node.get_closest_marker('no_everest_core_pool'):
+        yield setup_environment(tmp_path)
+        everest_state_snapshots.forget(tmp_path)
+        return
+
+    pooled_environment_setup = everest_core_pool.acquire(key, setup_environment)
 
-    environment_setup.setup_environment(tmp_path=tmp_path)
+    yield pooled_environment_setup
 
-    yield environment_setup
+    everest_core_pool.release(pooled_environment_setup)
 
 @pytest.fixture
 def everest_core(request,
@@ -108,11 +159,23 @@ def everest_core(request,
                  )-> EverestCore:
     """Fixture that can be used to start and stop everest-core"""
 
-    yield everest_environment.everest_core
+    everest_core = everest_environment.everest_core
+    log_pump = everest_core.log_pump
+    request.node.stash[_everest_log_window] = (everest_core, log_pump, log_pump.mark() if log_pump else 0)
+
+    yield everest_core
 
     # FIXME (aw): proper life time management, shouldn't the fixure start and stop?
     everest_environment.everest_core.stop()
 
+@pytest.fixture
+def restore_everest_state(everest_environment):
+    """Fixture providing a function resetting the state of the environment (certificates, OCPP configuration and
+    databases, persistent store) to the snapshot captured after the first start of EVerest with this configuration.
+    Stop EVerest before calling it.
+    """
+    yield everest_environment.restore_state
+
 @pytest.fixture
 def ocpp_configuration(everest_environment):
     yield everest_environment.ocpp_config
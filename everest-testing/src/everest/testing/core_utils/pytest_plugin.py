@@ -0,0 +1,40 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright Pionix GmbH and Contributors to EVerest
+""" pytest plugin of everest-testing, registered through the pytest11 entry point (disable it with
+-p no:everest_testing).
+
+It provides the command line options of the core_utils fixtures and attaches the EVerest output to the reports of
+failing tests; the fixtures themselves are still imported into the conftest.py of a test suite.
+"""
+import pytest
+
+# number of EVerest output lines attached to the report of a failing test
+EVEREST_LOG_REPORT_LINES = 200
+
+# (everest_core, log pump, mark) of the EVerest instance of a test, stashed by the everest_core fixture
+everest_log_window = pytest.StashKey[tuple]()
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("everest-testing")
+    group.addoption("--everest-core-pool-size", action="store", type=int, default=None,
+                    help="number of EVerest instances pre-started per configuration by the everest_core_pool fixture; "
+                         "default = EVEREST_CORE_POOL_SIZE environment variable or no pool")
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_makereport(item, call):
+    """Attach the output EVerest produced during a failing test to its report"""
+    outcome = yield
+    report = outcome.get_result()
+    if not report.failed or report.when not in ("setup", "call") or everest_log_window not in item.stash:
+        return
+
+    everest_core, log_pump, mark = item.stash[everest_log_window]
+    if everest_core.log_pump is None:
+        return
+    # the instance might have been (re)started after the test got it
+    since = mark if everest_core.log_pump is log_pump else 0
+    output = everest_core.log_pump.text(since=since, limit=EVEREST_LOG_REPORT_LINES)
+    if output:
+        report.sections.append((f"EVerest output ({everest_core.everest_uuid})", output))
@@ -0,0 +1,43 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright Pionix GmbH and Contributors to EVerest
+""" Helpers to isolate test sessions running in parallel pytest-xdist workers.
+
+Each worker is a separate pytest session. Everything that is unique per EverestCore instance (MQTT prefixes, uuids,
+the temporary directories below pytest's per-worker basetemp) is isolated already; fixed ports, such as the default
+CSMS port, are shifted into a range per worker.
+"""
+
+import os
+
+# number of ports reserved per worker, starting from a base port
+PORTS_PER_WORKER = 100
+
+
+def worker_id() -> str:
+    """ Id of the pytest-xdist worker running this session (e.g. "gw3"), "master" if not running under xdist. """
+    return os.environ.get("PYTEST_XDIST_WORKER", "master")
+
+
+def worker_index() -> int:
+    """ Index of the pytest-xdist worker running this session, 0 if not running under xdist. """
+    worker = worker_id()
+    if worker.startswith("gw"):
+        return int(worker[len("gw"):])
+    return 0
+
+
+def worker_count() -> int:
+    """ Number of pytest-xdist workers, 1 if not running under xdist. """
+    return int(os.environ.get("PYTEST_XDIST_WORKER_COUNT", "1"))
+
+
+def worker_port(base_port: int, offset: int = 0) -> int:
+    """ Port base_port + offset shifted into the port range of this worker, so workers never share a fixed port.
+
+    Without xdist (and in the first worker), the port is base_port + offset.
+    """
+    assert 0 <= offset < PORTS_PER_WORKER, f"Port offset must be below {PORTS_PER_WORKER}"
+    port = base_port + worker_index() * PORTS_PER_WORKER + offset
+    if port > 65535:
+        raise ValueError(f"No port left for worker {worker_id()} above base port {base_port}")
+    return port
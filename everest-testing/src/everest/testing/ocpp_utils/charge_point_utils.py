@@ -16,6 +16,8 @@ from ocpp.messages import unpack
 from ocpp.charge_point import ChargePoint as CP
 from ocpp.charge_point import snake_to_camel_case, camel_to_snake_case, asdict, remove_nones
 
+from everest.testing.core_utils.workers import worker_port
+
 
 @dataclass
 class ChargePointInfo:
@@ -56,7 +58,8 @@ class FirmwareInfo:
 class OcppTestConfiguration:
     csms_tls_enabled: bool = False
     csms_tls_verify_client_certificate: bool = False
-    csms_port: str = 9000
+    # 9000 without pytest-xdist, shifted into the port range of the worker otherwise
+    csms_port: str = field(default_factory=lambda: worker_port(9000))
     csms_host: str = "127.0.0.1"
     charge_point_info: ChargePointInfo = field(default_factory=ChargePointInfo)
     config_path: Optional[Path] = None
@@ -6,7 +6,6 @@ import shutil
 import socket
 import ssl
 import sys
-import tempfile
 from dataclasses import dataclass
 from pathlib import Path
 from threading import Thread
@@ -95,7 +94,7 @@ async def central_system(request, ocpp_version: OCPPVersion, test_config):
 async def charge_point(central_system: CentralSystem, test_controller: EverestTestController):
     """Fixture for ChargePoint16. Requires central_system_v201 and test_controller. Starts test_controller immediately
     """
-    test_controller.start()
+    await test_controller.start_async()
     cp = await central_system.wait_for_chargepoint()
     yield cp
     await cp.stop()
@@ -156,19 +155,23 @@ class FtpThread(Thread):
 
 
 @pytest.fixture
-def ftp_server(test_config: OcppTestConfiguration):
+def ftp_server(test_config: OcppTestConfiguration, tmp_path_factory):
     """This fixture creates a temporary directory and starts
     a local ftp server connected to that directory. The temporary
     directory is deleted afterwards
     """
 
-    d = tempfile.mkdtemp(prefix='tmp_ftp')
+    # below pytest's basetemp, which is separate for each pytest-xdist worker
+    d = tmp_path_factory.mktemp('tmp_ftp')
     address = ("127.0.0.1", 0)
     ftp_socket = socket.socket()
     ftp_socket.bind(address)
+    # listen already, so clients connecting before the server thread is up are queued
+    ftp_socket.listen()
     port = ftp_socket.getsockname()[1]
 
-    ftp_thread = FtpThread(directory=d, port=port,
+    # pyftpdlib expects the directory as str
+    ftp_thread = FtpThread(directory=str(d), port=port,
                            test_config=test_config, ftp_socket=ftp_socket)
     ftp_thread.daemon = True
     ftp_thread.start()
@@ -222,6 +225,6 @@ async def central_system_v16_standalone(request, central_system: CentralSystem,
 
     Fixture for standalone central system. Requires central_system_v16 and test_controller. Starts test_controller immediately
     """
-    test_controller.start()
+    await test_controller.start_async()
     yield central_system
     test_controller.stop()
@@ -0,0 +1,32 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright Pionix GmbH and Contributors to EVerest
+import ftplib
+import getpass
+import io
+
+import pytest
+
+from everest.testing.ocpp_utils.charge_point_utils import FirmwareInfo, OcppTestConfiguration
+# noinspection PyUnresolvedReferences
+from everest.testing.ocpp_utils.fixtures import ftp_server
+
+
+@pytest.fixture
+def test_config(tmp_path) -> OcppTestConfiguration:
+    update_file = tmp_path / "firmware.pnx"
+    update_file.write_bytes(b"firmware")
+    update_file_signature = tmp_path / "firmware.pnx.base64"
+    update_file_signature.write_text("c2lnbmF0dXJl")
+    return OcppTestConfiguration(firmware_info=FirmwareInfo(update_file=update_file,
+                                                            update_file_signature=update_file_signature))
+
+
+def test_ftp_server_serves_firmware(ftp_server):
+    with ftplib.FTP() as client:
+        client.connect("127.0.0.1", ftp_server.port, timeout=10)
+        client.login(getpass.getuser(), "12345")
+        assert sorted(client.nlst()) == ["firmware_update.pnx", "firmware_update.pnx.base64"]
+
+        firmware = io.BytesIO()
+        client.retrbinary("RETR firmware_update.pnx", firmware.write)
+        assert firmware.getvalue() == b"firmware"
@@ -12,6 +12,7 @@ import argparse
 import os
 import re
 import yaml
+import yaml_utils
 import subprocess
 from packaging.version import Version
 
@@ -54,7 +55,7 @@ def main():
     snapshot = None
     with open(in_snapshot, encoding='utf-8') as snapshot_file:
         try:
-            snapshot = yaml.safe_load(snapshot_file)
+            snapshot = yaml_utils.safe_load(snapshot_file)
         except yaml.YAMLError as e:
             print(f"Error parsing yaml of {in_snapshot}: {e}")
             return
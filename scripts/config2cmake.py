@@ -10,6 +10,7 @@ Parse a EVerest config and return a CMake command line to build only those modul
 """
 import argparse
 import yaml
+import yaml_utils
 import sys
 
 from pathlib import Path
@@ -17,7 +18,7 @@ from pathlib import Path
 
 def get_modules(config_yaml_path: Path):
     try:
-        config = yaml.safe_load(config_yaml_path.read_text())
+        config = yaml_utils.safe_load(config_yaml_path.read_text())
         module_names = set()
         for _key, value in config['active_modules'].items():
             module_names.add(value['module'])
@@ -11,6 +11,7 @@ Use edm to create a snapshot of the current directory without polluting the curr
 
 import argparse
 import yaml
+import yaml_utils
 import subprocess
 from pathlib import Path
 import shutil
@@ -94,7 +95,7 @@ def main():
     snapshot = None
     with open(in_snapshot, mode='r', encoding='utf-8') as snapshot_file:
         try:
-            snapshot = yaml.safe_load(snapshot_file)
+            snapshot = yaml_utils.safe_load(snapshot_file)
         except yaml.YAMLError as e:
             print(f'Error parsing yaml of {in_snapshot}: {e}')
     if snapshot:
@@ -131,7 +132,7 @@ def main():
                     print(f'  List of tags with "latest" removed: "{tags}" is not directly usable...')
 
         with open(in_snapshot, mode='w', encoding='utf-8') as snapshot_file:
-            yaml.safe_dump(snapshot, snapshot_file, indent=2, sort_keys=False, width=120)
+            yaml_utils.safe_dump(snapshot, snapshot_file, indent=2, sort_keys=False, width=120)
     print('Done')
 
 
@@ -12,6 +12,7 @@ import argparse
 import os
 import re
 import yaml
+import yaml_utils
 from pathlib import Path
 
 
@@ -34,7 +35,7 @@ def main():
     snapshot = None
     with open(in_snapshot, encoding='utf-8') as snapshot_file:
         try:
-            snapshot = yaml.safe_load(snapshot_file)
+            snapshot = yaml_utils.safe_load(snapshot_file)
         except yaml.YAMLError as e:
             print(f"Error parsing yaml of {in_snapshot}: {e}")
             return
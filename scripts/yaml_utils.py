@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+#
+# SPDX-License-Identifier: Apache-2.0
+# Copyright Pionix GmbH and Contributors to EVerest
+#
+"""
+Provide yaml loading and dumping with the libyaml based loader and dumper, if PyYAML has been built with libyaml,
+falling back to the pure python ones otherwise.
+
+ev-dev-tools (ev_cli), everest-testing and the scripts each ship an identical copy of this module, keep them in sync.
+yaml is imported on first use, so commands not touching yaml start fast.
+"""
+
+
+def safe_load(stream):
+    """Same as yaml.safe_load, using the libyaml based loader if available."""
+    import yaml
+
+    return yaml.load(stream, Loader=yaml.CSafeLoader if yaml.__with_libyaml__ else yaml.SafeLoader)
+
+
+def safe_dump(data, stream=None, **kwargs):
+    """Same as yaml.safe_dump, using the libyaml based dumper if available."""
+    import yaml
+
+    return yaml.dump(data, stream, Dumper=yaml.CSafeDumper if yaml.__with_libyaml__ else yaml.SafeDumper, **kwargs)
+
+
+def dump(data, stream=None, **kwargs):
+    """Same as yaml.dump, using the libyaml based dumper if available."""
+    import yaml
+
+    return yaml.dump(data, stream, Dumper=yaml.CDumper if yaml.__with_libyaml__ else yaml.Dumper, **kwargs)